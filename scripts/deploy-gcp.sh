@@ -114,6 +114,29 @@ fi
 SERVICE_ACCOUNT_EMAIL="workhub-cloud-run-sa@${PROJECT_ID}.iam.gserviceaccount.com"
 STORAGE_BUCKET="${PROJECT_ID}-workhub-uploads"
 
+# Projects set up before /metrics required a token lack its secret; create it once (never rotated here)
+if ! gcloud secrets describe workhub-metrics-token &>/dev/null; then
+    echo -e "${YELLOW}Creating workhub-metrics-token secret...${NC}"
+    openssl rand -hex 32 | tr -d '\n' | gcloud secrets create workhub-metrics-token --data-file=-
+fi
+
+echo ""
+echo -e "${YELLOW}Applying database migrations...${NC}"
+# The app does no DB setup at startup: create new tables/columns before the new revision serves traffic
+gcloud run jobs deploy ${BACKEND_SERVICE}-migrate \
+    --image $BACKEND_IMAGE:latest \
+    --region $REGION \
+    --command=python \
+    --args=init_cloud_sql.py \
+    --set-cloudsql-instances $CLOUD_SQL_CONNECTION \
+    --set-secrets DB_PASSWORD=workhub-db-password:latest,SECRET_KEY=workhub-secret-key:latest,JWT_SECRET_KEY=workhub-jwt-secret:latest \
+    --set-env-vars CLOUD_SQL_CONNECTION_NAME=$CLOUD_SQL_CONNECTION,DB_HOST=10.119.176.3,DB_PORT=1433,DB_NAME=workhub,DB_USER=sqlserver,DB_DIALECT=mssql,FLASK_ENV=production \
+    --service-account $SERVICE_ACCOUNT_EMAIL \
+    --execute-now \
+    --wait
+
+echo -e "${GREEN}✓ Database migrations applied${NC}"
+
 echo ""
 echo -e "${YELLOW}Deploying backend to Cloud Run...${NC}"
 gcloud run deploy $BACKEND_SERVICE \
@@ -129,7 +152,7 @@ gcloud run deploy $BACKEND_SERVICE \
     --cpu-boost \
     --timeout 300 \
     --set-cloudsql-instances $CLOUD_SQL_CONNECTION \
-    --set-secrets DB_PASSWORD=workhub-db-password:latest,SECRET_KEY=workhub-secret-key:latest,JWT_SECRET_KEY=workhub-jwt-secret:latest,MAIL_PASSWORD=workhub-mail-password:latest \
+    --set-secrets DB_PASSWORD=workhub-db-password:latest,SECRET_KEY=workhub-secret-key:latest,JWT_SECRET_KEY=workhub-jwt-secret:latest,MAIL_PASSWORD=workhub-mail-password:latest,METRICS_TOKEN=workhub-metrics-token:latest \
     --set-env-vars CLOUD_SQL_CONNECTION_NAME=$CLOUD_SQL_CONNECTION,DB_HOST=10.119.176.3,DB_PORT=1433,DB_NAME=workhub,DB_USER=sqlserver,DB_DIALECT=mssql,USE_CLOUD_STORAGE=true,CLOUD_STORAGE_BUCKET=$STORAGE_BUCKET,GCP_PROJECT=$PROJECT_ID,FLASK_ENV=production,EMAIL_NOTIFICATIONS_ENABLED=true \
     --service-account $SERVICE_ACCOUNT_EMAIL
 
@@ -163,10 +163,13 @@ create_or_update_secret() {
 # Generate secure random keys
 SECRET_KEY=$(openssl rand -base64 48)
 JWT_SECRET=$(openssl rand -base64 48)
+METRICS_TOKEN=$(openssl rand -hex 32)
 
 create_or_update_secret "workhub-db-password" "$DB_PASSWORD"
 create_or_update_secret "workhub-secret-key" "$SECRET_KEY"
 create_or_update_secret "workhub-jwt-secret" "$JWT_SECRET"
+# Bearer token for the Prometheus scrape of /metrics (required in production)
+create_or_update_secret "workhub-metrics-token" "$METRICS_TOKEN"
 
 echo ""
 echo -e "${YELLOW}Please enter your SMTP/email configuration:${NC}"
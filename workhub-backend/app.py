@@ -5,7 +5,7 @@ from flask_mail import Mail
 from datetime import timedelta
 from config import Config
 from models import db, bcrypt
-from auth import auth_bp
+from auth import auth_bp, admin_required
 from users import users_bp
 from tasks import tasks_bp
 from notifications import notifications_bp
@@ -14,26 +14,48 @@ from projects import projects_bp
 from sprints import sprints_bp
 from settings import settings_bp
 from file_uploads import file_uploads_bp
+from upload_sessions import upload_sessions_bp
 from reminders import reminders_bp
 from meetings import meetings_bp
 from chat import chat_bp
 from email_service import email_service
+from password_hashing import password_hasher
+import query_stats
+import json_provider
+import compression
+from logging_config import configure_logging
+import metrics
+from request_profiler import request_profiler
 from session_middleware import session_timeout_required, prevent_duplicate_submission, validate_cross_field_logic
 import logging
 import uuid
 import os
 
 def create_app():
+    # Request threads only enqueue log records; a listener thread writes JSON lines
+    configure_logging()
     app = Flask(__name__)
     app.config.from_object(Config)
     
     # Ensure JSON responses use UTF-8 encoding
     app.config['JSON_AS_ASCII'] = False  # Allow non-ASCII characters (emojis) in JSON
+    # orjson-backed jsonify/get_json (see json_provider.py)
+    json_provider.init_app(app)
+    # Registered first so it is the last after_request hook to run
+    compression.init_app(app)
     
     # Initialize extensions
     db.init_app(app)
+    query_stats.init_app(app)
+    metrics.init_app(app)
+    request_profiler.init_app(app)
     bcrypt.init_app(app)
-    JWTManager(app)
+    password_hasher.init_app(app)
+    jwt = JWTManager(app)
+    
+    # Revoked access tokens (logout) are rejected via the in-memory JTI denylist
+    from token_service import is_token_revoked
+    jwt.token_in_blocklist_loader(is_token_revoked)
     
     # CORS configuration - support multiple origins for production
     allowed_origins = os.environ.get('ALLOWED_ORIGINS', '*')
@@ -43,7 +65,8 @@ def create_app():
         app,
         resources={r"/api/*": {"origins": allowed_origins}},
         supports_credentials=True,
-        allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+        allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Idempotency-Key", "Content-Range"],
+        expose_headers=["Idempotent-Replayed", "ETag", "Content-Range", "Accept-Ranges", "Content-Disposition"],
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
     )
     
@@ -149,36 +172,8 @@ def create_app():
     app.config['EMAIL_NOTIFICATIONS_ENABLED'] = (env_enabled.lower() == 'true') if isinstance(env_enabled, str) else bool(app.config['MAIL_USERNAME'])
     app.config['FRONTEND_URL'] = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
     
-    # CRITICAL: Try to load email config from database BEFORE initializing Flask-Mail
-    # This ensures Flask-Mail is initialized with the correct credentials
-    with app.app_context():
-        try:
-            # Ensure database is initialized first
-            try:
-                from init_cloud_sql import init_database
-                init_database()
-            except ImportError:
-                db.create_all()
-            
-            # Now try to load email config from database
-            config_loaded = load_email_config_from_db()
-            if config_loaded:
-                logging.getLogger('workhub').info("Email configuration pre-loaded from database successfully")
-            else:
-                logging.getLogger('workhub').info("Email configuration not found in database, will check on first request")
-        except Exception as e:
-            # Use print instead of logging for Unicode characters on Windows
-            error_msg = str(e).encode('ascii', 'replace').decode('ascii')
-            logging.getLogger('workhub').warning(f"Could not pre-load email config: {error_msg}")
-            import traceback
-            try:
-                logging.getLogger('workhub').debug(traceback.format_exc())
-            except:
-                pass  # Ignore Unicode errors in traceback
-            # Continue anyway - config will be loaded on first request
-    
-    # Initialize Flask-Mail for email verification codes (AFTER trying to load config from DB)
-    # Flask-Mail reads from app.config, so if we loaded from DB, it will use those values
+    # Initialize Flask-Mail for email verification codes from env config; the
+    # senders fall back to SystemSettings credentials when an email is sent
     mail = Mail(app)
     app.extensions['mail'] = mail
     
@@ -186,39 +181,14 @@ def create_app():
     if app.config.get('MAIL_USERNAME') and app.config.get('MAIL_PASSWORD'):
         logging.getLogger('workhub').info(f"Flask-Mail initialized with username: {app.config.get('MAIL_USERNAME')}")
     else:
-        logging.getLogger('workhub').warning("Flask-Mail initialized without credentials - will load from DB on first use")
+        logging.getLogger('workhub').info("Flask-Mail initialized without credentials - will load from DB on first use")
     
     # Initialize email service
     email_service.init_app(app)
     
-    # Initialize database schema on first request (idempotent - safe to run multiple times)
-    # This ensures all tables exist when the app starts
-    # Use app-level attribute to track initialization status
-    app._db_initialized = False
-    
-    @app.before_request
-    def _initialize_database():
-        # Only run once per worker process
-        if not getattr(app, '_db_initialized', False):
-            app._db_initialized = True
-            try:
-                with app.app_context():
-                    # Try to import and use the comprehensive initialization script
-                    try:
-                        from init_cloud_sql import init_database
-                        init_database()
-                        logging.getLogger('workhub').info("Database schema initialized using init_cloud_sql.py")
-                    except ImportError:
-                        # Fallback: use SQLAlchemy create_all
-                        db.create_all()
-                        logging.getLogger('workhub').info("Database schema initialized using db.create_all()")
-                    
-                    # After database is initialized, try to load email config from SystemSettings
-                    if hasattr(app, 'load_email_config_from_db'):
-                        app.load_email_config_from_db()
-            except Exception as e:
-                logging.getLogger('workhub').error(f"Database initialization error: {e}")
-                # Don't block app if initialization fails - tables might already exist
+    # No database work happens here or on the first request: the schema is
+    # created/migrated at deploy time (python init_cloud_sql.py), and SMTP
+    # credentials stored in SystemSettings are read when an email is sent.
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -230,6 +200,7 @@ def create_app():
     app.register_blueprint(sprints_bp, url_prefix='/api/sprints')
     app.register_blueprint(settings_bp, url_prefix='/api/settings')
     app.register_blueprint(file_uploads_bp, url_prefix='/api/files')
+    app.register_blueprint(upload_sessions_bp, url_prefix='/api/uploads')
     app.register_blueprint(reminders_bp, url_prefix='/api/reminders')
     app.register_blueprint(meetings_bp, url_prefix='/api/meetings')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
@@ -257,6 +228,19 @@ def create_app():
                 'user_id': user_id,
                 'ip': request.remote_addr,
             }
+            # Lookups served from the request-scoped identity map (queries saved)
+            from request_cache import request_stats
+            cache_stats = request_stats()
+            if cache_stats['hits'] or cache_stats['misses']:
+                log_line['identity_cache_hits'] = cache_stats['hits']
+                log_line['identity_cache_misses'] = cache_stats['misses']
+            # Statements run by this request (see query_stats for N+1 / slow-query checks)
+            stats = query_stats.current_stats()
+            if stats is not None:
+                log_line.update(stats.summary())
+                repeated = stats.repeated(app.config['QUERY_N_PLUS_ONE_THRESHOLD'])
+                if repeated:
+                    log_line['n_plus_one'] = repeated[0][1]
             logging.getLogger('workhub').info(log_line)
             # Echo request id to clients
             response.headers['X-Request-ID'] = g.request_id
@@ -269,6 +253,49 @@ def create_app():
     def health_check():
         return jsonify({'status': 'healthy', 'message': 'Work Hub API is running'}), 200
     
+    # Password hashing latency (admins only)
+    @app.route('/api/health/password-hashing', methods=['GET'])
+    @jwt_required()
+    def password_hashing_health():
+        """bcrypt cost factor, pool size and hash/check latency"""
+        from auth import get_current_user
+        from permissions import Permission
+        current_user = get_current_user()
+        if not current_user or not current_user.has_permission(Permission.SETTINGS_VIEW):
+            return jsonify({"error": "Access denied"}), 403
+        return jsonify(password_hasher.get_metrics()), 200
+    
+    # Database connection pool checkout latency and exhaustion (admins only)
+    @app.route('/api/health/db-pool', methods=['GET'])
+    @jwt_required()
+    def db_pool_health():
+        """Checkout wait times, exhaustion and live usage for each database pool"""
+        from auth import get_current_user
+        from permissions import Permission
+        from db_pool import pool_metrics
+        current_user = get_current_user()
+        if not current_user or not current_user.has_permission(Permission.SETTINGS_VIEW):
+            return jsonify({"error": "Access denied"}), 403
+        return jsonify(pool_metrics.get_metrics()), 200
+    
+    # Request profiles (X-Profile header from an admin, or PROFILE_SAMPLE_RATE)
+    @app.route('/api/health/profiles', methods=['GET'])
+    @admin_required
+    def list_request_profiles():
+        """Stored request profiles, newest first"""
+        return jsonify(request_profiler.list_profiles()), 200
+    
+    @app.route('/api/health/profiles/<profile_id>', methods=['GET'])
+    @admin_required
+    def get_request_profile(profile_id):
+        """One profile with its SQL timeline; ?format=collapsed returns flamegraph input"""
+        profile = request_profiler.load(profile_id)
+        if profile is None:
+            return jsonify({"error": "Profile not found"}), 404
+        if request.args.get('format') == 'collapsed':
+            return app.response_class('\n'.join(profile.get('collapsed', [])) + '\n', mimetype='text/plain')
+        return jsonify(profile), 200
+    
     # Email connectivity test endpoint (for debugging)
     @app.route('/api/health/email', methods=['GET'])
     @jwt_required()
@@ -1,20 +1,24 @@
 # workhub-backend/auth.py
 from functools import wraps
-from datetime import timedelta
 import secrets
 import string
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import (
     jwt_required,
-    create_access_token,
     get_jwt_identity,
+    get_jwt,
 )
 
 from models import db, User
 from validators import validator, ValidationError  # relaxed, exception-based validator
 from password_reset import PasswordResetService
 from permissions import has_permission
+from request_cache import get_user
+from token_service import (
+    issue_token_pair, rotate_refresh_token, revoke_access_token, revoke_refresh_token,
+    TokenReuseError, InvalidRefreshToken,
+)
 
 # NOTE: No url_prefix here; app.py registers the blueprint with a prefix (e.g. "/api/auth")
 auth_bp = Blueprint("auth", __name__)
@@ -44,7 +48,7 @@ def admin_required(fn):
             except (TypeError, ValueError):
                 return jsonify({"error": "Invalid token"}), 401
 
-            user = User.query.get(uid_int) if uid_int is not None else None
+            user = get_user(uid_int) if uid_int is not None else None
             if not user:
                 return jsonify({"error": "User not found"}), 404
             
@@ -70,7 +74,8 @@ def get_current_user():
     except (TypeError, ValueError):
         return None
     
-    return User.query.get(uid_int)
+    # Memoized on flask.g: decorators, handlers and helpers share one lookup
+    return get_user(uid_int)
 
 
 def permission_required(permission):
@@ -154,6 +159,14 @@ def login():
     user = User.query.filter(User.email.ilike(email)).first()
     if not user or not user.check_password(password):
         return jsonify({"error": "Invalid email or password"}), 401
+
+    # Transparently upgrade the stored hash when the configured bcrypt cost changed
+    if user.password_needs_rehash():
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
     
     # Check if user signup is approved
     if user.signup_status == 'pending':
@@ -165,18 +178,67 @@ def login():
     # Check if user needs to change password
     force_password_change = getattr(user, 'force_password_change', False)
     
-    # JWT subject (identity) must be a string; 30 minutes typical
-    access_token = create_access_token(identity=str(user.id), expires_delta=timedelta(minutes=30))
+    # JWT subject (identity) must be a string; 30 minute access token + rotating refresh token
+    try:
+        access_token, refresh_token, _ = issue_token_pair(user)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
     
     user_dict = user.to_dict()
     user_dict['force_password_change'] = force_password_change
     
     return jsonify({
         "access_token": access_token, 
+        "refresh_token": refresh_token,
         "user": user_dict
     }), 200
 
 
+@auth_bp.post("/refresh")
+@jwt_required(refresh=True)
+def refresh():
+    """
+    Exchange a refresh token (Authorization: Bearer <refresh_token>) for a new
+    access/refresh pair. The presented refresh token is rotated and cannot be reused.
+    Returns: { "access_token": "<JWT>", "refresh_token": "<JWT>" }
+    """
+    try:
+        access_token, refresh_token = rotate_refresh_token(get_jwt())
+    except TokenReuseError:
+        return jsonify({"error": "Refresh token has already been used. Please login again."}), 401
+    except InvalidRefreshToken:
+        return jsonify({"error": "Invalid refresh token. Please login again."}), 401
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    
+    return jsonify({
+        "access_token": access_token,
+        "refresh_token": refresh_token
+    }), 200
+
+
+@auth_bp.post("/logout")
+@jwt_required()
+def logout():
+    """
+    Revoke the current access token and, if provided, the refresh token family.
+    JSON (optional): { "refresh_token": "<JWT>" }
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        revoke_access_token(get_jwt())
+        if data.get("refresh_token"):
+            revoke_refresh_token(data["refresh_token"])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    return jsonify({"message": "Logged out successfully"}), 200
+
+
 @auth_bp.post("/register")
 @admin_required
 def register():
@@ -8,12 +8,11 @@ Enhanced authentication routes with P0 security features:
 """
 
 from functools import wraps
-from datetime import timedelta
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import (
     jwt_required,
-    create_access_token,
     get_jwt_identity,
+    get_jwt,
 )
 from flask_mail import Mail
 
@@ -25,6 +24,7 @@ from security_middleware import (
     handle_validation_error
 )
 from email_verification import email_verification
+from token_service import issue_token_pair, revoke_access_token, revoke_refresh_token
 
 # Blueprint - no url_prefix here; app.py registers with prefix
 auth_bp = Blueprint("auth", __name__)
@@ -122,14 +122,25 @@ def login():
     # Success - clear failed attempts
     rate_limiter.clear_failed_attempts(email)
 
-    # Create JWT token
-    access_token = create_access_token(
-        identity=str(user.id), 
-        expires_delta=timedelta(minutes=30)
-    )
+    # Transparently upgrade the stored hash when the configured bcrypt cost changed
+    if user.password_needs_rehash():
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    # Create JWT access token + rotating refresh token
+    try:
+        access_token, refresh_token, _ = issue_token_pair(user)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify(format_error_response("Database error occurred.", code="DB_ERROR")), 500
     
     return jsonify({
         "access_token": access_token, 
+        "refresh_token": refresh_token,
         "user": user.to_dict()
     }), 200
 
@@ -427,8 +438,19 @@ def change_password():
 @jwt_required()
 def logout():
     """
-    Logout endpoint (token blacklisting would go here in production).
-    For JWT, actual logout is client-side (delete token).
+    Logout endpoint: revokes the current access token (shared JTI denylist)
+    and, if provided, the refresh token family.
+    
+    JSON (optional): { "refresh_token": "<JWT>" }
     """
+    data = request.get_json(silent=True) or {}
+    try:
+        revoke_access_token(get_jwt())
+        if data.get("refresh_token"):
+            revoke_refresh_token(data["refresh_token"])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify(format_error_response("Logout failed", code="SERVER_ERROR")), 500
     return jsonify({"message": "Logged out successfully"}), 200
 
@@ -0,0 +1,137 @@
+"""
+pytest-benchmark suite for code every request runs: model serialization,
+datetime formatting, task payload validation, rate limiting and permission
+checks. Fixtures are fixed rows in an in-memory SQLite database, so results
+only change when the code does. Each benchmark is compared with
+baselines/bench_hot_paths.json (see conftest.py).
+
+Usage (from workhub-backend, needs `pip install -r requirements-dev.txt`):
+    python -m pytest benchmarks/bench_hot_paths.py
+    python -m pytest benchmarks/bench_hot_paths.py --update-baselines
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from flask import Flask
+
+from models import (
+    db, format_utc_datetime, User, Project, Sprint, Task, ChatConversation, ChatMessage, MessageReaction,
+    ChatGroup, ChatGroupMember, GroupMessage, GroupMessageReaction,
+)
+from permissions import Permission, has_permission
+from security_middleware import RateLimiter
+from validators import validator
+
+FIXED_TIME = datetime(2025, 3, 14, 9, 26, 53)
+
+
+@pytest.fixture(scope='module')
+def rows():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        alice = User(id=1, email='alice@example.com', password_hash='x', name='Alice', role='manager')
+        bob = User(id=2, email='bob@example.com', password_hash='x', name='Bob', role='developer')
+        project = Project(id=1, name='Platform Core', owner_id=1)
+        sprint = Sprint(id=1, project_id=1, name='Sprint 1', start_date=FIXED_TIME, end_date=FIXED_TIME + timedelta(days=14))
+        blocker = Task(id=1, title='Migrate database to Unicode', description='Audit NVARCHAR columns.', priority='high',
+                       status='in_progress', assigned_to=2, created_by=1, project_id=1, sprint_id=1, created_at=FIXED_TIME,
+                       updated_at=FIXED_TIME, due_date=FIXED_TIME + timedelta(days=5), blocks_task_id=2)
+        task = Task(id=2, title='Add message reactions', description='Emoji reactions with counters.', priority='medium',
+                    status='todo', assigned_to=2, created_by=1, project_id=1, sprint_id=1, created_at=FIXED_TIME,
+                    updated_at=FIXED_TIME, due_date=FIXED_TIME + timedelta(days=7))
+        subtasks = [Task(id=3 + n, title=f'Subtask {n}', status='completed' if n % 2 else 'todo', priority='low',
+                         parent_task_id=2, project_id=1, created_at=FIXED_TIME) for n in range(3)]
+        conversation = ChatConversation(id=1, user1_id=1, user2_id=2, requested_by=1, status='accepted')
+        question = ChatMessage(id=1, conversation_id=1, sender_id=1, recipient_id=2, created_at=FIXED_TIME,
+                               content='Can you review the migration before standup tomorrow?')
+        answer = ChatMessage(id=2, conversation_id=1, sender_id=2, recipient_id=1, reply_to_id=1, is_read=True,
+                             read_at=FIXED_TIME, created_at=FIXED_TIME, content='Sure, looking at it now 👀')
+        chat_reactions = [MessageReaction(message_id=2, user_id=1, emoji=emoji) for emoji in ('👍', '🎉', '❤️')]
+        group = ChatGroup(id=1, name='Backend', created_by=1)
+        members = [ChatGroupMember(group_id=1, user_id=1, role='owner'), ChatGroupMember(group_id=1, user_id=2)]
+        group_question = GroupMessage(id=1, group_id=1, sender_id=1, content='Deploy at 5pm?', created_at=FIXED_TIME)
+        group_answer = GroupMessage(id=2, group_id=1, sender_id=2, reply_to_id=1, created_at=FIXED_TIME,
+                                    content='Yes, after the migration lands')
+        group_reactions = [GroupMessageReaction(message_id=2, user_id=uid, emoji='👍') for uid in (1, 2)]
+        db.session.add_all([alice, bob, project, sprint, blocker, task, *subtasks, conversation, question, answer,
+                            *chat_reactions, group, *members, group_question, group_answer, *group_reactions])
+        db.session.commit()
+        yield {'task': db.session.get(Task, 2), 'chat_message': db.session.get(ChatMessage, 2),
+               'group_message': db.session.get(GroupMessage, 2), 'session': db.session}
+
+
+# ========== SERIALIZATION ==========
+
+def test_task_to_dict(rows, check_baseline):
+    result = check_baseline(rows['task'].to_dict)
+    assert result['blocked_by'] == [{'id': 1, 'title': 'Migrate database to Unicode', 'status': 'in_progress'}]
+
+
+def test_task_to_dict_with_subtasks(rows, check_baseline):
+    result = check_baseline(rows['task'].to_dict, include_subtasks=True)
+    assert result['subtask_count'] == 3
+
+
+def test_chat_message_to_dict(rows, check_baseline):
+    result = check_baseline(rows['chat_message'].to_dict)
+    assert result['reply_to']['id'] == 1 and len(result['reactions']) == 3
+
+
+def test_group_message_to_dict(rows, check_baseline):
+    result = check_baseline(rows['group_message'].to_dict)
+    assert result['reply_to']['id'] == 1 and len(result['reactions']) == 2
+
+
+def test_format_utc_datetime_naive(check_baseline):
+    assert check_baseline(format_utc_datetime, FIXED_TIME) == '2025-03-14T09:26:53Z'
+
+
+def test_format_utc_datetime_aware(check_baseline):
+    aware = FIXED_TIME.replace(tzinfo=timezone(timedelta(hours=3)))
+    assert check_baseline(format_utc_datetime, aware) == '2025-03-14T06:26:53Z'
+
+
+# ========== VALIDATION & ACCESS CONTROL ==========
+
+def test_validate_task_payload(rows, check_baseline):
+    payload = {
+        'title': 'Optimize task list queries',
+        'description': '<p>Add indexes on <b>status</b> and priority.</p>',
+        'priority': 'high',
+        'status': 'in_progress',
+        # Must stay within the validator's 1 hour .. 1 year window
+        'due_date': (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
+        'assigned_to': 2,
+        'project_id': 1,
+        'sprint_id': 1,
+        'tags': ['backend', 'performance'],
+    }
+    result = check_baseline(validator.validate_task_payload, payload, db=rows['session'])
+    assert result['assigned_to'] == 2 and result['sprint_id'] == 1
+
+
+def test_rate_limiter_is_rate_limited(check_baseline):
+    limiter = RateLimiter()
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(10000)]
+    for key in keys:
+        limiter.is_rate_limited(key, 120, 60)
+    position = iter(range(10 ** 9))
+
+    def check():
+        return limiter.is_rate_limited(keys[next(position) % 10000], 10 ** 6, 60)
+
+    assert check_baseline(check) is False
+
+
+def test_has_permission(check_baseline):
+    assert check_baseline(has_permission, 'developer', Permission.TASKS_READ) is True
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Request-path cost of the Prometheus instrumentation.
+
+Runs the hooks that metrics.init_app registers (before_request, after_request,
+teardown_request) inside one request context, so the number is the overhead
+each request pays, without the test client's own noise. Set
+PROMETHEUS_MULTIPROC_DIR to measure the multiprocess (mmap) value backend.
+
+Usage:
+    python benchmarks/bench_metrics.py [--requests 20000] [--runs 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+import metrics
+
+
+def build_app():
+    app = Flask('bench')
+    metrics.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+    return app
+
+
+def time_hooks(app, count):
+    before = app.before_request_funcs[None]
+    after = app.after_request_funcs[None]
+    teardown = app.teardown_request_funcs[None]
+    with app.test_request_context('/ping'):
+        response = app.response_class('pong')
+        started = time.perf_counter()
+        for _ in range(count):
+            for hook in before:
+                hook()
+            for hook in after:
+                hook(response)
+            for hook in teardown:
+                hook(None)
+        return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    if not metrics.enabled:
+        sys.exit('prometheus_client is not installed')
+
+    app = build_app()
+    # Best of N filters out scheduler noise
+    per_request = min(time_hooks(app, args.requests) for _ in range(args.runs))
+    backend = 'multiprocess' if metrics.MULTIPROC_DIR else 'in-process'
+    print(f"metrics overhead per request ({backend}): {per_request * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark.
+
+Reports, in a fresh interpreter each run:
+  - import cost per module for `import app` (python -X importtime), slowest first
+  - time spent in create_app()
+  - cost of each deferred initialization (lazy_init) when first used
+
+Usage:
+    python benchmarks/bench_startup.py [--top 15] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+application = app_module.create_app()
+created = time.perf_counter()
+sys.stderr.write('--- app ready ---\n')
+
+import reports, storage_service
+from lazy_init import init_timings
+reports.pd.DataFrame
+storage_service.get_storage_client()
+print(json.dumps({
+    'import_s': imported - started,
+    'create_app_s': created - imported,
+    'lazy': init_timings(),
+}))
+"""
+
+
+def run_probe():
+    env = dict(os.environ)
+    env.setdefault('DB_DIALECT', 'mssql')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr[-2000:])
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('--- app ready ---'):
+            break
+        # "import time:  self [us] | cumulative | imported package", nesting shown by indent
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Modules imported by app.py itself, i.e. the cost each of our modules adds
+        if depth == 1:
+            modules[name.strip()] = int(cumulative)
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    return modules, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    # Best of N filters out disk-cache noise
+    best_modules = {}
+    for modules, _ in samples:
+        for name, micros in modules.items():
+            best_modules[name] = min(micros, best_modules.get(name, micros))
+    best = min((stats for _, stats in samples), key=lambda s: s['import_s'] + s['create_app_s'])
+
+    print(f"{'imported by app.py':<40} {'cumulative ms':>14}")
+    for name, micros in sorted(best_modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<40} {micros / 1000:>14.1f}")
+
+    print()
+    print(f"{'import app':<40} {best['import_s'] * 1000:>14.1f}")
+    print(f"{'create_app()':<40} {best['create_app_s'] * 1000:>14.1f}")
+    print()
+    print(f"{'deferred until first use':<40} {'ms':>14}")
+    for name, seconds in sorted(best['lazy'].items(), key=lambda item: -item[1]):
+        print(f"{name:<40} {seconds * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Baseline checks for the pytest-benchmark suites in this directory.
+
+Absolute timings differ between laptops and CI runners, so committed baselines
+store each benchmark's median relative to a fixed pure-Python calibration
+workload measured in the same session ("units"). A benchmark fails when its
+relative cost exceeds the baseline by more than the tolerance. Noisy shared
+CI runners only report the result (the workflow step continues on error);
+the hard failure is meant for local and dedicated benchmark runs.
+
+    python -m pytest benchmarks/bench_hot_paths.py                       # compare
+    python -m pytest benchmarks/bench_hot_paths.py --update-baselines    # after an intended change
+
+Configuration (environment variables):
+    BENCH_TOLERANCE  Allowed slowdown before failing, as a fraction (default 0.3)
+"""
+import json
+import os
+import timeit
+from datetime import datetime, timezone
+
+import pytest
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('workhub benchmark baselines')
+    group.addoption('--update-baselines', action='store_true', help='Rewrite the committed baselines')
+    group.addoption('--baseline-tolerance', type=float, default=float(os.environ.get('BENCH_TOLERANCE', 0.3)),
+                    help='Allowed slowdown before failing, as a fraction (default 0.3)')
+
+
+def _calibration_workload():
+    # Roughly what serialization does: dicts, attribute access, string formatting, isoformat
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(50):
+        rows.append({'id': i, 'name': f"item {i}", 'at': now.isoformat(), 'ok': i % 3 == 0})
+    return sorted(rows, key=lambda row: row['name'])
+
+
+@pytest.fixture(scope='session')
+def machine_unit():
+    """Seconds per calibration workload on this machine (best of several runs)"""
+    number = 200
+    return min(timeit.repeat(_calibration_workload, number=number, repeat=9)) / number
+
+
+class BaselineFile:
+    def __init__(self, suite):
+        self.path = os.path.join(BASELINE_DIR, f'{suite}.json')
+        try:
+            with open(self.path) as fh:
+                self.data = json.load(fh)
+        except FileNotFoundError:
+            self.data = {'benchmarks': {}}
+        self.measured = {}
+
+    def expected(self, name):
+        return self.data['benchmarks'].get(name)
+
+    def write(self):
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        self.data['unit'] = 'median / calibration workload median'
+        self.data['benchmarks'] = dict(sorted({**self.data['benchmarks'], **self.measured}.items()))
+        with open(self.path, 'w') as fh:
+            json.dump(self.data, fh, indent=2)
+            fh.write('\n')
+
+
+@pytest.fixture(scope='module')
+def baseline_file(request):
+    suite = request.module.__name__.rsplit('.', 1)[-1]
+    baselines = BaselineFile(suite)
+    yield baselines
+    if request.config.getoption('update_baselines') and baselines.measured:
+        baselines.write()
+
+
+@pytest.fixture
+def check_baseline(benchmark, baseline_file, machine_unit, request):
+    """benchmark() plus a comparison of the result against the committed baseline"""
+    config = request.config
+
+    def run(fn, *args, **kwargs):
+        result = benchmark(fn, *args, **kwargs)
+        if benchmark.stats is None:  # --benchmark-disable
+            return result
+        relative = benchmark.stats.stats.median / machine_unit
+        name = request.node.name
+        benchmark.extra_info['relative_cost'] = round(relative, 4)
+        if config.getoption('update_baselines'):
+            baseline_file.measured[name] = round(relative, 4)
+            return result
+        expected = baseline_file.expected(name)
+        if expected is None:
+            pytest.fail(f"No baseline for {name}; run with --update-baselines and commit {baseline_file.path}")
+        tolerance = config.getoption('baseline_tolerance')
+        if relative > expected * (1 + tolerance):
+            pytest.fail(
+                f"{name} regressed: {relative:.3f} units vs baseline {expected:.3f} "
+                f"(+{(relative / expected - 1) * 100:.0f}%, tolerance {tolerance * 100:.0f}%)"
+            )
+        return result
+    return run
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Scripted load test: replays the frontend's polling and CRUD traffic and
+reports latency percentiles per endpoint.
+
+Each virtual user is one generated user (seeds/generate_dataset.py) looping
+over a weighted mix of requests: notification, chat, typing and task list
+polling, plus message sends, comments, time logs and task updates against
+the conversations, groups and tasks that user actually belongs to. Access
+tokens are minted directly with the app's JWT secret, so the login rate
+limit is not part of the measurement.
+
+Target either a running server (gunicorn, docker compose) with --base-url,
+or the app in this process through the Flask test client with --in-process.
+In both cases the database settings (DATABASE_URL or DB_*) must point at the
+database the server uses, because users, conversations and tasks are looked
+up there.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/workhub-load.db python seeds/generate_dataset.py --create-schema
+    DATABASE_URL=sqlite:////tmp/workhub-load.db python benchmarks/load_test.py --in-process --users 10 --duration 30
+    python benchmarks/load_test.py --base-url http://localhost:5000 --users 50 --duration 120 --json results.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+EMAIL_DOMAIN = 'loadtest.example.com'
+
+
+# ========== TRAFFIC MIX ==========
+# (label, weight, request builder). A builder returns (method, path, json body)
+# or None when it does not apply to this user (e.g. no conversations).
+
+def _pick(rng, items):
+    return rng.choice(items) if items else None
+
+
+def _conversation_poll(vu, rng):
+    cid = _pick(rng, vu['conversations'])
+    return cid and ('GET', f'/api/chat/conversations/{cid}/messages', None)
+
+
+def _conversation_typing(vu, rng):
+    cid = _pick(rng, vu['conversations'])
+    return cid and ('GET', f'/api/chat/conversations/{cid}/typing', None)
+
+
+def _group_poll(vu, rng):
+    gid = _pick(rng, vu['groups'])
+    return gid and ('GET', f'/api/chat/groups/{gid}/messages', None)
+
+
+def _task_detail(vu, rng):
+    tid = _pick(rng, vu['tasks'])
+    return tid and ('GET', f'/api/tasks/{tid}', None)
+
+
+def _project_detail(vu, rng):
+    pid = _pick(rng, vu['projects'])
+    return pid and ('GET', f'/api/projects/{pid}', None)
+
+
+def _send_message(vu, rng):
+    cid = _pick(rng, vu['conversations'])
+    return cid and ('POST', f'/api/chat/conversations/{cid}/messages', {'content': f"load test {rng.random():.8f}"})
+
+
+def _send_group_message(vu, rng):
+    gid = _pick(rng, vu['groups'])
+    return gid and ('POST', f'/api/chat/groups/{gid}/messages', {'content': f"load test {rng.random():.8f}"})
+
+
+def _add_comment(vu, rng):
+    tid = _pick(rng, vu['tasks'])
+    # Content must differ per request: identical comments are rejected as duplicate submissions
+    return tid and ('POST', f'/api/tasks/{tid}/comments', {'content': f"Load test comment {rng.random():.8f}"})
+
+
+def _log_time(vu, rng):
+    tid = _pick(rng, vu['tasks'])
+    return tid and ('POST', f'/api/tasks/{tid}/time-logs', {'hours': 0.5, 'description': 'load test'})
+
+
+def _update_status(vu, rng):
+    tid = _pick(rng, vu['tasks'])
+    return tid and ('PUT', f'/api/tasks/{tid}', {'status': rng.choice(['todo', 'in_progress'])})
+
+
+SCENARIOS = [
+    ('GET /api/notifications/unread-count', 14, lambda vu, rng: ('GET', '/api/notifications/unread-count', None)),
+    ('GET /api/notifications/', 5, lambda vu, rng: ('GET', '/api/notifications/?limit=50', None)),
+    ('GET /api/chat/conversations', 12, lambda vu, rng: ('GET', '/api/chat/conversations', None)),
+    ('GET /api/chat/conversations/<id>/messages', 12, _conversation_poll),
+    ('GET /api/chat/conversations/<id>/typing', 8, _conversation_typing),
+    ('GET /api/chat/groups', 5, lambda vu, rng: ('GET', '/api/chat/groups', None)),
+    ('GET /api/chat/groups/<id>/messages', 6, _group_poll),
+    ('GET /api/tasks/', 8, lambda vu, rng: ('GET', '/api/tasks/', None)),
+    ('GET /api/tasks/<id>', 5, _task_detail),
+    ('GET /api/projects/', 4, lambda vu, rng: ('GET', '/api/projects/', None)),
+    ('GET /api/projects/<id>', 2, _project_detail),
+    ('POST /api/chat/conversations/<id>/messages', 5, _send_message),
+    ('POST /api/chat/groups/<id>/messages', 2, _send_group_message),
+    ('POST /api/tasks/<id>/comments', 3, _add_comment),
+    ('POST /api/tasks/<id>/time-logs', 1, _log_time),
+    ('PUT /api/tasks/<id>', 2, _update_status),
+]
+
+
+# ========== VIRTUAL USERS ==========
+
+def load_virtual_users(app, count, tag):
+    """Generated users with their tokens and the ids their requests refer to"""
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import or_
+    from models import User, ChatConversation, ChatGroupMember, ProjectMember, Task
+
+    with app.app_context():
+        pattern = f"{tag}-user%@{EMAIL_DOMAIN}" if tag else f"%@{EMAIL_DOMAIN}"
+        users = User.query.filter(User.email.like(pattern)).order_by(User.id).limit(count).all()
+        vus = []
+        for user in users:
+            conversations = ChatConversation.query.with_entities(ChatConversation.id).filter(
+                or_(ChatConversation.user1_id == user.id, ChatConversation.user2_id == user.id),
+                ChatConversation.status == 'accepted',
+            ).all()
+            vus.append({
+                'user_id': user.id,
+                'token': create_access_token(identity=str(user.id), expires_delta=timedelta(hours=12)),
+                'conversations': [row.id for row in conversations],
+                'groups': [row.group_id for row in ChatGroupMember.query.filter_by(user_id=user.id)],
+                'projects': [row.project_id for row in ProjectMember.query.filter_by(user_id=user.id)],
+                'tasks': [row.id for row in Task.query.with_entities(Task.id).filter_by(assigned_to=user.id).limit(200)],
+            })
+    return vus
+
+
+class HttpTransport:
+    """One keep-alive connection per virtual user, like a browser tab"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+
+    def session(self):
+        transport = self
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+
+        def send(method, path, headers, body):
+            nonlocal connection
+            try:
+                connection.request(method, transport.prefix + path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = transport.connection_class(transport.netloc, timeout=transport.timeout)
+                raise
+        return send
+
+
+class InProcessTransport:
+    """Flask test client against create_app() in this process"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, headers, body):
+            return client.open(path, method=method, headers=headers, data=body).status_code
+        return send
+
+
+def run_virtual_user(vu, transport, deadline, warmup_until, think_time, seed, results):
+    rng = random.Random(seed)
+    # Per-thread results, merged after join
+    samples = defaultdict(list)
+    errors = defaultdict(Counter)
+    send = transport.session()
+    headers = {'Authorization': f"Bearer {vu['token']}", 'Content-Type': 'application/json'}
+    labels = [label for label, _, _ in SCENARIOS]
+    weights = [weight for _, weight, _ in SCENARIOS]
+    builders = {label: builder for label, _, builder in SCENARIOS}
+    while time.monotonic() < deadline:
+        label = rng.choices(labels, weights=weights)[0]
+        planned = builders[label](vu, rng)
+        if not planned:
+            continue
+        method, path, payload = planned
+        body = json.dumps(payload) if payload is not None else None
+        started = time.perf_counter()
+        try:
+            status = send(method, path, headers, body)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if time.monotonic() >= warmup_until:
+            samples[label].append(elapsed_ms)
+            if not (isinstance(status, int) and status < 400):
+                errors[label][str(status)] += 1
+        if think_time:
+            time.sleep(rng.expovariate(1 / think_time))
+    results.append((samples, errors))
+
+
+# ========== REPORT ==========
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(samples, errors, duration):
+    rows = []
+    for label in sorted(samples, key=lambda name: -len(samples[name])):
+        values = sorted(samples[label])
+        rows.append({
+            'endpoint': label,
+            'requests': len(values),
+            'errors': dict(errors.get(label, {})),
+            'rps': round(len(values) / duration, 2),
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2),
+            'max_ms': round(values[-1], 2) if values else 0.0,
+        })
+    everything = sorted(v for values in samples.values() for v in values)
+    total = {
+        'endpoint': 'ALL',
+        'requests': len(everything),
+        'errors': dict(sum((Counter(e) for e in errors.values()), Counter())),
+        'rps': round(len(everything) / duration, 2),
+        'p50_ms': round(percentile(everything, 50), 2),
+        'p95_ms': round(percentile(everything, 95), 2),
+        'p99_ms': round(percentile(everything, 99), 2),
+        'max_ms': round(everything[-1], 2) if everything else 0.0,
+    }
+    return rows, total
+
+
+def print_report(rows, total):
+    width = max(len(row['endpoint']) for row in rows + [total])
+    print(f"{'endpoint':<{width}}  {'reqs':>7} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  errors")
+    for row in rows + [total]:
+        errors = ' '.join(f"{status}x{count}" for status, count in sorted(row['errors'].items())) or '-'
+        print(f"{row['endpoint']:<{width}}  {row['requests']:>7} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--base-url', help='Server to load, e.g. http://localhost:5000')
+    target.add_argument('--in-process', action='store_true', help='Use the Flask test client in this process')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run, after warm-up')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of traffic excluded from the report')
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help='Mean pause between a user\'s requests in seconds (0 = closed loop, max load)')
+    parser.add_argument('--tag', default='lt', help='Dataset tag given to generate_dataset.py (empty = any)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    # Per-request log lines would dominate an in-process run
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app
+    app = create_app()
+
+    vus = load_virtual_users(app, args.users, args.tag)
+    if not vus:
+        sys.exit(f"No users matching *@{EMAIL_DOMAIN} (tag '{args.tag}'); run seeds/generate_dataset.py first.")
+    transport = InProcessTransport(app) if args.in_process else HttpTransport(args.base_url, args.timeout)
+
+    results = []
+    warmup_until = time.monotonic() + args.warmup
+    deadline = warmup_until + args.duration
+    print(f"{len(vus)} virtual users, {args.duration:.0f}s (+{args.warmup:.0f}s warm-up), "
+          f"think time {args.think_time}s, target {'in-process' if args.in_process else args.base_url}")
+    threads = [
+        threading.Thread(target=run_virtual_user, daemon=True,
+                         args=(vu, transport, deadline, warmup_until, args.think_time, args.seed + n, results))
+        for n, vu in enumerate(vus)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = defaultdict(list)
+    errors = defaultdict(Counter)
+    for thread_samples, thread_errors in results:
+        for label, values in thread_samples.items():
+            samples[label].extend(values)
+        for label, counts in thread_errors.items():
+            errors[label].update(counts)
+    rows, total = summarize(samples, errors, args.duration)
+    if not rows:
+        sys.exit("No requests completed after warm-up.")
+    print_report(rows, total)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'config': vars(args), 'endpoints': rows, 'total': total}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
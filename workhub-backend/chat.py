@@ -11,10 +11,19 @@ from datetime import datetime
 from models import db, User, ChatConversation, ChatMessage, MessageReaction, Notification
 from models import ChatGroup, ChatGroupMember, GroupMessage, GroupMessageRead, GroupInvitation, GroupMessageReaction
 from auth import get_current_user
+from request_cache import is_group_member
+from read_routing import read_replica
+from collection_versions import conditional_get
+from json_provider import json_array
+from storage_service import storage_service
+from upload_pipeline import upload_pipeline
 from notifications import create_notification
 from werkzeug.utils import secure_filename
 import os
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -67,18 +76,17 @@ def get_users():
         } for u in users]
         
         # Log for debugging
-        print(f"[Chat API] Returning {len(users_list)} users (excluding user {current_user.id})")
+        logger.debug(f"Returning {len(users_list)} users (excluding user {current_user.id})")
         
         return jsonify(users_list), 200
     except Exception as e:
-        import traceback
-        print(f"[Chat API] Error in get_users: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"Error in get_users: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
 @chat_bp.route('/conversations', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_conversations():
     """Get all conversations for current user"""
     try:
@@ -109,7 +117,7 @@ def get_conversations():
                 
                 # Ensure other_user exists
                 if not other_user:
-                    print(f"[Chat API] Warning: Conversation {conv.id} has missing user. Skipping.")
+                    logger.warning(f"Conversation {conv.id} has missing user. Skipping.")
                     continue
                 
                 # Get last message efficiently - limit to recent messages for performance
@@ -126,7 +134,7 @@ def get_conversations():
                         ).order_by(desc(ChatMessage.created_at)).limit(50).all()
                     except (AttributeError, Exception) as filter_error:
                         # Column might not exist in database - query without the filter
-                        print(f"[Chat API] is_deleted column may not exist, querying without filter: {filter_error}")
+                        logger.warning(f"is_deleted column may not exist, querying without filter: {filter_error}")
                         recent_messages = ChatMessage.query.filter_by(
                             conversation_id=conv.id
                         ).order_by(desc(ChatMessage.created_at)).limit(50).all()
@@ -160,7 +168,7 @@ def get_conversations():
                         if last_message.created_at:
                             last_message_time = last_message.created_at.isoformat()
                 except Exception as msg_error:
-                    print(f"[Chat API] Error loading messages for conversation {conv.id}: {msg_error}")
+                    logger.warning(f"Error loading messages for conversation {conv.id}: {msg_error}")
                     # Continue without last message
                 
                 # Get unread count efficiently
@@ -172,7 +180,7 @@ def get_conversations():
                         is_read=False
                     ).count()
                 except Exception as unread_error:
-                    print(f"[Chat API] Error counting unread for conversation {conv.id}: {unread_error}")
+                    logger.warning(f"Error counting unread for conversation {conv.id}: {unread_error}")
                     unread_count = 0
                 
                 # Build result - ensure all fields are safe
@@ -194,9 +202,7 @@ def get_conversations():
                 }
                 result.append(conv_dict)
             except Exception as conv_error:
-                import traceback
-                print(f"[Chat API] Error converting conversation {conv.id} to dict: {str(conv_error)}")
-                traceback.print_exc()
+                logger.exception(f"Error converting conversation {conv.id} to dict: {str(conv_error)}")
                 # Try to return at least basic info
                 try:
                     other_user = conv.user2 if current_user.id == conv.user1_id else conv.user1
@@ -218,14 +224,12 @@ def get_conversations():
                             'last_message_time': None
                         })
                 except:
-                    print(f"[Chat API] Failed to create fallback dict for conversation {conv.id}")
+                    logger.error(f"Failed to create fallback dict for conversation {conv.id}")
                     continue
         
         return jsonify(result), 200
     except Exception as e:
-        import traceback
-        print(f"[Chat API] Error in get_conversations: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"Error in get_conversations: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -290,7 +294,7 @@ def request_chat():
         # Ensure user1_id < user2_id for consistency
         user1_id, user2_id = sorted([current_user.id, other_user_id])
         
-        print(f"[Chat API] Creating chat request: user1_id={user1_id}, user2_id={user2_id}, requested_by={current_user.id}")
+        logger.debug(f"Creating chat request: user1_id={user1_id}, user2_id={user2_id}, requested_by={current_user.id}")
         
         conversation = ChatConversation(
             user1_id=user1_id,
@@ -302,10 +306,10 @@ def request_chat():
         db.session.add(conversation)
         try:
             db.session.commit()
-            print(f"[Chat API] Chat conversation created successfully with ID: {conversation.id}")
+            logger.info(f"Chat conversation created with ID: {conversation.id}")
         except Exception as commit_error:
             db.session.rollback()
-            print(f"[Chat API] Error committing conversation: {commit_error}")
+            logger.error(f"Error committing conversation: {commit_error}")
             raise
         
         # Eager load user relationships before calling to_dict
@@ -317,7 +321,7 @@ def request_chat():
         ).get(conversation_id)
         
         if not conversation:
-            print(f"[Chat API] ERROR: Conversation {conversation_id} not found after creation!")
+            logger.error(f"Conversation {conversation_id} not found after creation")
             return jsonify({'error': 'Failed to create conversation'}), 500
         
         # Create notification for the other user
@@ -330,19 +334,17 @@ def request_chat():
                 notif_type='chat_request',
                 related_conversation_id=conversation.id
             )
-            print(f"[Chat API] Notification created for user {other_user_id}")
+            logger.debug(f"Notification created for user {other_user_id}")
         except Exception as notif_error:
-            print(f"[Chat API] Warning: Failed to create notification: {notif_error}")
+            logger.warning(f"Failed to create notification: {notif_error}")
             # Don't fail the request if notification fails
         
         try:
             conv_dict = conversation.to_dict(current_user.id)
-            print(f"[Chat API] Successfully converted conversation to dict")
+            logger.debug("Converted conversation to dict")
             return jsonify({'message': 'Chat request sent', 'conversation': conv_dict}), 201
         except Exception as dict_error:
-            print(f"[Chat API] Error converting conversation to dict: {dict_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error converting conversation to dict: {dict_error}")
             # Return basic response even if to_dict fails
             return jsonify({
                 'message': 'Chat request sent',
@@ -358,15 +360,11 @@ def request_chat():
             }), 201
     except SQLAlchemyError as e:
         db.session.rollback()
-        import traceback
-        print(f"[Chat API] SQLAlchemy error in request_chat: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"SQLAlchemy error in request_chat: {str(e)}")
         return jsonify({'error': 'Database error occurred.'}), 500
     except Exception as e:
         db.session.rollback()
-        import traceback
-        print(f"[Chat API] Error in request_chat: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"Error in request_chat: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -492,30 +490,27 @@ def get_messages(conversation_id):
             conversation_id=conversation_id
         ).order_by(ChatMessage.created_at.asc()).all()
         
-        # Filter out messages that are hidden for current user
-        filtered_messages = []
-        for msg in messages:
+        current_user_id = current_user.id
+
+        def serialize(msg):
             # Skip if deleted for this specific user (use getattr for backward compat)
-            if msg.sender_id == current_user.id and getattr(msg, 'deleted_for_sender', False):
-                continue
-            if msg.recipient_id == current_user.id and getattr(msg, 'deleted_for_recipient', False):
-                continue
+            if msg.sender_id == current_user_id and getattr(msg, 'deleted_for_sender', False):
+                return None
+            if msg.recipient_id == current_user_id and getattr(msg, 'deleted_for_recipient', False):
+                return None
             
             # Use the model's to_dict() method - it works when relationships are loaded
             try:
-                filtered_messages.append(msg.to_dict())
+                return msg.to_dict()
             except Exception as e:
                 # If to_dict() fails, skip this message but log the error
-                print(f"[Chat API] Error calling to_dict() for message {msg.id}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                continue
+                logger.exception(f"Error calling to_dict() for message {msg.id}: {str(e)}")
+                return None
         
-        return jsonify(filtered_messages), 200
+        # Hidden messages are filtered out; long histories are streamed while they serialize
+        return json_array(messages, serialize), 200
     except Exception as e:
-        import traceback
-        print(f"[Chat API] Error in get_messages: {str(e)}")
-        traceback.print_exc()
+        logger.exception(f"Error in get_messages: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -597,6 +592,99 @@ def send_message(conversation_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _file_payload(original, blob):
+    """Message content for a file; points at the content-addressed blob"""
+    return {
+        'type': 'file',
+        'name': original,
+        'size': blob.size,
+        'message': 'File attachment',
+        'blob_id': blob.id,
+        'sha256': blob.sha256
+    }
+
+
+def _send_attachment(data):
+    """Serve the file referenced by a chat file payload (blob-backed or legacy file_key)"""
+    from file_uploads import send_stored_file
+    from models import Blob
+    name = data.get('name', 'download')
+    blob = Blob.query.get(data['blob_id']) if data.get('blob_id') else None
+    if blob:
+        return send_stored_file(blob.storage_path, name, mimetype=blob.content_type, sha256=blob.sha256)
+    if data.get('file_key'):
+        # Uploads made before content-addressed storage
+        path = os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), data['file_key'])
+        return send_stored_file(path, name)
+    return jsonify({'error': 'No attachment found'}), 404
+
+
+def _release_file_payload(content):
+    """Drop the storage reference held by a file message whose content is being discarded"""
+    try:
+        data = json.loads(content or '')
+    except (TypeError, ValueError):
+        return
+    if not isinstance(data, dict) or data.get('type') != 'file':
+        return
+    from models import Blob
+    try:
+        blob = Blob.query.get(data['blob_id']) if data.get('blob_id') else None
+        if blob:
+            storage_service.release_blob(blob)
+        elif data.get('file_key'):
+            storage_service.delete_file(os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), data['file_key']))
+    except Exception as e:
+        # Anything left behind is reclaimed by storage_gc
+        logger.warning(f"Error releasing attachment: {e}")
+
+
+def _send_attachment_preview(data):
+    """Serve the rendered preview for a chat file payload"""
+    from file_uploads import send_preview
+    from models import Blob
+    return send_preview(Blob.query.get(data['blob_id']) if data.get('blob_id') else None)
+
+
+def create_conversation_attachment(conversation, sender, original, blob):
+    """Commit a file message for an already stored blob and notify the recipient"""
+    recipient_id = conversation.user2_id if conversation.user1_id == sender.id else conversation.user1_id
+    payload = _file_payload(original, blob)
+    message = ChatMessage(
+        conversation_id=conversation.id,
+        sender_id=sender.id,
+        recipient_id=recipient_id,
+        content=json.dumps(payload),
+        delivery_status='sent'
+    )
+    db.session.add(message)
+    db.session.commit()
+    upload_pipeline.process(blob)
+    
+    # Notify recipient
+    try:
+        create_notification(
+            user_id=recipient_id,
+            title='New Attachment',
+            message=f'{sender.name} sent a file: {original}',
+            notif_type='chat_message',
+            related_conversation_id=conversation.id
+        )
+    except Exception:
+        pass
+    return message
+
+
+def create_group_attachment(group_id, sender, original, blob):
+    """Commit a group file message for an already stored blob"""
+    payload = _file_payload(original, blob)
+    msg = GroupMessage(group_id=group_id, sender_id=sender.id, content=json.dumps(payload))
+    db.session.add(msg)
+    db.session.commit()
+    upload_pipeline.process(blob)
+    return msg
+
+
 @chat_bp.route('/conversations/<int:conversation_id>/attachments', methods=['POST'])
 @jwt_required()
 def upload_chat_attachment(conversation_id):
@@ -629,42 +717,9 @@ def upload_chat_attachment(conversation_id):
         if size > 50 * 1024 * 1024:
             return jsonify({'error': 'File exceeds 50 MB limit'}), 400
         
-        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
         original = secure_filename(f.filename)
-        unique = f"chat_{conversation_id}_{current_user.id}_{int(datetime.utcnow().timestamp())}_{original}"
-        path = os.path.join(upload_folder, unique)
-        f.save(path)
-        
-        recipient_id = conversation.user2_id if conversation.user1_id == current_user.id else conversation.user1_id
-        payload = {
-            'type': 'file',
-            'name': original,
-            'size': size,
-            'message': 'File attachment',
-            'file_key': unique
-        }
-        message = ChatMessage(
-            conversation_id=conversation_id,
-            sender_id=current_user.id,
-            recipient_id=recipient_id,
-            content=json.dumps(payload),
-            delivery_status='sent'
-        )
-        db.session.add(message)
-        db.session.commit()
-        
-        # Notify recipient
-        try:
-            create_notification(
-                user_id=recipient_id,
-                title='New Attachment',
-                message=f'{current_user.name} sent a file: {original}',
-                notif_type='chat_message',
-                related_conversation_id=conversation_id
-            )
-        except Exception:
-            pass
+        blob = storage_service.store_blob_file(f)
+        message = create_conversation_attachment(conversation, current_user, original, blob)
         
         return jsonify({'message': 'Attachment sent', 'chat_message': message.to_dict()}), 201
     except Exception as e:
@@ -672,38 +727,49 @@ def upload_chat_attachment(conversation_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _conversation_file_payload(message_id):
+    """Load the file payload of a direct message the current user may see; returns (data, error)"""
+    current_user = _get_current_user()
+    if not current_user:
+        return None, (jsonify({'error': 'Unauthorized'}), 401)
+    
+    message = ChatMessage.query.get(message_id)
+    if not message:
+        return None, (jsonify({'error': 'Message not found'}), 404)
+    
+    # Authorization: only participants
+    conversation = ChatConversation.query.get(message.conversation_id)
+    if conversation.user1_id != current_user.id and conversation.user2_id != current_user.id:
+        return None, (jsonify({'error': 'Access denied'}), 403)
+    
+    try:
+        return json.loads(message.content or '{}'), None
+    except Exception:
+        return {}, None
+
+
 @chat_bp.route('/attachments/<int:message_id>', methods=['GET'])
 @jwt_required()
 def download_chat_attachment(message_id):
     """Download a chat attachment associated with a message id."""
     try:
-        current_user = _get_current_user()
-        if not current_user:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        message = ChatMessage.query.get(message_id)
-        if not message:
-            return jsonify({'error': 'Message not found'}), 404
-        
-        # Authorization: only participants
-        conversation = ChatConversation.query.get(message.conversation_id)
-        if conversation.user1_id != current_user.id and conversation.user2_id != current_user.id:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        try:
-            data = json.loads(message.content or '{}')
-        except Exception:
-            data = {}
-        file_key = data.get('file_key')
-        name = data.get('name', 'download')
-        if not file_key:
-            return jsonify({'error': 'No attachment found'}), 404
-        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
-        path = os.path.join(upload_folder, file_key)
-        if not os.path.exists(path):
-            return jsonify({'error': 'File not found'}), 404
-        from flask import send_file
-        return send_file(path, as_attachment=True, download_name=name)
+        data, error = _conversation_file_payload(message_id)
+        if error:
+            return error
+        return _send_attachment(data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@chat_bp.route('/attachments/<int:message_id>/preview', methods=['GET'])
+@jwt_required()
+def preview_chat_attachment(message_id):
+    """Small JPEG preview of an image, PDF or video sent in a conversation."""
+    try:
+        data, error = _conversation_file_payload(message_id)
+        if error:
+            return error
+        return _send_attachment_preview(data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -986,6 +1052,7 @@ def delete_message_for_everyone(message_id):
         # Set is_deleted if column exists (backward compat)
         if hasattr(message, 'is_deleted'):
             message.is_deleted = True
+        _release_file_payload(message.content)
         message.content = 'This message was deleted'
         db.session.commit()
         
@@ -1129,6 +1196,7 @@ def remove_reaction(message_id, reaction_id):
 
 @chat_bp.route('/groups', methods=['GET'])
 @jwt_required()
+@conditional_get('chat_groups', 'chat_group_members')
 def get_groups():
     current_user = get_current_user()
     try:
@@ -1192,8 +1260,7 @@ def get_group_messages(group_id):
     current_user = get_current_user()
     try:
         # Validate membership
-        is_member = ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first()
-        if not is_member:
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         # Eager load relationships to prevent lazy loading errors
         from sqlalchemy.orm import joinedload, selectinload
@@ -1371,8 +1438,7 @@ def send_group_message(group_id):
     if not content:
         return jsonify({'error': 'Message content is required'}), 400
     try:
-        is_member = ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first()
-        if not is_member:
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         msg = GroupMessage(group_id=group_id, sender_id=current_user.id, content=content, reply_to_id=reply_to_id)
         db.session.add(msg)
@@ -1399,7 +1465,7 @@ def edit_group_message(message_id):
         if not msg:
             return jsonify({'error': 'Message not found'}), 404
         # Verify membership
-        if not ChatGroupMember.query.filter_by(group_id=msg.group_id, user_id=current_user.id).first():
+        if not is_group_member(msg.group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         # Only sender can edit
         if msg.sender_id != current_user.id:
@@ -1427,7 +1493,7 @@ def delete_group_message_for_everyone(message_id):
         msg = GroupMessage.query.get(message_id)
         if not msg:
             return jsonify({'error': 'Message not found'}), 404
-        if not ChatGroupMember.query.filter_by(group_id=msg.group_id, user_id=current_user.id).first():
+        if not is_group_member(msg.group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         if msg.sender_id != current_user.id:
             return jsonify({'error': 'You can only delete your own messages for everyone'}), 403
@@ -1436,6 +1502,7 @@ def delete_group_message_for_everyone(message_id):
             return jsonify({'error': 'Messages can only be deleted for everyone within 30 minutes'}), 400
         if hasattr(msg, 'is_deleted'):
             msg.is_deleted = True
+        _release_file_payload(msg.content)
         msg.content = 'This message was deleted'
         db.session.commit()
         return jsonify({'message': 'Message deleted for everyone'}), 200
@@ -1453,7 +1520,7 @@ def delete_group_message_for_me(message_id):
         msg = GroupMessage.query.get(message_id)
         if not msg:
             return jsonify({'error': 'Message not found'}), 404
-        if not ChatGroupMember.query.filter_by(group_id=msg.group_id, user_id=current_user.id).first():
+        if not is_group_member(msg.group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         # For simplicity, client will hide "deleted_for_me" messages; we track in reads table is enough or just return ok.
         return jsonify({'message': 'Message deleted for you'}), 200
@@ -1474,7 +1541,7 @@ def add_group_reaction(message_id):
         msg = GroupMessage.query.get(message_id)
         if not msg:
             return jsonify({'error': 'Message not found'}), 404
-        if not ChatGroupMember.query.filter_by(group_id=msg.group_id, user_id=current_user.id).first():
+        if not is_group_member(msg.group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         existing = GroupMessageReaction.query.filter_by(message_id=message_id, user_id=current_user.id, emoji=emoji).first()
         if existing:
@@ -1514,7 +1581,7 @@ def upload_group_attachment(group_id):
     """Upload file to group as a message (<=50 MB)."""
     try:
         current_user = get_current_user()
-        if not ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first():
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -1527,54 +1594,53 @@ def upload_group_attachment(group_id):
         f.seek(0)
         if size > 50 * 1024 * 1024:
             return jsonify({'error': 'File exceeds 50 MB limit'}), 400
-        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
         original = secure_filename(f.filename)
-        unique = f"group_{group_id}_{current_user.id}_{int(datetime.utcnow().timestamp())}_{original}"
-        path = os.path.join(upload_folder, unique)
-        f.save(path)
-        payload = {
-            'type': 'file',
-            'name': original,
-            'size': size,
-            'message': 'File attachment',
-            'file_key': unique
-        }
-        msg = GroupMessage(group_id=group_id, sender_id=current_user.id, content=json.dumps(payload))
-        db.session.add(msg)
-        db.session.commit()
+        blob = storage_service.store_blob_file(f)
+        msg = create_group_attachment(group_id, current_user, original, blob)
         return jsonify({'message': 'Attachment sent', 'group_message': msg.to_dict()}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+def _group_file_payload(message_id):
+    """Load the file payload of a group message the current user may see; returns (data, error)"""
+    current_user = get_current_user()
+    msg = GroupMessage.query.get(message_id)
+    if not msg:
+        return None, (jsonify({'error': 'Message not found'}), 404)
+    if not is_group_member(msg.group_id, current_user.id):
+        return None, (jsonify({'error': 'Access denied'}), 403)
+    try:
+        return json.loads(msg.content or '{}'), None
+    except Exception:
+        return {}, None
+
+
 @chat_bp.route('/groups/attachments/<int:message_id>', methods=['GET'])
 @jwt_required()
 def download_group_attachment(message_id):
     try:
-        current_user = get_current_user()
-        msg = GroupMessage.query.get(message_id)
-        if not msg:
-            return jsonify({'error': 'Message not found'}), 404
-        if not ChatGroupMember.query.filter_by(group_id=msg.group_id, user_id=current_user.id).first():
-            return jsonify({'error': 'Access denied'}), 403
-        try:
-            data = json.loads(msg.content or '{}')
-        except Exception:
-            data = {}
-        file_key = data.get('file_key')
-        name = data.get('name', 'download')
-        if not file_key:
-            return jsonify({'error': 'No attachment found'}), 404
-        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
-        path = os.path.join(upload_folder, file_key)
-        if not os.path.exists(path):
-            return jsonify({'error': 'File not found'}), 404
-        from flask import send_file
-        return send_file(path, as_attachment=True, download_name=name)
+        data, error = _group_file_payload(message_id)
+        if error:
+            return error
+        return _send_attachment(data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@chat_bp.route('/groups/attachments/<int:message_id>/preview', methods=['GET'])
+@jwt_required()
+def preview_group_attachment(message_id):
+    try:
+        data, error = _group_file_payload(message_id)
+        if error:
+            return error
+        return _send_attachment_preview(data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
 @chat_bp.route('/groups/<int:group_id>/typing', methods=['POST'])
 @jwt_required()
 def group_typing(group_id):
@@ -1583,7 +1649,7 @@ def group_typing(group_id):
     typing = bool(data.get('typing'))
     try:
         # Validate membership
-        if not ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first():
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         key = (f'g{group_id}', current_user.id)
         now = _now_ts()
@@ -1599,7 +1665,7 @@ def group_typing(group_id):
 def group_get_typing(group_id):
     current_user = get_current_user()
     try:
-        if not ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first():
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         now = _now_ts()
         typers = []
@@ -1618,7 +1684,7 @@ def group_get_typing(group_id):
 def group_mark_read(group_id):
     current_user = get_current_user()
     try:
-        if not ChatGroupMember.query.filter_by(group_id=group_id, user_id=current_user.id).first():
+        if not is_group_member(group_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         # Mark all current messages as read for this user (idempotent)
         msgs = GroupMessage.query.filter_by(group_id=group_id).all()
@@ -0,0 +1,280 @@
+"""
+Conditional GETs (ETag / If-None-Match) for polled list endpoints.
+
+Every table has a version that moves forward whenever a transaction that
+wrote to it commits: ORM flushes (inserts, updates, deletes, cascades) and
+bulk query.update() / delete() statements are both seen. Some tables are
+also versioned per owner (notifications per user_id), so one user's new
+notification does not invalidate everyone else's list.
+
+An endpoint declares the tables its response is built from:
+
+    @notifications_bp.route('/', methods=['GET'])
+    @jwt_required()
+    @conditional_get('notifications:{user}')
+    def get_notifications(): ...
+
+Before the view runs, the decorator reads those versions and builds a weak
+ETag from them, the endpoint, the user and the query string. If the client's
+If-None-Match matches, it answers 304 without querying or serializing. On a
+200 the ETag is attached, with Cache-Control: private, no-cache, so browsers
+revalidate every poll.
+
+The versions live in a store shared by every instance: redis. A store that
+only some processes see would let one answer 304 for a change committed in
+another, so the sqlite store (shared by the workers of one host) and the
+per-process memory store are only used when chosen explicitly, for a single
+instance or tests. With several instances (Cloud Run) only redis is correct.
+Without redis, or when the store fails, responses are served normally
+without ETags. Writes made outside the ORM (raw SQL,
+other services) are not seen.
+
+With a read replica, no ETag is issued while a scope changed within
+READ_YOUR_WRITES_SECONDS, because the replica may not have the change yet.
+
+Configuration (environment variables):
+    COLLECTION_VERSION_BACKEND      memory|sqlite|redis (defaults to redis if RATE_LIMIT_BACKEND is redis; sqlite is single-instance only)
+    COLLECTION_VERSION_SQLITE_PATH  SQLite file for the sqlite store
+    COLLECTION_VERSION_REDIS_URL    Redis URL (defaults to RATE_LIMIT_REDIS_URL)
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper, object_session
+
+from read_routing import READ_YOUR_WRITES_WINDOW, RoutingSession, reading_from_replica
+
+logger = logging.getLogger(__name__)
+
+# Tables versioned per owner column as well: a row change bumps '<table>:<owner>' only
+PARTITIONED_TABLES = {'notifications': 'user_id'}
+
+_PENDING_KEY = '_collection_scopes'
+
+
+def _next_version(previous: int) -> int:
+    # Milliseconds since the epoch, so a version also says when it last changed
+    return max(previous + 1, int(time.time() * 1000))
+
+
+# ========== VERSION STORES ==========
+
+class MemoryVersionStore:
+    """Process-local versions (single worker, tests)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = _next_version(self._versions.get(scope, 0))
+
+    def get(self, scopes):
+        with self._lock:
+            return [self._versions.get(scope, 0) for scope in scopes]
+
+
+class SQLiteVersionStore:
+    """Versions in a SQLite file shared by all gunicorn workers on one host"""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 2000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS collection_versions (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def bump(self, scopes):
+        now = _next_version(0)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO collection_versions (scope, version) VALUES (?, ?) "
+                "ON CONFLICT(scope) DO UPDATE SET version = MAX(version + 1, excluded.version)",
+                [(scope, now) for scope in scopes],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, scopes):
+        placeholders = ','.join('?' * len(scopes))
+        rows = dict(self._conn().execute(
+            f"SELECT scope, version FROM collection_versions WHERE scope IN ({placeholders})", list(scopes)
+        ).fetchall())
+        return [rows.get(scope, 0) for scope in scopes]
+
+
+class RedisVersionStore:
+    """Versions as Redis keys, shared by all nodes"""
+
+    # Same rule as _next_version, atomically per key
+    BUMP_SCRIPT = """
+    for i, key in ipairs(KEYS) do
+        local version = math.max(tonumber(redis.call('GET', key) or '0') + 1, tonumber(ARGV[1]))
+        redis.call('SET', key, version)
+    end
+    return 1
+    """
+
+    def __init__(self, url: str, prefix: str = 'workhub:collection:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._bump = self.client.register_script(self.BUMP_SCRIPT)
+
+    def bump(self, scopes):
+        self._bump(keys=[self.prefix + scope for scope in scopes], args=[_next_version(0)])
+
+    def get(self, scopes):
+        return [int(v or 0) for v in self.client.mget([self.prefix + scope for scope in scopes])]
+
+
+def get_store_from_env():
+    """Build the store selected by COLLECTION_VERSION_BACKEND, or None (conditional GETs off)"""
+    kind = os.environ.get('COLLECTION_VERSION_BACKEND')
+    if not kind:
+        # Follow the rate limiter only when its store is shared by every instance; its sqlite
+        # store is per instance, and a 304 from one instance could hide another's change
+        kind = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+        if kind.lower() != 'redis':
+            logger.info("No shared collection version store configured; list endpoints are served without ETags")
+            return None
+    kind = kind.lower()
+    try:
+        if kind == 'memory':
+            return MemoryVersionStore()
+        if kind == 'sqlite':
+            return SQLiteVersionStore(
+                os.environ.get('COLLECTION_VERSION_SQLITE_PATH', '/tmp/workhub_collection_versions.db')
+            )
+        if kind == 'redis':
+            url = os.environ.get('COLLECTION_VERSION_REDIS_URL') or os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+            return RedisVersionStore(url)
+        logger.warning(f"Unknown COLLECTION_VERSION_BACKEND '{kind}'; list endpoints are served without ETags")
+    except Exception as e:
+        logger.warning(f"Collection version store '{kind}' unavailable; list endpoints are served without ETags: {e}")
+    return None
+
+
+version_store = get_store_from_env()
+
+
+# ========== TRACKING WRITES ==========
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+def _note_row(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    table = mapper.local_table.name
+    owner_column = PARTITIONED_TABLES.get(table)
+    owner = getattr(target, owner_column, None) if owner_column else None
+    _pending(session).add(f"{table}:{owner}" if owner is not None else table)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Mapper, _event_name, _note_row)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    # query.update() / delete() and insert() statements skip the flush; their rows are unknown
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    table = mapper.local_table if mapper is not None else getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and getattr(table, 'name', None):
+        _pending(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _bump_committed(session):
+    # Scopes of rolled-back writes are kept and bumped at the next commit: a spurious bump only costs one full response
+    scopes = session.info.pop(_PENDING_KEY, None)
+    if not scopes or version_store is None:
+        return
+    try:
+        version_store.bump(sorted(scopes))
+    except Exception as e:
+        logger.error(f"Could not bump collection versions {sorted(scopes)}; cached lists may be stale: {e}")
+
+
+# ========== CONDITIONAL GET ==========
+
+def _scope_versions(scopes, user_id):
+    names = [scope.format(user=user_id) for scope in scopes]
+    # Bulk statements on a partitioned table bump the whole table
+    names += sorted({name.split(':', 1)[0] for name in names if ':' in name} - set(names))
+    return names, version_store.get(names)
+
+
+def _etag(user_id, names, versions):
+    args = sorted(request.args.items(multi=True))
+    key = f"{request.endpoint}|{user_id}|{args}|{list(zip(names, versions))}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def _replica_may_lag(versions) -> bool:
+    if not reading_from_replica():
+        return False
+    return time.time() - max(versions, default=0) / 1000 < READ_YOUR_WRITES_WINDOW
+
+
+def conditional_get(*scopes):
+    """
+    Answer If-None-Match from the versions of scopes (table names, '{user}' is the
+    requester's id). Place under @jwt_required and @read_replica.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if version_store is None or not has_request_context() or request.method not in ('GET', 'HEAD'):
+                return fn(*args, **kwargs)
+            user_id = get_jwt_identity()
+            try:
+                names, versions = _scope_versions(scopes, user_id)
+            except Exception as e:
+                logger.warning(f"Collection versions unavailable, serving {request.endpoint} without ETag: {e}")
+                return fn(*args, **kwargs)
+            if _replica_may_lag(versions):
+                return fn(*args, **kwargs)
+
+            etag = _etag(user_id, names, versions)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,227 @@
+"""
+Response compression (brotli or gzip) for API responses.
+
+A response is compressed when:
+    - the client accepts br or gzip (Accept-Encoding, q-values honoured; br wins ties)
+    - its type is compressible: text/*, JSON, XML, JavaScript, SVG
+    - it is at least COMPRESS_MIN_BYTES, or it is a streamed list (json_provider)
+    - it is not a Range/206 response and has no Content-Encoding yet
+
+Files from send_file are compressed only if their type is in that list and
+they are at most COMPRESS_MAX_FILE_BYTES. Images, video, archives, PDFs and
+Office files are already compressed and are sent as they are.
+
+CPU budget: each process tracks the CPU time it spent compressing, decayed
+over one second. Up to half of COMPRESS_CPU_BUDGET_MS per second it uses the
+normal level (gzip 6 / brotli 5). Under more load it steps down to faster
+levels. Past the budget it stops compressing until usage decays. Bodies over
+1 MB always use the fastest level. Streamed responses are compressed chunk
+by chunk with a sync flush, so their first bytes still go out early.
+
+Configuration (environment variables):
+    COMPRESS_ENABLED          'false' to disable (default true)
+    COMPRESS_MIN_BYTES        Smallest body worth compressing (default 1024)
+    COMPRESS_MAX_FILE_BYTES   Largest send_file body to compress (default 2 MiB)
+    COMPRESS_CPU_BUDGET_MS    Compression CPU per second per process (default 200)
+"""
+
+import gzip
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+
+from flask import request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # Optional dependency: gzip only without it
+    brotli = None
+
+ENABLED = str(os.environ.get('COMPRESS_ENABLED', 'true')).lower() == 'true'
+MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+MAX_FILE_BYTES = int(os.environ.get('COMPRESS_MAX_FILE_BYTES', 2 * 1024 * 1024))
+CPU_BUDGET_MS = float(os.environ.get('COMPRESS_CPU_BUDGET_MS', 200))
+
+LARGE_BODY_BYTES = 1024 * 1024
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'application/xhtml+xml',
+    'application/x-ndjson', 'image/svg+xml',
+}
+
+# Levels from normal to fastest, chosen by CPU budget usage
+LEVELS = {'gzip': (6, 4, 1), 'br': (5, 4, 1)}
+USAGE_TIERS = (0.5, 0.8, 1.0)
+
+
+def is_compressible(mimetype):
+    if not mimetype:
+        return False
+    return (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+            or mimetype.endswith('+json') or mimetype.endswith('+xml'))
+
+
+class CompressionBudget:
+    """CPU seconds spent compressing, decayed over one second, against a per-second budget"""
+
+    def __init__(self, budget_ms: float, window: float = 1.0):
+        self.budget = budget_ms / 1000
+        self.window = window
+        self._spent = 0.0
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _decayed(self, now):
+        return self._spent * math.exp(-(now - self._at) / self.window)
+
+    def usage(self) -> float:
+        """Fraction of the budget in use (1.0 = at budget)"""
+        with self._lock:
+            return self._decayed(time.monotonic()) / self.budget if self.budget > 0 else float('inf')
+
+    def record(self, cpu_seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._spent = self._decayed(now) + cpu_seconds
+            self._at = now
+
+    def level(self, encoding, size=None):
+        """Compression level for the current load, or None when over budget"""
+        usage = self.usage()
+        for tier, limit in enumerate(USAGE_TIERS):
+            if usage < limit:
+                if size is not None and size > LARGE_BODY_BYTES:
+                    tier = len(USAGE_TIERS) - 1
+                return LEVELS[encoding][tier]
+        return None
+
+
+budget = CompressionBudget(CPU_BUDGET_MS)
+
+
+def negotiate():
+    """'br', 'gzip' or None for the current request's Accept-Encoding"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor; every chunk is flushed so it can be sent immediately"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.finish() if self.encoding == 'br' else self._compressor.flush()
+
+
+def _compress_stream(chunks, encoding, level):
+    compressor = _StreamCompressor(encoding, level)
+    raw = compressed = 0
+    for data in chunks:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        started = time.thread_time()
+        out = compressor.chunk(data)
+        budget.record(time.thread_time() - started)
+        raw += len(data)
+        compressed += len(out)
+        if out:
+            yield out
+    out = compressor.finish()
+    compressed += len(out)
+    yield out
+    metrics.observe_compression(encoding, raw, compressed)
+
+
+def compress_response(response):
+    """after_request hook: compress the body if the client and the budget allow it"""
+    if not ENABLED or request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or not is_compressible(response.mimetype):
+        return response
+    # The representation now depends on Accept-Encoding, whether or not this one is compressed
+    response.vary.add('Accept-Encoding')
+    if request.range is not None:
+        return response
+
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    if response.direct_passthrough:
+        # send_file: only small text-like files; large or range-served files go out untouched
+        if response.content_length is None or response.content_length > MAX_FILE_BYTES:
+            return response
+        response.direct_passthrough = False
+    elif response.is_streamed:
+        level = budget.level(encoding)
+        if level is None:
+            return response
+        original = response.response
+        response.response = _compress_stream(original, encoding, level)
+        # Closing the response must still close the original stream (ends its request context)
+        if hasattr(original, 'close'):
+            response.call_on_close(original.close)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        _weaken_etag(response)
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_BYTES:
+        return response
+    level = budget.level(encoding, len(data))
+    if level is None:
+        return response
+    started = time.thread_time()
+    compressed = _compress(data, encoding, level)
+    budget.record(time.thread_time() - started)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    metrics.observe_compression(encoding, len(data), len(compressed))
+    return response
+
+
+def _weaken_etag(response):
+    # A strong ETag names exact bytes; the compressed body is only semantically equivalent
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_app(app):
+    """Register compression; it should be the first after_request hook registered, so it runs last"""
+    if not ENABLED:
+        logger.info("Response compression disabled (COMPRESS_ENABLED=false)")
+        return
+    if brotli is None:
+        logger.info("brotli not installed; compressing responses with gzip only")
+    app.after_request(compress_response)
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from urllib.parse import quote_plus as urlquote
+from db_pool import engine_options_from_env, binds_from_env
 
 load_dotenv()
 
@@ -97,7 +98,14 @@ class Config:
         SQLALCHEMY_DATABASE_URI = (
             f"mysql+pymysql://{encoded_user}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
         )
+    # A full URL overrides the above, e.g. sqlite:////tmp/workhub-load.db for local load tests
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or SQLALCHEMY_DATABASE_URI
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool sizing, recycling and pre-ping (see db_pool.py for the env vars)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options_from_env(SQLALCHEMY_DATABASE_URI)
+    # Optional read-only replica, exposed as the 'replica' bind
+    SQLALCHEMY_BINDS = binds_from_env(SQLALCHEMY_DATABASE_URI)
     
     # JWT Configuration
     JWT_TOKEN_LOCATION = ['headers']
@@ -0,0 +1,204 @@
+"""
+Database connection pool configuration and metrics.
+
+SQLAlchemy's defaults (5 connections, no recycling, no pre-ping) give stale
+connections after Cloud SQL idle timeouts and pool exhaustion under load, so
+the engine options are built from environment variables instead. The primary
+(and optional read replica) engines use InstrumentedQueuePool, which records
+how long each checkout waits and how often the pool runs dry.
+
+Configuration (environment variables):
+    DB_POOL_SIZE              Persistent connections per process (default 5)
+    DB_MAX_OVERFLOW           Extra connections allowed under load (default 5)
+    DB_POOL_TIMEOUT           Seconds to wait for a free connection (default 10)
+    DB_POOL_RECYCLE           Reconnect connections older than this, seconds (default 1800)
+    DB_POOL_PRE_PING          'true' to test connections on checkout (default true)
+    DB_CONNECT_TIMEOUT        pymssql login timeout in seconds (optional)
+    DB_POOL_SLOW_CHECKOUT_MS  Log checkouts that wait longer than this (default 500)
+    DB_REPLICA_HOST / DB_REPLICA_PORT  Read-only replica, same credentials as the primary
+    DATABASE_REPLICA_URL      Full replica URL (overrides DB_REPLICA_HOST)
+
+Metrics are served to admins at /api/health/db-pool.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+# Upper bounds (ms) of the checkout wait histogram
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def _env_bool(name, default):
+    return str(os.environ.get(name, default)).lower() == 'true'
+
+
+def engine_options_from_env(uri: str, name: str = 'primary') -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for uri; SQLite keeps SQLAlchemy's own pool"""
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_logging_name': name,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', 'true'),
+    }
+    connect_timeout = os.environ.get('DB_CONNECT_TIMEOUT')
+    if connect_timeout and make_url(uri).get_driver_name() == 'pymssql':
+        options['connect_args'] = {'login_timeout': int(connect_timeout)}
+    return options
+
+
+def replica_uri_from_env(primary_uri: str) -> Optional[str]:
+    """Replica URL from DATABASE_REPLICA_URL, or the primary URL pointed at DB_REPLICA_HOST"""
+    explicit = os.environ.get('DATABASE_REPLICA_URL')
+    if explicit:
+        return explicit
+    host = os.environ.get('DB_REPLICA_HOST')
+    if not host:
+        return None
+    primary = make_url(primary_uri)
+    port = os.environ.get('DB_REPLICA_PORT') or primary.port
+    return primary.set(host=host, port=int(port) if port else None).render_as_string(hide_password=False)
+
+
+def binds_from_env(primary_uri: str) -> dict:
+    """SQLALCHEMY_BINDS with the read replica, if one is configured"""
+    replica_uri = replica_uri_from_env(primary_uri)
+    if not replica_uri:
+        return {}
+    return {REPLICA_BIND: dict(engine_options_from_env(replica_uri, REPLICA_BIND), url=replica_uri)}
+
+
+class _PoolStats:
+    """Thread-safe checkout counters for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.exhausted = 0
+        self.timeouts = 0
+        self.invalidated = 0
+
+    def record_checkout(self, wait_ms: float, exhausted: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            if wait_ms > self.max_wait_ms:
+                self.max_wait_ms = wait_ms
+            index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if wait_ms <= bound), len(WAIT_BUCKETS_MS))
+            self.buckets[index] += 1
+            if exhausted:
+                self.exhausted += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+            self.exhausted += 1
+
+    def record_invalidated(self):
+        with self._lock:
+            self.invalidated += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + ['inf']
+            return {
+                'checkouts': self.checkouts,
+                'avg_wait_ms': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'wait_histogram': dict(zip(labels, self.buckets)),
+                'exhausted': self.exhausted,
+                'timeouts': self.timeouts,
+                'invalidated': self.invalidated,
+            }
+
+
+class PoolMetrics:
+    """Registry of InstrumentedQueuePool stats, keyed by pool name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pools = weakref.WeakValueDictionary()
+        self.slow_checkout_ms = float(os.environ.get('DB_POOL_SLOW_CHECKOUT_MS', 500))
+        # Callables (pool, wait_ms, timed_out) run on every checkout, e.g. metrics.observe_pool_checkout
+        self.listeners = []
+
+    def register(self, pool) -> _PoolStats:
+        name = pool.logging_name or 'primary'
+        with self._lock:
+            self._pools[name] = pool
+            return self._stats.setdefault(name, _PoolStats())
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            items = list(self._stats.items())
+            pools = dict(self._pools)
+        metrics = {}
+        for name, stats in items:
+            entry = stats.to_dict()
+            pool = pools.get(name)
+            if pool is not None:
+                entry.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'overflow': max(pool.overflow(), 0),
+                    'max_overflow': pool._max_overflow,
+                    'timeout_s': pool.timeout(),
+                })
+            metrics[name] = entry
+        return metrics
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times checkouts and counts exhaustion (all connections in use)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Stats are shared by name, so a pool recreated after a disconnect keeps counting
+        self._stats = pool_metrics.register(self)
+        if '_dispatch' not in kwargs:
+            stats = self._stats
+            event.listen(self, 'invalidate', lambda *args: stats.record_invalidated())
+
+    def connect(self):
+        # No idle connection and no overflow left: this checkout has to wait
+        exhausted = self.checkedout() >= self.size() + self._max_overflow
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self._stats.record_timeout()
+            for listener in pool_metrics.listeners:
+                listener(self, 0.0, timed_out=True)
+            logger.warning(f"Database pool '{self.logging_name}' exhausted: {self.status()}")
+            raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._stats.record_checkout(wait_ms, exhausted)
+        for listener in pool_metrics.listeners:
+            listener(self, wait_ms)
+        if wait_ms >= pool_metrics.slow_checkout_ms:
+            logger.warning(f"Slow database pool checkout ({wait_ms:.0f} ms): {self.status()}")
+        return connection
+
+
+# Export singleton instance
+pool_metrics = PoolMetrics()
@@ -13,6 +13,7 @@ from datetime import datetime
 from typing import List, Dict, Optional
 import logging
 import html
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +38,13 @@ class EmailService:
     def init_app(self, app):
         """Initialize email service with Flask app config"""
         self.app = app  # Store app instance for later use
-        self._load_config_from_app(app)
+        # SystemSettings fallback is deferred to send time so startup does no DB work
+        self._load_config_from_app(app, use_database=False)
         
         if self.enabled and not self.smtp_username:
             logger.warning("Email notifications enabled but SMTP credentials not configured")
     
-    def _load_config_from_app(self, app):
+    def _load_config_from_app(self, app, use_database=True):
         """Load email configuration from app.config, with fallback to SystemSettings"""
         self.smtp_server = app.config.get('SMTP_SERVER', 'smtp.gmail.com')
         self.smtp_port = app.config.get('SMTP_PORT', 587)
@@ -54,7 +56,7 @@ class EmailService:
         self.frontend_url = app.config.get('FRONTEND_URL', 'http://localhost:5173')
         
         # If credentials not in app.config, try loading from SystemSettings database
-        if not self.smtp_username or not self.smtp_password:
+        if use_database and (not self.smtp_username or not self.smtp_password):
             try:
                 from models import SystemSettings
                 with app.app_context():
@@ -104,6 +106,11 @@ class EmailService:
             logger.error("SMTP credentials not configured")
             return False
         
+        with metrics.track_email_send() as send:
+            return send.result(self._send_message(to_email, subject, html_content, plain_content))
+
+    def _send_message(self, to_email: str, subject: str, html_content: str, plain_content: str = None) -> bool:
+        """Build the message and deliver it over SMTP"""
         try:
             # Create message
             msg = MIMEMultipart('alternative')
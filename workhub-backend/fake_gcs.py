@@ -0,0 +1,113 @@
+"""
+Local stand-in for the subset of google.cloud.storage used by StorageService.
+
+Objects are plain files under FAKE_GCS_ROOT/<bucket>/<name>, so cloud code
+paths (gs:// URLs, signed URLs, composed uploads) can be exercised offline.
+Enable with USE_CLOUD_STORAGE=true and FAKE_GCS_ROOT=/some/dir.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+from datetime import datetime, timezone, timedelta
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.updated = None
+
+    @property
+    def _path(self):
+        return os.path.join(self.bucket._root, *self.name.split('/'))
+
+    def _prepare(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self._prepare()
+        with open(self._path, 'wb') as fh:
+            shutil.copyfileobj(file_obj, fh)
+
+    def upload_from_filename(self, filename, content_type=None):
+        self._prepare()
+        shutil.copyfile(filename, self._path)
+
+    def compose(self, sources):
+        self.bucket.client.api_calls += 1
+        self._prepare()
+        with open(self._path, 'wb') as out:
+            for source in sources:
+                with open(source._path, 'rb') as fh:
+                    shutil.copyfileobj(fh, out)
+
+    def download_to_filename(self, filename):
+        shutil.copyfile(self._path, filename)
+
+    def open(self, mode='rb'):
+        return open(self._path, mode)
+
+    def exists(self):
+        self.bucket.client.api_calls += 1
+        return os.path.isfile(self._path)
+
+    def reload(self):
+        self.bucket.client.api_calls += 1
+        stat = os.stat(self._path)
+        self.size = stat.st_size
+        self.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+    def delete(self):
+        self.bucket.client.api_calls += 1
+        os.remove(self._path)
+
+    def generate_signed_url(self, expiration, method='GET'):
+        self.bucket.client.api_calls += 1
+        if isinstance(expiration, timedelta):
+            expiration = int(time.time() + expiration.total_seconds())
+        signature = hashlib.sha256(f"{self.bucket.name}/{self.name}:{expiration}:{method}".encode()).hexdigest()
+        return f"{self.bucket.client.base_url}/{self.bucket.name}/{self.name}?Expires={expiration}&Signature={signature}"
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._root = os.path.join(client.root, name)
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=''):
+        """Like GCS, listing is flat: every object whose name starts with prefix"""
+        self.client.api_calls += 1
+        directory = prefix.rsplit('/', 1)[0] if '/' in prefix else ''
+        start = os.path.join(self._root, *directory.split('/')) if directory else self._root
+        for root, dirs, files in os.walk(start):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self._root).replace(os.sep, '/')
+                if not name.startswith(prefix):
+                    continue
+                blob = FakeBlob(self, name)
+                stat = os.stat(path)
+                blob.size = stat.st_size
+                blob.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+                yield blob
+
+
+class FakeStorageClient:
+    """Drop-in for google.cloud.storage.Client backed by a local directory"""
+
+    def __init__(self, root, base_url='http://localhost:4443'):
+        self.root = root
+        self.base_url = base_url
+        # Number of simulated network calls, for tests and benchmarks
+        self.api_calls = 0
+
+    def bucket(self, name):
+        return FakeBucket(self, name)
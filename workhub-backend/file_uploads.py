@@ -4,13 +4,17 @@ File Upload Service for Task Attachments
 Handles file upload, validation, storage, and retrieval
 """
 
-from flask import Blueprint, request, jsonify, send_file, current_app, redirect
+from flask import Blueprint, request, jsonify, send_file, current_app, redirect, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from models import db, FileAttachment, Task, User, ProjectMember
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from models import db, FileAttachment, Task, User, ProjectMember, StorageUsage
 from auth import get_current_user
 from permissions import Permission
 from storage_service import storage_service
+from preview_service import preview_service, preview_path_for, STATUS_READY, STATUS_PENDING
+from upload_pipeline import upload_pipeline
+from request_cache import get_user, is_project_member
 import os
 import uuid
 import mimetypes
@@ -32,6 +36,14 @@ ALLOWED_EXTENSIONS = {
 # Maximum file size: 50 MB
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB in bytes
 
+# Content-addressed files never change, so clients may cache them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# When set (e.g. '/protected-uploads/'), downloads are handed to nginx via
+# X-Accel-Redirect instead of streaming the bytes from a gunicorn thread.
+# The prefix must map to UPLOAD_FOLDER in an nginx 'internal' location.
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
+
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -64,6 +76,152 @@ def get_upload_folder():
     return upload_folder
 
 
+def check_upload_permission(user, task):
+    """
+    Return an error message if user may not add attachments to task, else None.
+
+    Permission matrix for attachments:
+    - super_admin/admin: can add to any task
+    - manager/team_lead: can add to tasks in projects they belong to
+    - others: only if assigned or creator
+    """
+    if user.role in ('admin', 'super_admin'):
+        return None
+    if user.role in ('manager', 'team_lead'):
+        if not task.project_id:
+            return 'Project not set on task; cannot verify permission'
+        if not is_project_member(task.project_id, user.id):
+            return 'You may only add attachments within your projects'
+        return None
+    if task.assigned_to != user.id and task.created_by != user.id:
+        return 'You do not have permission to add attachments to this task'
+    return None
+
+
+def build_attachment(task_id, user_id, original_filename, blob):
+    """Create (but do not commit) the FileAttachment row pointing at a stored blob"""
+    file_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+    attachment = FileAttachment(
+        task_id=task_id,
+        user_id=user_id,
+        filename=generate_unique_filename(original_filename),
+        original_filename=original_filename,
+        file_size=blob.size,
+        file_type=file_type,
+        file_path=blob.storage_path,
+        blob_id=blob.id
+    )
+    db.session.add(attachment)
+    storage_service.adjust_usage(user_id, 1, blob.size)
+    return attachment
+
+
+def delete_attachments(query):
+    """
+    Delete the FileAttachment rows matched by query, release their stored
+    files and update usage counters (caller commits; unreferenced files are
+    removed once the commit succeeds). Returns the row count.
+    """
+    rows = query.with_entities(FileAttachment.user_id, FileAttachment.file_size, FileAttachment.file_path).all()
+    if not rows:
+        return 0
+    query.delete(synchronize_session=False)
+    db.session.flush()
+    
+    usage = {}
+    for user_id, file_size, file_path in rows:
+        files, size = usage.get(user_id, (0, 0))
+        usage[user_id] = (files + 1, size + (file_size or 0))
+        try:
+            storage_service.delete_file(file_path)
+        except Exception as e:
+            # Anything left behind is reclaimed by storage_gc
+            logger.error(f"Error deleting file from storage: {str(e)}")
+    for user_id, (files, size) in usage.items():
+        storage_service.adjust_usage(user_id, -files, -size)
+    return len(rows)
+
+
+def send_stored_file(file_path, download_name, mimetype=None, sha256=None, as_attachment=True):
+    """
+    Respond with a stored attachment.
+
+    - Cloud files redirect to a short-lived signed URL.
+    - Local files support Range requests (206) and If-None-Match (304).
+      Content-addressed files get a strong ETag (their SHA-256) and a long
+      private cache lifetime; legacy files are revalidated on every use.
+    - With X_ACCEL_REDIRECT_PREFIX set, nginx serves the bytes.
+    """
+    if file_path.startswith('gs://'):
+        signed_url = storage_service.generate_signed_url(file_path, expiration_minutes=15)
+        if not signed_url:
+            return jsonify({'error': 'Failed to generate download URL'}), 500
+        return redirect(signed_url)
+
+    if X_ACCEL_REDIRECT_PREFIX:
+        if not storage_service.file_exists(file_path):
+            return jsonify({'error': 'File not found on server'}), 404
+        response = make_response('', 200)
+        if sha256:
+            response.set_etag(sha256)
+            _set_cache_headers(response, sha256)
+            if request.if_none_match.contains(sha256):
+                response.status_code = 304
+                return response
+        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
+        relative = os.path.relpath(os.path.abspath(file_path), os.path.abspath(upload_folder))
+        response.headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + relative.replace(os.sep, '/')
+        response.headers['Content-Type'] = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline', filename=download_name)
+        _set_cache_headers(response, sha256)
+        return response
+
+    try:
+        response = send_file(
+            file_path,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            mimetype=mimetype,
+            etag=sha256 if sha256 else True,
+            conditional=True
+        )
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
+    except FileNotFoundError:
+        # send_file stats the file anyway; no separate existence check needed
+        return jsonify({'error': 'File not found on server'}), 404
+    # Advertise range support so players can seek without re-downloading
+    response.headers['Accept-Ranges'] = 'bytes'
+    _set_cache_headers(response, sha256)
+    return response
+
+
+def send_preview(blob):
+    """Serve the rendered preview of a blob, or 202 while it is still being generated"""
+    if blob is None:
+        return jsonify({'error': 'No preview available for this file'}), 404
+    if blob.preview_status == STATUS_READY:
+        return send_stored_file(preview_path_for(blob.storage_path), 'preview.jpg', mimetype='image/jpeg',
+                                sha256=f"{blob.sha256}-preview", as_attachment=False)
+    if blob.preview_status in (None, STATUS_PENDING) and preview_service.is_supported(blob.content_type):
+        # Blobs stored before previews existed are queued on first request
+        preview_service.schedule(blob)
+        response = jsonify({'status': 'pending'})
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    return jsonify({'error': 'No preview available for this file'}), 404
+
+
+def _set_cache_headers(response, sha256):
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if sha256:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+
 @file_uploads_bp.route('/task/<int:task_id>/upload', methods=['POST'])
 @jwt_required()
 def upload_file(task_id):
@@ -83,27 +241,13 @@ def upload_file(task_id):
         
         # Check if user has permission to add attachments
         # Users can add attachments if they're assigned or created the task
-        user = User.query.get(current_user_id)
+        user = get_user(current_user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Permission matrix for attachments:
-        # - super_admin/admin: can add to any task
-        # - manager/team_lead: can add to tasks in projects they belong to
-        # - others: only if assigned or creator
-        is_admin_like = (user.role in ('admin', 'super_admin'))
-        if not is_admin_like:
-            if user.role in ('manager', 'team_lead'):
-                if not task.project_id:
-                    return jsonify({'error': 'Project not set on task; cannot verify permission'}), 403
-                membership = ProjectMember.query.filter_by(project_id=task.project_id, user_id=current_user_id).first()
-                if not membership:
-                    return jsonify({'error': 'You may only add attachments within your projects'}), 403
-            else:
-                is_assigned = task.assigned_to == current_user_id
-                is_creator = task.created_by == current_user_id
-                if not is_assigned and not is_creator:
-                    return jsonify({'error': 'You do not have permission to add attachments to this task'}), 403
+        permission_error = check_upload_permission(user, task)
+        if permission_error:
+            return jsonify({'error': permission_error}), 403
         
         # Check if file is in request
         if 'file' not in request.files:
@@ -124,29 +268,15 @@ def upload_file(task_id):
         if file_size > MAX_FILE_SIZE:
             return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024 * 1024)} MB'}), 400
         
-        # Generate unique filename
         original_filename = secure_filename(file.filename)
-        unique_filename = generate_unique_filename(original_filename)
-        
-        # Save file using storage service (handles both local and cloud)
-        file_path = storage_service.save_file(file, unique_filename, subfolder='task_attachments')
         
-        # Get file MIME type
+        # Store by content hash; a file that is already stored is not written again
         file_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+        blob = storage_service.store_blob_file(file, content_type=file_type)
         
-        # Create file attachment record
-        attachment = FileAttachment(
-            task_id=task_id,
-            user_id=current_user_id,
-            filename=unique_filename,
-            original_filename=original_filename,
-            file_size=file_size,
-            file_type=file_type,
-            file_path=file_path
-        )
-        
-        db.session.add(attachment)
+        attachment = build_attachment(task_id, current_user_id, original_filename, blob)
         db.session.commit()
+        upload_pipeline.process(blob)
         
         logger.info(f"File uploaded: {original_filename} by user {current_user_id} to task {task_id}")
         
@@ -174,14 +304,14 @@ def get_task_attachments(task_id):
             return jsonify({'error': 'Task not found'}), 404
         
         # Get user
-        user = User.query.get(current_user_id)
+        user = get_user(current_user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # View permissions similar to upload
         if user.role not in ('admin', 'super_admin'):
             if user.role in ('manager', 'team_lead'):
-                if not task.project_id or not ProjectMember.query.filter_by(project_id=task.project_id, user_id=current_user_id).first():
+                if not task.project_id or not is_project_member(task.project_id, current_user_id):
                     return jsonify({'error': 'You may only view attachments within your projects'}), 403
             else:
                 if task.assigned_to != current_user_id and task.created_by != current_user_id:
@@ -190,6 +320,7 @@ def get_task_attachments(task_id):
         # Get all attachments for this task
         attachments = FileAttachment.query.filter_by(task_id=task_id).order_by(FileAttachment.uploaded_at.desc()).all()
         
+        # No storage round trip here: a missing file is reported when it is downloaded
         return jsonify([attachment.to_dict() for attachment in attachments]), 200
         
     except Exception as e:
@@ -197,63 +328,68 @@ def get_task_attachments(task_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _get_downloadable_attachment(attachment_id, current_user_id):
+    """Load an attachment the user may download; returns (attachment, error response)"""
+    attachment = FileAttachment.query.get(attachment_id)
+    if not attachment:
+        return None, (jsonify({'error': 'Attachment not found'}), 404)
+    
+    # Check if task exists
+    task = Task.query.get(attachment.task_id)
+    if not task:
+        return None, (jsonify({'error': 'Task not found'}), 404)
+    
+    # Get user
+    user = get_user(current_user_id)
+    if not user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+    
+    # Download permission mirrors view
+    if user.role not in ('admin', 'super_admin'):
+        if user.role in ('manager', 'team_lead'):
+            if not task.project_id or not is_project_member(task.project_id, current_user_id):
+                return None, (jsonify({'error': 'You may only download attachments within your projects'}), 403)
+        else:
+            if task.assigned_to != current_user_id and task.created_by != current_user_id:
+                return None, (jsonify({'error': 'You do not have permission to download this file'}), 403)
+    return attachment, None
+
+
 @file_uploads_bp.route('/attachment/<int:attachment_id>/download', methods=['GET'])
 @jwt_required()
 def download_attachment(attachment_id):
     """Download a file attachment"""
     try:
-        current_user_id = int(get_jwt_identity())
-        
-        # Get attachment
-        attachment = FileAttachment.query.get(attachment_id)
-        if not attachment:
-            return jsonify({'error': 'Attachment not found'}), 404
-        
-        # Check if task exists
-        task = Task.query.get(attachment.task_id)
-        if not task:
-            return jsonify({'error': 'Task not found'}), 404
-        
-        # Get user
-        user = User.query.get(current_user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Download permission mirrors view
-        if user.role not in ('admin', 'super_admin'):
-            if user.role in ('manager', 'team_lead'):
-                if not task.project_id or not ProjectMember.query.filter_by(project_id=task.project_id, user_id=current_user_id).first():
-                    return jsonify({'error': 'You may only download attachments within your projects'}), 403
-            else:
-                if task.assigned_to != current_user_id and task.created_by != current_user_id:
-                    return jsonify({'error': 'You do not have permission to download this file'}), 403
-        
-        # Check if file is in cloud storage
-        if attachment.file_path.startswith('gs://'):
-            # Generate signed URL for cloud storage file
-            signed_url = storage_service.generate_signed_url(attachment.file_path, expiration_minutes=15)
-            if signed_url:
-                return redirect(signed_url)
-            else:
-                return jsonify({'error': 'Failed to generate download URL'}), 500
-        else:
-            # Local file download
-            if not storage_service.file_exists(attachment.file_path):
-                return jsonify({'error': 'File not found on server'}), 404
-            
-            # Send file
-            return send_file(
-                attachment.file_path,
-                as_attachment=True,
-                download_name=attachment.original_filename,
-                mimetype=attachment.file_type
-            )
+        attachment, error = _get_downloadable_attachment(attachment_id, int(get_jwt_identity()))
+        if error:
+            return error
+        
+        return send_stored_file(
+            attachment.file_path,
+            attachment.original_filename,
+            mimetype=attachment.file_type,
+            sha256=attachment.blob.sha256 if attachment.blob_id else None
+        )
         
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@file_uploads_bp.route('/attachment/<int:attachment_id>/preview', methods=['GET'])
+@jwt_required()
+def preview_attachment(attachment_id):
+    """Small JPEG preview of an image, PDF or video attachment"""
+    try:
+        attachment, error = _get_downloadable_attachment(attachment_id, int(get_jwt_identity()))
+        if error:
+            return error
+        return send_preview(attachment.blob if attachment.blob_id else None)
+    except Exception as e:
+        logger.error(f"Error serving preview: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @file_uploads_bp.route('/attachment/<int:attachment_id>', methods=['DELETE'])
 @jwt_required()
 def delete_attachment(attachment_id):
@@ -267,7 +403,7 @@ def delete_attachment(attachment_id):
             return jsonify({'error': 'Attachment not found'}), 404
         
         # Get user
-        user = User.query.get(current_user_id)
+        user = get_user(current_user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -276,23 +412,19 @@ def delete_attachment(attachment_id):
             pass
         elif user.role in ('manager', 'team_lead'):
             task = Task.query.get(attachment.task_id)
-            if not task or not task.project_id or not ProjectMember.query.filter_by(project_id=task.project_id, user_id=current_user_id).first():
+            if not task or not task.project_id or not is_project_member(task.project_id, current_user_id):
                 return jsonify({'error': 'You may only delete attachments within your projects'}), 403
         else:
             if attachment.user_id != current_user_id:
                 return jsonify({'error': 'You do not have permission to delete this file'}), 403
         
-        # Delete file from storage (local or cloud)
-        try:
-            storage_service.delete_file(attachment.file_path)
-        except Exception as e:
-            logger.error(f"Error deleting file from storage: {str(e)}")
-        
-        # Delete from database
-        db.session.delete(attachment)
+        # Remove the row first so the blob is no longer referenced, then release
+        # the stored file (content-addressed files are only deleted when unused)
+        original_filename = attachment.original_filename
+        delete_attachments(FileAttachment.query.filter_by(id=attachment_id))
         db.session.commit()
         
-        logger.info(f"File deleted: {attachment.original_filename} by user {current_user_id}")
+        logger.info(f"File deleted: {original_filename} by user {current_user_id}")
         
         return jsonify({'message': 'Attachment deleted successfully'}), 200
         
@@ -310,19 +442,17 @@ def get_upload_stats():
         current_user_id = int(get_jwt_identity())
         
         # Check if user is admin or super_admin
-        user = User.query.get(current_user_id)
+        user = get_user(current_user_id)
         if not user or user.role not in ('admin', 'super_admin'):
             return jsonify({'error': 'Admin access required'}), 403
         
-        # Get statistics
-        total_files = FileAttachment.query.count()
-        total_size = db.session.query(db.func.sum(FileAttachment.file_size)).scalar() or 0
+        # Read the running counters instead of aggregating file_attachments
+        total_files, total_size = storage_service.get_usage()
         
         # Get top uploaders
-        top_uploaders = db.session.query(
-            User.name,
-            db.func.count(FileAttachment.id).label('file_count')
-        ).join(FileAttachment).group_by(User.id).order_by(db.func.count(FileAttachment.id).desc()).limit(5).all()
+        top_uploaders = db.session.query(User.name, StorageUsage.file_count).join(
+            StorageUsage, StorageUsage.user_id == User.id
+        ).filter(StorageUsage.file_count > 0).order_by(StorageUsage.file_count.desc()).limit(5).all()
         
         return jsonify({
             'total_files': total_files,
@@ -334,3 +464,45 @@ def get_upload_stats():
         logger.error(f"Error fetching upload stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+@file_uploads_bp.route('/gc', methods=['POST'])
+@jwt_required()
+def run_storage_gc():
+    """
+    Start reclaiming orphaned files and reconciling storage counters in the
+    background (admin and super admin only). Returns 202; poll GET /gc.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        user = get_user(current_user_id)
+        if not user or user.role not in ('admin', 'super_admin'):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        import storage_gc
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        # A full pass can outlast the worker timeout, so it never runs inside the request
+        if not storage_gc.start_background(current_app._get_current_object(), dry_run=dry_run):
+            return jsonify({'error': 'Storage GC is already running', 'status': storage_gc.last_run()}), 409
+        return jsonify({'message': 'Storage GC started', 'status': storage_gc.last_run()}), 202
+        
+    except Exception as e:
+        logger.error(f"Error starting storage GC: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@file_uploads_bp.route('/gc', methods=['GET'])
+@jwt_required()
+def get_storage_gc_status():
+    """Status and report of the last storage GC run on this instance (admin and super admin only)"""
+    try:
+        user = get_user(int(get_jwt_identity()))
+        if not user or user.role not in ('admin', 'super_admin'):
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        import storage_gc
+        return jsonify(storage_gc.last_run()), 200
+        
+    except Exception as e:
+        logger.error(f"Error fetching storage GC status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,25 @@
+"""
+gunicorn hooks (loaded automatically from the working directory).
+
+Prometheus multiprocess mode keeps one set of sample files per worker in
+PROMETHEUS_MULTIPROC_DIR; stale files from a previous run are removed on start
+and a dead worker's live gauges are dropped when it exits.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
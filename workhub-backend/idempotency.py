@@ -0,0 +1,180 @@
+"""
+Idempotency-key store used by session_middleware.prevent_duplicate_submission.
+
+A request is identified by a scoped key (user + endpoint + Idempotency-Key
+header); requests without the header are not tracked. The first request
+reserves the key; once its handler finishes, the response is stored and any
+retry with the same key is answered from the store without running the handler.
+
+Stores (IDEMPOTENCY_BACKEND, defaults to RATE_LIMIT_BACKEND):
+- memory: TTL + LRU-bounded dict (per process)
+- sqlite: file shared by all gunicorn workers on one host
+- redis:  shared by all nodes (SET NX for reservation)
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_IN_PROGRESS = 'in_progress'
+STATE_DONE = 'done'
+
+
+class MemoryIdempotencyStore:
+    """Process-local store; expired entries and LRU overflow are evicted on write"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()  # key -> (expires, record)
+
+    def _evict_locked(self, now: float):
+        # Entries are kept in insertion order, so expired ones cluster at the front
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def reserve(self, key: str, fingerprint: str, ttl: float) -> Tuple[bool, Optional[dict]]:
+        """Atomically claim key; returns (True, None) or (False, existing record)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return False, entry[1]
+            self._entries[key] = (now + ttl, {'state': STATE_IN_PROGRESS, 'fingerprint': fingerprint})
+            self._entries.move_to_end(key)
+            self._evict_locked(now)
+        return True, None
+
+    def complete(self, key: str, record: dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, record)
+            self._entries.move_to_end(key)
+
+    def release(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteIdempotencyStore:
+    """Host-wide store in a SQLite file (WAL); reservation is a single transaction"""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 2000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        conn = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY, record TEXT NOT NULL, expires REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_idempotency_expires ON idempotency_keys(expires)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, key: str, fingerprint: str, ttl: float) -> Tuple[bool, Optional[dict]]:
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Opportunistic cleanup keeps the table bounded by traffic within the TTL
+            conn.execute('DELETE FROM idempotency_keys WHERE expires <= ?', (now,))
+            row = conn.execute('SELECT record FROM idempotency_keys WHERE key = ?', (key,)).fetchone()
+            if row:
+                conn.execute('COMMIT')
+                return False, _decode(row[0])
+            conn.execute(
+                'INSERT INTO idempotency_keys (key, record, expires) VALUES (?, ?, ?)',
+                (key, _encode({'state': STATE_IN_PROGRESS, 'fingerprint': fingerprint}), now + ttl)
+            )
+            conn.execute('COMMIT')
+            return True, None
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def complete(self, key: str, record: dict, ttl: float):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO idempotency_keys (key, record, expires) VALUES (?, ?, ?)',
+            (key, _encode(record), time.time() + ttl)
+        )
+
+    def release(self, key: str):
+        self._conn().execute('DELETE FROM idempotency_keys WHERE key = ?', (key,))
+
+
+class RedisIdempotencyStore:
+    """Cluster-wide store; SET NX PX makes reservation atomic in one round trip"""
+
+    def __init__(self, url: str, prefix: str = 'workhub:idem:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def reserve(self, key: str, fingerprint: str, ttl: float) -> Tuple[bool, Optional[dict]]:
+        redis_key = self.prefix + key
+        value = _encode({'state': STATE_IN_PROGRESS, 'fingerprint': fingerprint})
+        if self.client.set(redis_key, value, nx=True, px=int(ttl * 1000)):
+            return True, None
+        existing = self.client.get(redis_key)
+        return False, _decode(existing) if existing else None
+
+    def complete(self, key: str, record: dict, ttl: float):
+        self.client.set(self.prefix + key, _encode(record), px=int(ttl * 1000))
+
+    def release(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+def _encode(record: dict) -> str:
+    data = dict(record)
+    if isinstance(data.get('body'), bytes):
+        data['body'] = base64.b64encode(data['body']).decode('ascii')
+    return json.dumps(data)
+
+
+def _decode(raw) -> dict:
+    data = json.loads(raw)
+    if data.get('body') is not None:
+        data['body'] = base64.b64decode(data['body'])
+    return data
+
+
+def get_store_from_env():
+    """Build the store selected by IDEMPOTENCY_BACKEND (falls back to memory)"""
+    kind = os.environ.get('IDEMPOTENCY_BACKEND') or os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    kind = kind.lower()
+    try:
+        if kind == 'sqlite':
+            return SQLiteIdempotencyStore(os.environ.get('IDEMPOTENCY_SQLITE_PATH', '/tmp/workhub_idempotency.db'))
+        if kind == 'redis':
+            url = os.environ.get('IDEMPOTENCY_REDIS_URL') or os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+            return RedisIdempotencyStore(url)
+    except Exception as e:
+        logger.warning(f"Idempotency store '{kind}' unavailable, using in-memory store: {e}")
+    return MemoryIdempotencyStore(max_entries=int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000)))
+
+
+idempotency_store = get_store_from_env()
@@ -475,6 +475,135 @@ def _do_init():
     except Exception as e:
         print(f"⚠ Warning ensuring message_reactions.emoji column: {e}")
     
+    # Add blob_id to file_attachments if it doesn't exist (content-addressed storage)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='file_attachments' AND COLUMN_NAME='blob_id'
+            """))
+            if result.scalar() == 0:
+                print("Adding blob_id column to file_attachments table...")
+                conn.execute(text("ALTER TABLE file_attachments ADD blob_id INT NULL"))
+                conn.execute(text("ALTER TABLE file_attachments ADD FOREIGN KEY (blob_id) REFERENCES blobs(id)"))
+                conn.execute(text("CREATE INDEX ix_file_attachments_blob_id ON file_attachments (blob_id)"))
+                print("✓ Added blob_id column")
+            else:
+                print("✓ blob_id column already exists")
+    except Exception as e:
+        print(f"⚠ Warning adding file_attachments.blob_id column: {e}")
+    
+    # Add preview_status to blobs if it doesn't exist (attachment previews)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='blobs' AND COLUMN_NAME='preview_status'
+            """))
+            if result.scalar() == 0:
+                print("Adding preview_status column to blobs table...")
+                conn.execute(text("ALTER TABLE blobs ADD preview_status NVARCHAR(20) NULL"))
+                print("✓ Added preview_status column")
+            else:
+                print("✓ preview_status column already exists")
+    except Exception as e:
+        print(f"⚠ Warning adding blobs.preview_status column: {e}")
+    
+    # Add preview_claimed_at to blobs if it doesn't exist (stale preview claims are retried)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='blobs' AND COLUMN_NAME='preview_claimed_at'
+            """))
+            if result.scalar() == 0:
+                print("Adding preview_claimed_at column to blobs table...")
+                conn.execute(text("ALTER TABLE blobs ADD preview_claimed_at DATETIME NULL"))
+                print("✓ Added preview_claimed_at column")
+            else:
+                print("✓ preview_claimed_at column already exists")
+    except Exception as e:
+        print(f"⚠ Warning adding blobs.preview_claimed_at column: {e}")
+    
+    # Add object storage push state to blobs if it doesn't exist (async upload pipeline)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='blobs' AND COLUMN_NAME='storage_state'
+            """))
+            if result.scalar() == 0:
+                print("Adding storage_state columns to blobs table...")
+                conn.execute(text("ALTER TABLE blobs ADD storage_state NVARCHAR(20) NOT NULL DEFAULT 'local'"))
+                conn.execute(text("ALTER TABLE blobs ADD storage_attempts INT NOT NULL DEFAULT 0"))
+                conn.execute(text("ALTER TABLE blobs ADD storage_state_at DATETIME NULL"))
+                conn.execute(text("UPDATE blobs SET storage_state = 'remote' WHERE storage_path LIKE 'gs://%'"))
+                print("✓ Added storage_state columns")
+            else:
+                print("✓ storage_state column already exists")
+    except Exception as e:
+        print(f"⚠ Warning adding blobs.storage_state column: {e}")
+    
+    # Add parts to upload_sessions if it doesn't exist (chunks staged in the storage backend)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='upload_sessions' AND COLUMN_NAME='parts'
+            """))
+            if result.scalar() == 0:
+                print("Adding parts column to upload_sessions table...")
+                conn.execute(text("ALTER TABLE upload_sessions ADD parts NVARCHAR(MAX) NULL"))
+                print("✓ Added parts column")
+            else:
+                print("✓ parts column already exists")
+    except Exception as e:
+        print(f"⚠ Warning adding upload_sessions.parts column: {e}")
+    
+    # Add chunk claim columns to upload_sessions if they don't exist (one writer per session at a time)
+    for column, ddl in (('claim_id', 'NVARCHAR(32) NULL'), ('claimed_at', 'DATETIME NULL')):
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(text(f"""
+                    SELECT COUNT(*) 
+                    FROM INFORMATION_SCHEMA.COLUMNS 
+                    WHERE TABLE_SCHEMA='dbo' AND TABLE_NAME='upload_sessions' AND COLUMN_NAME='{column}'
+                """))
+                if result.scalar() == 0:
+                    print(f"Adding {column} column to upload_sessions table...")
+                    conn.execute(text(f"ALTER TABLE upload_sessions ADD {column} {ddl}"))
+                    print(f"✓ Added {column} column")
+                else:
+                    print(f"✓ {column} column already exists")
+        except Exception as e:
+            print(f"⚠ Warning adding upload_sessions.{column} column: {e}")
+    
+    # Seed storage usage counters from existing attachments (incremental accounting)
+    try:
+        with db.engine.begin() as conn:
+            if conn.execute(text("SELECT COUNT(*) FROM storage_usage")).scalar() == 0:
+                print("Seeding storage_usage counters from file_attachments...")
+                conn.execute(text("""
+                    INSERT INTO storage_usage (user_id, file_count, total_bytes, updated_at)
+                    SELECT user_id, COUNT(*), COALESCE(SUM(CAST(file_size AS BIGINT)), 0), GETUTCDATE()
+                    FROM file_attachments GROUP BY user_id
+                """))
+                conn.execute(text("""
+                    INSERT INTO storage_usage (user_id, file_count, total_bytes, updated_at)
+                    SELECT NULL, COUNT(*), COALESCE(SUM(CAST(file_size AS BIGINT)), 0), GETUTCDATE()
+                    FROM file_attachments
+                """))
+                print("✓ Seeded storage_usage counters")
+            else:
+                print("✓ storage_usage counters already seeded")
+    except Exception as e:
+        print(f"⚠ Warning seeding storage_usage counters: {e}")
+    
     # Verify all tables exist
     print("\n" + "=" * 60)
     print("Verifying tables...")
@@ -488,7 +617,8 @@ def _do_init():
         'notifications', 'time_logs', 'comments', 'system_settings',
         'notification_preferences', 'file_attachments', 'reminders',
         'meetings', 'meeting_invitations', 'chat_conversations',
-        'chat_messages', 'message_reactions'
+        'chat_messages', 'message_reactions', 'refresh_tokens', 'revoked_tokens',
+        'upload_sessions', 'blobs', 'storage_usage'
     ]
     
     missing_tables = [t for t in required_tables if t not in final_tables]
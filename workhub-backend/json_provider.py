@@ -0,0 +1,190 @@
+"""
+Fast JSON responses.
+
+OrjsonProvider replaces Flask's stdlib-based JSON provider, so jsonify(),
+request.get_json() and app.json use orjson (several times faster for the
+large lists returned by get_tasks, get_messages and get_project). Native
+types are handled without to_dict glue:
+
+    datetime  ISO 8601; naive values are UTC and end in 'Z', like format_utc_datetime
+    date, UUID, dataclass, Enum   native orjson support
+    Decimal, set, objects with __html__   via default()
+
+Anything orjson refuses (e.g. integers above 64 bits) falls back to the
+stdlib encoder. Without orjson installed the stdlib provider stays in place.
+
+Big lists can be streamed instead of built in memory first:
+
+    return json_array(tasks, Task.to_dict)                  # [...]
+    return json_object(data, tasks=(tasks, Task.to_dict))   # {..., "tasks": [...]}
+
+Up to JSON_STREAM_MIN_ITEMS items this is a normal response. Above that, the
+body is produced in chunks of JSON_STREAM_CHUNK_ITEMS while it is sent, so
+the first bytes go out before the last item is serialized. A serializer may
+return None to leave an item out; it should not raise, because once streaming
+has started the status code can no longer change.
+
+Configuration (environment variables):
+    JSON_STREAM_MIN_ITEMS    Lists longer than this are streamed (default 500)
+    JSON_STREAM_CHUNK_ITEMS  Items serialized per chunk when streaming (default 100)
+"""
+
+import decimal
+import json
+import logging
+import os
+import uuid
+from datetime import date, datetime
+
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: stdlib json is used without it
+    orjson = None
+
+STREAM_MIN_ITEMS = int(os.environ.get('JSON_STREAM_MIN_ITEMS', 500))
+STREAM_CHUNK_ITEMS = int(os.environ.get('JSON_STREAM_CHUNK_ITEMS', 100))
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(o):
+    """Types orjson does not serialize natively"""
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _stdlib_default(o):
+    """Same output as orjson for the types it handles natively"""
+    if isinstance(o, datetime):
+        from models import format_utc_datetime
+        return format_utc_datetime(o)
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    return DefaultJSONProvider.default(o)
+
+
+def dumps_bytes(obj, indent=False) -> bytes:
+    """UTF-8 JSON for obj; orjson when available, stdlib otherwise"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+        except orjson.JSONEncodeError as e:
+            logger.debug(f"orjson could not encode response, using stdlib json: {e}")
+    return json.dumps(
+        obj, default=_stdlib_default, ensure_ascii=False, **({'indent': 2} if indent else {'separators': (',', ':')})
+    ).encode('utf-8')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (always UTF-8, never sorts keys)"""
+
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for stdlib-only behaviour (cls=, sort_keys=, ...) get the stdlib encoder
+        if set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def _indent(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, indent=self._indent()) + b"\n", mimetype=self.mimetype)
+
+
+# ========== STREAMING ==========
+
+def _serialized(items, serialize):
+    for item in items:
+        value = serialize(item) if serialize is not None else item
+        if value is not None:
+            yield value
+
+
+def _array_chunks(items, serialize):
+    """Bytes of a JSON array, encoded STREAM_CHUNK_ITEMS items at a time"""
+    yield b'['
+    first = True
+    chunk = []
+    for value in _serialized(items, serialize):
+        chunk.append(value)
+        if len(chunk) >= STREAM_CHUNK_ITEMS:
+            yield (b'' if first else b',') + dumps_bytes(chunk)[1:-1]
+            first = False
+            chunk = []
+    if chunk:
+        yield (b'' if first else b',') + dumps_bytes(chunk)[1:-1]
+    yield b']'
+
+
+def _array_body(items, serialize):
+    yield from _array_chunks(items, serialize)
+    yield b"\n"
+
+
+def _object_chunks(data, arrays):
+    head = dumps_bytes(data)
+    yield head[:-1]
+    separator = b',' if data else b''
+    for key, (items, serialize) in arrays.items():
+        yield separator + dumps_bytes(key) + b':'
+        yield from _array_chunks(items, serialize)
+        separator = b','
+    yield b'}\n'
+
+
+def _stream(chunks, status):
+    # The request context stays alive while the body is generated (lazy loads, current_user)
+    return current_app.response_class(stream_with_context(chunks), status=status, mimetype='application/json')
+
+
+def json_array(items, serialize=None, status=200):
+    """JSON array of serialize(item) for each item; streamed when the list is long"""
+    if len(items) <= STREAM_MIN_ITEMS:
+        return current_app.response_class(
+            dumps_bytes(list(_serialized(items, serialize))) + b"\n", status=status, mimetype='application/json'
+        )
+    return _stream(_array_body(items, serialize), status)
+
+
+def json_object(data, status=200, **arrays):
+    """data plus list fields given as name=(items, serialize); streamed when the lists are long"""
+    if sum(len(items) for items, _ in arrays.values()) <= STREAM_MIN_ITEMS:
+        body = dict(data)
+        for key, (items, serialize) in arrays.items():
+            body[key] = list(_serialized(items, serialize))
+        return current_app.response_class(dumps_bytes(body) + b"\n", status=status, mimetype='application/json')
+    return _stream(_object_chunks(data, arrays), status)
+
+
+def init_app(app):
+    """Use orjson for all JSON in this app"""
+    if orjson is None:
+        logger.info("orjson not installed; using the stdlib JSON provider")
+        # Flask 3 ignores JSON_AS_ASCII; apply it to the provider instead
+        app.json.ensure_ascii = app.config.get('JSON_AS_ASCII', True)
+        return
+    app.json = OrjsonProvider(app)
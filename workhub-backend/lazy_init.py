@@ -0,0 +1,69 @@
+"""
+Lazy initialization helpers for fast startup.
+
+Heavy imports (pandas) and clients (Cloud Storage) are created on first use
+instead of at import time or in create_app, so gunicorn workers and Cloud Run
+instances start serving sooner. Each deferred initialization is timed and
+reported by init_timings() (see benchmarks/bench_startup.py).
+
+    pd = lazy_import('pandas')            # imported on first pd.DataFrame(...)
+    client = LazyValue('gcs client', make_client)
+    client.get()                          # built once, thread-safe
+"""
+
+import importlib
+import threading
+import time
+import types
+from typing import Callable, Dict
+
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+def init_timings() -> Dict[str, float]:
+    """Seconds spent in each lazy initialization that has run in this process"""
+    with _timings_lock:
+        return dict(_timings)
+
+
+class LazyValue:
+    """A value built by factory() on the first get(); the factory runs once per process"""
+
+    def __init__(self, name: str, factory: Callable):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._ready = False
+        self._value = None
+
+    def get(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    with _timings_lock:
+                        _timings[self.name] = time.perf_counter() - started
+                    self._ready = True
+        return self._value
+
+    @property
+    def initialized(self) -> bool:
+        return self._ready
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = LazyValue(f"import {name}", lambda: importlib.import_module(name))
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_module.get(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy for module `name` that defers the import until it is used"""
+    return LazyModule(name)
@@ -0,0 +1,140 @@
+"""
+Non-blocking structured logging.
+
+Request threads never format or write log records: a QueueHandler on the root
+logger only stamps the record with the request id and puts it on a bounded
+in-memory queue. A QueueListener thread turns records into one JSON object
+per line on stdout (Cloud Logging parses these). If the queue is full the
+record is dropped and counted instead of blocking the request.
+
+Repeated errors are sampled: each (logger, message template, exception type)
+logs its first LOG_ERROR_BURST occurrences per minute, then one in every
+LOG_ERROR_SAMPLE_EVERY; the emitted record carries the suppressed count.
+
+Configuration (environment variables):
+    LOG_LEVEL               Root level (default INFO)
+    LOG_QUEUE_SIZE          Max queued records before dropping (default 10000)
+    LOG_ERROR_BURST         Errors logged per key per minute before sampling (default 5)
+    LOG_ERROR_SAMPLE_EVERY  Log one in N errors per key after the burst (default 100)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, has_request_context
+
+ERROR_WINDOW_SECONDS = 60
+_DIGITS = re.compile(r'\d+')
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; dict messages are merged into the object"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'severity': record.levelname,
+            'logger': record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry['message'] = record.getMessage()
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ErrorSampler(logging.Filter):
+    """Let through the first burst of each repeated error per window, then one in N"""
+
+    def __init__(self, burst: int, sample_every: int):
+        super().__init__()
+        self.burst = burst
+        self.sample_every = max(sample_every, 1)
+        self._lock = threading.Lock()
+        self._seen = {}  # key -> [window_start, count, suppressed]
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        # Ids in pre-formatted messages would make every occurrence unique
+        key = (record.name, _DIGITS.sub('#', str(record.msg))[:200], exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] > ERROR_WINDOW_SECONDS:
+                if len(self._seen) > 10000:
+                    self._seen.clear()
+                state = self._seen[key] = [now, 0, 0]
+            state[1] += 1
+            if state[1] > self.burst and (state[1] - self.burst) % self.sample_every:
+                state[2] += 1
+                return False
+            record.suppressed, state[2] = state[2], 0
+        return True
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without formatting; never blocks the calling thread"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only capture request state here
+        if has_request_context():
+            record.request_id = g.get('request_id')
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging():
+    """Route all logging through the queue (once per process)"""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+        log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+        handler = RequestQueueHandler(log_queue)
+        handler.addFilter(ErrorSampler(int(os.environ.get('LOG_ERROR_BURST', 5)),
+                                       int(os.environ.get('LOG_ERROR_SAMPLE_EVERY', 100))))
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+        _configured = True
@@ -0,0 +1,177 @@
+"""
+Prometheus metrics, served at /metrics.
+
+    workhub_http_request_duration_seconds{method,endpoint}   latency histogram
+    workhub_http_requests_total{method,endpoint,status}      responses by status
+    workhub_http_requests_in_flight                          requests being handled
+    workhub_chat_polls_total{endpoint}                       chat GET polling
+    workhub_rate_limit_rejections_total{endpoint}            429s from @rate_limit
+    workhub_email_sends_in_progress / workhub_email_sends_total{result}
+    workhub_db_pool_checkouts_total{pool}, workhub_db_pool_checkout_wait_seconds{pool},
+    workhub_db_pool_timeouts_total{pool}, workhub_db_pool_checked_out{pool}
+    workhub_compression_bytes_total{encoding,stage}                 bytes before/after compression
+
+Endpoints are labelled by Flask endpoint name (e.g. tasks.get_tasks), never by
+raw path, to keep label cardinality bounded.
+
+gunicorn workers are separate processes. When PROMETHEUS_MULTIPROC_DIR is set
+(see Dockerfile and gunicorn.conf.py), every worker writes its samples to
+memory-mapped files in that directory and /metrics aggregates all of them with
+the multiprocess collector, whichever worker serves the scrape.
+
+Instrumentation adds roughly 15-20 us per request
+(python benchmarks/bench_metrics.py). Without prometheus_client every hook is
+a no-op and /metrics answers 503.
+
+Configuration (environment variables):
+    PROMETHEUS_MULTIPROC_DIR  Shared sample directory for multi-worker aggregation
+    METRICS_TOKEN             If set, /metrics requires 'Authorization: Bearer <token>'.
+                              Required in production (FLASK_ENV=production): without it /metrics answers 403
+"""
+
+import hmac
+import logging
+import os
+import time
+
+from flask import Response, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # Optional dependency: metrics are disabled without it
+    prometheus_client = None
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR and prometheus_client is not None:
+    # gunicorn.conf.py creates it too, but scripts and jobs (init_cloud_sql.py, storage_gc.py)
+    # import this module without gunicorn, and building a metric needs the directory
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+enabled = prometheus_client is not None
+
+if enabled:
+    REQUEST_LATENCY = Histogram(
+        'workhub_http_request_duration_seconds', 'Request latency', ['method', 'endpoint'], buckets=LATENCY_BUCKETS
+    )
+    REQUESTS = Counter('workhub_http_requests_total', 'Responses by status', ['method', 'endpoint', 'status'])
+    IN_FLIGHT = Gauge('workhub_http_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+    CHAT_POLLS = Counter('workhub_chat_polls_total', 'Chat polling requests', ['endpoint'])
+    RATE_LIMITED = Counter('workhub_rate_limit_rejections_total', 'Requests rejected by @rate_limit', ['endpoint'])
+    EMAIL_IN_PROGRESS = Gauge('workhub_email_sends_in_progress', 'Emails being sent', multiprocess_mode='livesum')
+    EMAILS = Counter('workhub_email_sends_total', 'Email send attempts', ['result'])
+    POOL_CHECKOUTS = Counter('workhub_db_pool_checkouts_total', 'Connection checkouts', ['pool'])
+    POOL_WAIT = Histogram(
+        'workhub_db_pool_checkout_wait_seconds', 'Time to get a pooled connection', ['pool'], buckets=POOL_WAIT_BUCKETS
+    )
+    POOL_TIMEOUTS = Counter('workhub_db_pool_timeouts_total', 'Checkouts that timed out (pool exhausted)', ['pool'])
+    POOL_CHECKED_OUT = Gauge(
+        'workhub_db_pool_checked_out', 'Connections in use at the last checkout', ['pool'], multiprocess_mode='livesum'
+    )
+    COMPRESSION_BYTES = Counter(
+        'workhub_compression_bytes_total', 'Response bytes before (raw) and after (compressed) compression',
+        ['encoding', 'stage']
+    )
+
+
+# ========== HOOKS ==========
+
+def observe_rate_limited():
+    if enabled:
+        RATE_LIMITED.labels(request.endpoint or 'unmatched').inc()
+
+
+def observe_pool_checkout(pool, wait_ms, timed_out=False):
+    """Listener for db_pool.pool_metrics (runs on every connection checkout)"""
+    name = pool.logging_name or 'primary'
+    if timed_out:
+        POOL_TIMEOUTS.labels(name).inc()
+        return
+    POOL_CHECKOUTS.labels(name).inc()
+    POOL_WAIT.labels(name).observe(wait_ms / 1000)
+    POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+
+
+def observe_compression(encoding, raw_bytes, compressed_bytes):
+    if enabled:
+        COMPRESSION_BYTES.labels(encoding, 'raw').inc(raw_bytes)
+        COMPRESSION_BYTES.labels(encoding, 'compressed').inc(compressed_bytes)
+
+
+class track_email_send:
+    """Context manager around one email send: in-progress gauge and result counter"""
+
+    def __enter__(self):
+        if enabled:
+            EMAIL_IN_PROGRESS.inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if enabled:
+            EMAIL_IN_PROGRESS.dec()
+            if exc_type is not None:
+                EMAILS.labels('error').inc()
+        return False
+
+    def result(self, sent: bool):
+        if enabled:
+            EMAILS.labels('sent' if sent else 'failed').inc()
+        return sent
+
+
+def _registry():
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def init_app(app):
+    """Instrument every request and register the /metrics endpoint"""
+    if not enabled:
+        logger.info("prometheus_client not installed; /metrics disabled")
+    else:
+        from db_pool import pool_metrics
+        if observe_pool_checkout not in pool_metrics.listeners:
+            pool_metrics.listeners.append(observe_pool_checkout)
+
+        @app.before_request
+        def _start_request_timer():
+            g._metrics_started = time.perf_counter()
+            IN_FLIGHT.inc()
+
+        @app.after_request
+        def _observe_request(response):
+            started = g.get('_metrics_started')
+            if started is not None:
+                endpoint = request.endpoint or 'unmatched'
+                REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - started)
+                REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+                if request.blueprint == 'chat' and request.method == 'GET':
+                    CHAT_POLLS.labels(endpoint).inc()
+            return response
+
+        @app.teardown_request
+        def _end_request(exc):
+            if g.pop('_metrics_started', None) is not None:
+                IN_FLIGHT.dec()
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus text exposition, aggregated across workers"""
+        token = os.environ.get('METRICS_TOKEN')
+        if not token and os.environ.get('FLASK_ENV') == 'production':
+            # The service is publicly reachable; never expose metrics without a token there
+            return jsonify({'error': 'Access denied'}), 403
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Access denied'}), 403
+        if not enabled:
+            return jsonify({'error': 'Metrics unavailable (prometheus_client not installed)'}), 503
+        return Response(prometheus_client.generate_latest(_registry()), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
@@ -2,8 +2,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from datetime import datetime, timezone
 import enum
+from read_routing import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends reads of @read_replica endpoints to the replica bind
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 
 
@@ -81,10 +83,17 @@ class User(db.Model):
     approver = db.relationship('User', remote_side=[id], backref='approved_users')
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        from password_hashing import password_hasher
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        from password_hashing import password_hasher
+        return password_hasher.check(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the stored hash uses a different bcrypt cost than configured"""
+        from password_hashing import password_hasher
+        return password_hasher.needs_rehash(self.password_hash)
     
     def has_permission(self, permission):
         """Check if user has a specific permission"""
@@ -127,6 +136,35 @@ class User(db.Model):
         return data
 
 
+class RefreshToken(db.Model):
+    """Issued refresh tokens; rotated on every use, grouped into families for reuse detection"""
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    family_id = db.Column(db.String(64), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+    replaced_by = db.Column(db.String(64))  # jti of the token issued on rotation
+    user_agent = db.Column(db.String(255))
+    
+    user = db.relationship('User', backref=db.backref('refresh_tokens', lazy=True, cascade='all, delete-orphan'))
+
+
+class RevokedToken(db.Model):
+    """Revoked JWT ids (JTI denylist), shared by all workers"""
+    __tablename__ = 'revoked_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    token_type = db.Column(db.String(10), default='access')  # 'access', 'refresh'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
 class Task(db.Model):
     __tablename__ = 'tasks'
     
@@ -448,6 +486,35 @@ class NotificationPreference(db.Model):
         }
 
 
+class Blob(db.Model):
+    """Content-addressed file contents, shared by every attachment with the same SHA-256"""
+    __tablename__ = 'blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100))
+    storage_path = db.Column(db.String(500), unique=True, nullable=False)  # Local path or gs:// URL
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    preview_status = db.Column(db.String(20))  # NULL (not queued), pending, ready, unsupported, failed
+    preview_claimed_at = db.Column(db.DateTime)  # when a worker set pending; stale claims are retried
+    storage_state = db.Column(db.String(20), nullable=False, default='local')  # local, uploading, remote, missing
+    storage_attempts = db.Column(db.Integer, nullable=False, default=0)  # failed pushes to object storage
+    storage_state_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'content_type': self.content_type,
+            'ref_count': self.ref_count,
+            'preview_status': self.preview_status,
+            'storage_state': self.storage_state
+        }
+
+
 class FileAttachment(db.Model):
     __tablename__ = 'file_attachments'
     
@@ -460,11 +527,13 @@ class FileAttachment(db.Model):
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
     file_type = db.Column(db.String(100))  # MIME type
     file_path = db.Column(db.String(500), nullable=False)  # Path to file on server
+    blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), nullable=True, index=True)  # NULL for legacy uploads
     
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='uploaded_files')
     task = db.relationship('Task', backref='attachments')
+    blob = db.relationship('Blob')
     
     def to_dict(self):
         return {
@@ -480,6 +549,59 @@ class FileAttachment(db.Model):
         }
 
 
+class StorageUsage(db.Model):
+    """Running attachment totals per uploader, kept up to date on every upload/delete"""
+    __tablename__ = 'storage_usage'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, unique=True, nullable=True)  # NULL row holds the all-users total
+    file_count = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'file_count': self.file_count,
+            'total_bytes': self.total_bytes
+        }
+
+
+class UploadSession(db.Model):
+    """Chunked, resumable upload in progress (chunks go to one local staging file, or to parts in the bucket)"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    target_type = db.Column(db.String(20), nullable=False)  # task, conversation, group
+    target_id = db.Column(db.Integer, nullable=False)
+    
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100))
+    total_size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64))  # Declared by the client; enables instant re-upload of content the user already has
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    parts = db.Column(db.Text)  # JSON list of staged gs:// part paths, in order (cloud storage only)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, receiving, finalizing
+    claim_id = db.Column(db.String(32))  # The PUT currently writing a chunk (status 'receiving')
+    claimed_at = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'target_type': self.target_type,
+            'target_id': self.target_id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'received_bytes': self.received_bytes,
+            'status': self.status,
+            'expires_at': format_utc_datetime(self.expires_at)
+        }
+
+
 class Reminder(db.Model):
     __tablename__ = 'reminders'
     
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Notification, NotificationPreference, User, Task, Comment, ChatConversation, Project, ProjectMember, ChatGroup, ChatGroupMember
 from email_service import email_service
 from permissions import Permission
+from request_cache import get_user
+from collection_versions import conditional_get
 import logging
 import threading
 from urllib.parse import urlencode
@@ -90,7 +92,7 @@ def create_notification_with_email(user_id, title, message, notif_type, related_
             email_pref_field = f"email_{notif_type}"
             if hasattr(prefs, email_pref_field) and getattr(prefs, email_pref_field):
                 # Get user email
-                user = User.query.get(user_id)
+                user = get_user(user_id)
                 if user and user.email:
                     # Get task data if task ID provided
                     task_data = {}
@@ -148,6 +150,7 @@ def create_notification_with_email(user_id, title, message, notif_type, related_
 
 @notifications_bp.route('/', methods=['GET'])
 @jwt_required()
+@conditional_get('notifications:{user}')
 def get_notifications():
     try:
         current_user_id = int(get_jwt_identity())
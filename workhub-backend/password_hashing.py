@@ -0,0 +1,225 @@
+"""
+Password hashing service.
+
+bcrypt is deliberately slow, so hashing inside the request thread stalls a
+gunicorn worker that only runs a couple of threads. This service runs bcrypt on
+a small, bounded process pool (true parallelism outside the GIL) and falls back
+to inline hashing when the pool is saturated or unavailable. A job that does
+not finish within BCRYPT_POOL_TIMEOUT is not repeated inline, because it is
+still running on the pool. It raises PasswordHashingBusy instead, which
+init_app turns into a 503.
+
+Configuration (environment variables):
+    BCRYPT_LOG_ROUNDS      Explicit cost factor (disables calibration)
+    BCRYPT_TARGET_MS       Target hash latency used by startup calibration (default 250)
+    BCRYPT_CALIBRATE       'true' to benchmark the cost factor at startup (default false)
+    BCRYPT_POOL_WORKERS    Process pool size (default 2, 0 disables the pool)
+    BCRYPT_POOL_MAX_PENDING  Max jobs queued on the pool before hashing inline (default 16)
+    BCRYPT_POOL_TIMEOUT    Seconds to wait for a pool job before answering 503 (default 30)
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import bcrypt as _bcrypt
+from flask import jsonify
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_ROUNDS = 12
+MIN_LOG_ROUNDS = 10
+MAX_LOG_ROUNDS = 15
+
+
+class PasswordHashingBusy(Exception):
+    """The hashing pool did not finish a job in time (the system is overloaded)"""
+
+
+# ---- Worker functions (module level so they can be pickled to the pool) ----
+
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds))
+
+
+def _check_password(password: bytes, hashed: bytes) -> bool:
+    try:
+        return _bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # Malformed hash stored in the database
+        return False
+
+
+def get_hash_rounds(hashed: str) -> Optional[int]:
+    """Extract the cost factor from a '$2b$12$...' hash string"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms: float = 250.0) -> int:
+    """
+    Benchmark bcrypt on this host and return the highest cost factor whose
+    hash time stays within target_ms (clamped to MIN/MAX_LOG_ROUNDS).
+    """
+    rounds = MIN_LOG_ROUNDS
+    sample = b'calibration-password'
+    start = time.perf_counter()
+    _hash_password(sample, rounds)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    # Each additional round doubles the cost
+    while rounds < MAX_LOG_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+class _LatencyStats:
+    """Thread-safe latency accumulator for one operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.inline = 0
+
+    def record(self, elapsed_ms: float, inline: bool):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if elapsed_ms > self.max_ms:
+                self.max_ms = elapsed_ms
+            if inline:
+                self.inline += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+                'max_ms': round(self.max_ms, 2),
+                'inline': self.inline,
+            }
+
+
+class PasswordHasher:
+    """bcrypt hashing on a bounded process pool with a configurable cost factor"""
+
+    def __init__(self):
+        self.log_rounds = DEFAULT_LOG_ROUNDS
+        self.pool_workers = 2
+        self.max_pending = 16
+        self.timeout = 30
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = None
+        self._stats = {'hash': _LatencyStats(), 'check': _LatencyStats()}
+
+    def init_app(self, app):
+        """Read configuration and optionally calibrate the cost factor"""
+        explicit_rounds = os.environ.get('BCRYPT_LOG_ROUNDS')
+        if explicit_rounds:
+            self.log_rounds = int(explicit_rounds)
+        elif str(os.environ.get('BCRYPT_CALIBRATE', 'false')).lower() == 'true':
+            target_ms = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+            self.log_rounds = calibrate_rounds(target_ms)
+            logger.info(f"bcrypt cost factor calibrated to {self.log_rounds} (target {target_ms} ms)")
+        else:
+            self.log_rounds = app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+
+        self.pool_workers = int(os.environ.get('BCRYPT_POOL_WORKERS', 2))
+        self.max_pending = int(os.environ.get('BCRYPT_POOL_MAX_PENDING', 16))
+        self.timeout = float(os.environ.get('BCRYPT_POOL_TIMEOUT', 30))
+        self._pending = threading.BoundedSemaphore(max(self.max_pending, 1))
+
+        @app.errorhandler(PasswordHashingBusy)
+        def _hashing_busy(e):
+            response = jsonify({'error': 'Server is busy, please try again shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        # Keep Flask-Bcrypt consistent for any code that still uses it directly
+        app.config['BCRYPT_LOG_ROUNDS'] = self.log_rounds
+
+    def _get_executor(self):
+        """Create the pool lazily so it is started after gunicorn forks workers"""
+        if self.pool_workers <= 0:
+            return None
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    try:
+                        # 'spawn' avoids forking a process that already runs request threads
+                        ctx = multiprocessing.get_context('spawn')
+                        self._executor = ProcessPoolExecutor(max_workers=self.pool_workers, mp_context=ctx)
+                    except Exception as e:
+                        logger.warning(f"Password hashing pool unavailable, hashing inline: {e}")
+                        self.pool_workers = 0
+                        return None
+        return self._executor
+
+    def _run(self, op, fn, *args):
+        start = time.perf_counter()
+        inline = True
+        result = None
+        executor = self._get_executor()
+        pending = self._pending
+        if executor is not None and pending is not None and pending.acquire(blocking=False):
+            try:
+                future = executor.submit(fn, *args)
+                result = future.result(timeout=self.timeout)
+                inline = False
+            except FutureTimeoutError:
+                # The job is still queued or running; hashing again inline would double the CPU under overload
+                future.cancel()
+                logger.warning(f"Password hashing pool did not answer within {self.timeout}s ({op})")
+                raise PasswordHashingBusy(op)
+            except Exception as e:
+                # The job never ran (pool broken or shut down): hashing inline costs nothing extra
+                logger.warning(f"Password hashing pool failed ({op}), hashing inline: {e}")
+            finally:
+                pending.release()
+        if inline:
+            result = fn(*args)
+        self._stats[op].record((time.perf_counter() - start) * 1000, inline)
+        return result
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        hashed = self._run('hash', _hash_password, password.encode('utf-8'), self.log_rounds)
+        return hashed.decode('utf-8')
+
+    def check(self, hashed: str, password: str) -> bool:
+        """Verify a password against a stored bcrypt hash"""
+        if not hashed or password is None:
+            return False
+        return self._run('check', _check_password, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if the stored hash was produced with a different cost factor"""
+        rounds = get_hash_rounds(hashed)
+        return rounds is not None and rounds != self.log_rounds
+
+    def get_metrics(self) -> dict:
+        return {
+            'log_rounds': self.log_rounds,
+            'pool_workers': self.pool_workers,
+            'hash': self._stats['hash'].to_dict(),
+            'check': self._stats['check'].to_dict(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Export singleton instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,215 @@
+"""
+Background preview generation for attachments.
+
+When a new blob is stored, a job on a small thread pool renders a JPEG preview
+(image thumbnail, first page of a PDF, or a video poster frame) and stores it
+next to the blob as <storage_path>.preview.jpg. Blob.preview_status tracks the
+result so each preview is generated once. A worker claims a blob by setting it
+to pending with preview_claimed_at; a pending claim older than
+PREVIEW_CLAIM_TIMEOUT belongs to a worker that died and is claimed again.
+
+Renderers are optional and detected at runtime:
+    images  Pillow
+    PDFs    pdftoppm (poppler-utils), or PyMuPDF
+    videos  ffmpeg
+
+Configuration (environment variables):
+    PREVIEW_WORKERS                Thread pool size (default 2, 0 renders inline)
+    PREVIEW_MAX_SIZE               Longest edge of the preview in pixels (default 480)
+    PREVIEW_CLAIM_TIMEOUT_SECONDS  Age after which a pending claim is taken over (default 600)
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from storage_service import storage_service, PREVIEW_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MAX_SIZE = int(os.environ.get('PREVIEW_MAX_SIZE', 480))
+RENDER_TIMEOUT = 60
+# Well above the worst-case render (download plus two ffmpeg runs)
+CLAIM_TIMEOUT = timedelta(seconds=int(os.environ.get('PREVIEW_CLAIM_TIMEOUT_SECONDS', 600)))
+
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_UNSUPPORTED = 'unsupported'
+STATUS_FAILED = 'failed'
+
+
+def preview_path_for(storage_path: str) -> str:
+    """Previews live next to the blob they were rendered from"""
+    return storage_path + PREVIEW_SUFFIX
+
+
+# ========== RENDERERS ==========
+
+def _render_image(source: str, dest: str) -> bool:
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(source) as img:
+        img.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE))
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(dest, 'JPEG', quality=80, optimize=True)
+    return True
+
+
+def _render_pdf(source: str, dest: str) -> bool:
+    if shutil.which('pdftoppm'):
+        prefix = dest[:-len('.jpg')]
+        subprocess.run(
+            ['pdftoppm', '-jpeg', '-singlefile', '-f', '1', '-l', '1',
+             '-scale-to', str(PREVIEW_MAX_SIZE), source, prefix],
+            check=True, timeout=RENDER_TIMEOUT, capture_output=True
+        )
+        return os.path.exists(dest)
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return False
+    with fitz.open(source) as doc:
+        page = doc.load_page(0)
+        zoom = PREVIEW_MAX_SIZE / max(page.rect.width, page.rect.height)
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(dest, output='jpeg')
+    return True
+
+
+def _render_video(source: str, dest: str) -> bool:
+    if not shutil.which('ffmpeg'):
+        return False
+    scale = f"scale='min({PREVIEW_MAX_SIZE},iw)':-2"
+    for offset in ('1', '0'):  # very short clips have no frame at 1s
+        subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-y', '-ss', offset, '-i', source,
+             '-frames:v', '1', '-vf', scale, dest],
+            timeout=RENDER_TIMEOUT, capture_output=True
+        )
+        if os.path.exists(dest) and os.path.getsize(dest) > 0:
+            return True
+    return False
+
+
+def _renderer_for(content_type: str):
+    content_type = (content_type or '').lower()
+    if content_type.startswith('image/') and content_type != 'image/svg+xml':
+        return _render_image
+    if content_type == 'application/pdf':
+        return _render_pdf
+    if content_type.startswith('video/'):
+        return _render_video
+    return None
+
+
+# ========== SERVICE ==========
+
+class PreviewService:
+    """Schedules preview rendering for newly stored blobs"""
+
+    def __init__(self):
+        self.workers = int(os.environ.get('PREVIEW_WORKERS', 2))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preview')
+        return self._executor
+
+    def is_supported(self, content_type: str) -> bool:
+        return _renderer_for(content_type) is not None
+
+    def needs_render(self, blob) -> bool:
+        """Not rendered yet, or claimed by a worker that never finished"""
+        if blob.preview_status is None:
+            return True
+        return blob.preview_status == STATUS_PENDING and self._claim_is_stale(blob.preview_claimed_at)
+
+    @staticmethod
+    def _claim_is_stale(claimed_at) -> bool:
+        return claimed_at is None or claimed_at < datetime.utcnow() - CLAIM_TIMEOUT
+
+    def schedule(self, blob):
+        """Queue a preview for blob (after the blob row is committed); no-op if already handled"""
+        from flask import current_app
+        if not self.needs_render(blob) or not self.is_supported(blob.content_type):
+            return
+        app = current_app._get_current_object()
+        if self.workers <= 0:
+            self._generate(app, blob.id)
+            return
+        try:
+            self._get_executor().submit(self._generate, app, blob.id)
+        except RuntimeError as e:
+            logger.warning(f"Preview queue unavailable: {e}")
+
+    def _generate(self, app, blob_id):
+        from sqlalchemy import and_, or_
+        from models import db, Blob
+        with app.app_context():
+            try:
+                # Claim the job so concurrent uploads of the same content render once;
+                # pending rows whose claim timed out are taken over
+                stale = or_(Blob.preview_claimed_at.is_(None),
+                            Blob.preview_claimed_at < datetime.utcnow() - CLAIM_TIMEOUT)
+                claimed = Blob.query.filter(
+                    Blob.id == blob_id,
+                    or_(Blob.preview_status.is_(None), and_(Blob.preview_status == STATUS_PENDING, stale))
+                ).update(
+                    {Blob.preview_status: STATUS_PENDING, Blob.preview_claimed_at: datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.session.commit()
+                if claimed != 1:
+                    return
+                blob = Blob.query.get(blob_id)
+                status = self._render(blob)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Preview generation failed for blob {blob_id}: {e}")
+                status = STATUS_FAILED
+            try:
+                Blob.query.filter_by(id=blob_id).update({Blob.preview_status: status}, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to record preview status for blob {blob_id}: {e}")
+
+    def _render(self, blob) -> str:
+        renderer = _renderer_for(blob.content_type)
+        if renderer is None:
+            return STATUS_UNSUPPORTED
+
+        with tempfile.TemporaryDirectory(prefix='preview-') as tmp:
+            source = blob.storage_path
+            if source.startswith('gs://'):
+                source = os.path.join(tmp, 'source')
+                if not storage_service.download_to_path(blob.storage_path, source):
+                    return STATUS_FAILED
+            dest = os.path.join(tmp, 'preview.jpg')
+            if not renderer(source, dest):
+                return STATUS_UNSUPPORTED
+
+            target = preview_path_for(blob.storage_path)
+            if target.startswith('gs://'):
+                bucket_path = target.replace('gs://', '').split('/', 1)[1]
+                subfolder, filename = bucket_path.rsplit('/', 1)
+                storage_service.save_path(dest, filename, subfolder=subfolder, content_type='image/jpeg')
+            else:
+                shutil.move(dest, target)
+        logger.info(f"Preview generated for blob {blob.sha256[:12]}")
+        return STATUS_READY
+
+
+# Export singleton instance
+preview_service = PreviewService()
@@ -2,8 +2,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from models import db, Project
 from auth import get_current_user
+from request_cache import get_project_ids, is_project_member
+from session_middleware import prevent_duplicate_submission
 from permissions import Permission
 from validators import validator, ValidationError
+from read_routing import read_replica
+from collection_versions import conditional_get
+from json_provider import json_object
 
 
 projects_bp = Blueprint('projects', __name__)
@@ -11,6 +16,8 @@ projects_bp = Blueprint('projects', __name__)
 
 @projects_bp.route('/', methods=['GET'])
 @jwt_required()
+@read_replica
+@conditional_get('projects', 'users', 'project_members')
 def list_projects():
     try:
         current_user = get_current_user()
@@ -26,8 +33,7 @@ def list_projects():
                 query = query.filter(Project.name.contains(search))
             projects = query.order_by(Project.created_at.desc()).all()
         else:
-            from models import ProjectMember
-            membership_project_ids = [m.project_id for m in ProjectMember.query.filter_by(user_id=current_user.id).all()]
+            membership_project_ids = list(get_project_ids(current_user.id))
             if not membership_project_ids:
                 return jsonify([]), 200
             query = Project.query.filter(Project.id.in_(membership_project_ids))
@@ -46,8 +52,7 @@ def my_projects():
         current_user = get_current_user()
         if not current_user or not current_user.has_permission(Permission.PROJECTS_READ):
             return jsonify({'error': 'Access denied'}), 403
-        from models import ProjectMember
-        membership_project_ids = [m.project_id for m in ProjectMember.query.filter_by(user_id=current_user.id).all()]
+        membership_project_ids = list(get_project_ids(current_user.id))
         if not membership_project_ids:
             return jsonify([]), 200
         projects = Project.query.filter(Project.id.in_(membership_project_ids)).order_by(Project.created_at.desc()).all()
@@ -58,6 +63,7 @@ def my_projects():
 
 @projects_bp.route('/', methods=['POST'])
 @jwt_required()
+@prevent_duplicate_submission
 def create_project():
     try:
         current_user = get_current_user()
@@ -92,8 +98,7 @@ def get_project(project_id):
         # Non admins can only view if they are members
         role = (current_user.role or '').lower()
         if role not in ['admin', 'super_admin']:
-            from models import ProjectMember
-            if not ProjectMember.query.filter_by(project_id=project.id, user_id=current_user.id).first():
+            if not is_project_member(project.id, current_user.id):
                 return jsonify({'error': 'Access denied'}), 403
         # Include tasks, unique assignees, and members for the project
         from models import Task, User, ProjectMember
@@ -114,7 +119,6 @@ def get_project(project_id):
             membership.append({'user_id': m.user_id, 'name': m.user.name if m.user else None, 'email': m.user.email if m.user else None, 'role': m.role, 'joined_at': m.joined_at.isoformat() if m.joined_at else None})
 
         data = project.to_dict(include_sprints=True)
-        data['tasks'] = [t.to_dict() for t in tasks]
         data['assignees'] = assignees
         data['members'] = membership
         # Count tasks by status efficiently (already loaded in memory)
@@ -125,7 +129,8 @@ def get_project(project_id):
             'in_progress': sum(1 for t in tasks if t.status == 'in_progress'),
             'completed': sum(1 for t in tasks if t.status == 'completed')
         }
-        return jsonify(data), 200
+        # Tasks are streamed after the other fields when the project is large
+        return json_object(data, tasks=(tasks, Task.to_dict)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -182,8 +187,7 @@ def list_members(project_id):
         # Non admins can only list if they are members
         role = (current_user.role or '').lower()
         if role not in ['admin', 'super_admin']:
-            from models import ProjectMember
-            if not ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first():
+            if not is_project_member(project_id, current_user.id):
                 return jsonify({'error': 'Access denied'}), 403
         from models import ProjectMember
         members = ProjectMember.query.filter_by(project_id=project_id).all()
@@ -220,7 +224,7 @@ def add_member(project_id):
             return jsonify({'error': 'User not found'}), 404
         # Managers may only add within projects they belong to
         if (current_user.role or '').lower() == 'manager':
-            if not ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first():
+            if not is_project_member(project_id, current_user.id):
                 return jsonify({'error': 'You may only manage members within your projects'}), 403
         existing = ProjectMember.query.filter_by(project_id=project_id, user_id=user_id).first()
         if existing:
@@ -246,7 +250,7 @@ def remove_member(project_id, user_id):
         if not membership:
             return jsonify({'error': 'Membership not found'}), 404
         if (current_user.role or '').lower() == 'manager':
-            if not ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first():
+            if not is_project_member(project_id, current_user.id):
                 return jsonify({'error': 'You may only manage members within your projects'}), 403
         db.session.delete(membership)
         db.session.commit()
@@ -0,0 +1,146 @@
+"""
+Per-request SQL instrumentation: query count, DB time, N+1 and slow-query detection.
+
+Engine-level cursor events time every statement. Statements run by a request
+thread are attributed to that request; _log_request adds the totals to its log
+line. A statement shape (normalized SQL, literals and IN lists collapsed) that
+repeats more than QUERY_N_PLUS_ONE_THRESHOLD times in one request is reported
+as an N+1 pattern; in strict mode that raises NPlusOneError instead, which
+fails the test that triggered it.
+
+    with track_queries() as stats:      # outside a request (scripts, tests)
+        ...
+    stats.count, stats.total_ms, stats.repeated()
+
+Configuration (environment variables or app.config):
+    QUERY_N_PLUS_ONE_THRESHOLD  Repeats of one shape per request before flagging (default 10)
+    QUERY_N_PLUS_ONE_STRICT     'true' to raise NPlusOneError (default false)
+    QUERY_SLOW_MS               Log statements slower than this, with the normalized SQL (default 500)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 10))
+N_PLUS_ONE_STRICT = str(os.environ.get('QUERY_N_PLUS_ONE_STRICT', 'false')).lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('QUERY_SLOW_MS', 500))
+
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_PYFORMAT_PARAM = re.compile(r"%\(\w+\)s|%s")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneError(AssertionError):
+    """Raised in strict mode when a request repeats one statement shape too often"""
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """SQL shape: literals become ?, IN lists collapse to (?...), whitespace is squeezed"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PYFORMAT_PARAM.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Statements executed while one request (or track_queries block) was active"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self.timeline = []
+
+    def record(self, statement: str, elapsed_ms: float, started: float):
+        shape = normalize_statement(statement)
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[shape] += 1
+        self.timeline.append((started, elapsed_ms, shape))
+
+    def repeated(self, threshold: int = None):
+        """[(shape, count)] of statements repeated more than threshold times"""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+    def summary(self) -> dict:
+        return {'db_queries': self.count, 'db_time_ms': round(self.total_ms, 2)}
+
+
+_local = threading.local()
+
+
+def current_stats():
+    """QueryStats of the request/track_queries block active on this thread, or None"""
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def track_queries():
+    previous = current_stats()
+    stats = _local.stats = QueryStats()
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_stack = conn.info.get('query_started')
+    if not started_stack:
+        return
+    started = started_stack.pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, elapsed_ms, started)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms): {normalize_statement(statement)}")
+
+
+def init_app(app):
+    """Track statements per request and check them for N+1 patterns"""
+    app.config.setdefault('QUERY_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    app.config.setdefault('QUERY_N_PLUS_ONE_STRICT', N_PLUS_ONE_STRICT)
+
+    @app.before_request
+    def _start_query_tracking():
+        _local.stats = QueryStats()
+
+    @app.after_request
+    def _check_n_plus_one(response):
+        stats = current_stats()
+        repeated = stats.repeated(app.config['QUERY_N_PLUS_ONE_THRESHOLD']) if stats else []
+        if repeated:
+            shape, count = repeated[0]
+            message = f"N+1 queries in {request.method} {request.path}: {count}x {shape}"
+            if app.config['QUERY_N_PLUS_ONE_STRICT']:
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def _stop_query_tracking(exc):
+        _local.stats = None
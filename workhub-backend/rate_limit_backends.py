@@ -0,0 +1,285 @@
+"""
+Storage backends for security_middleware.RateLimiter.
+
+All backends implement the same small set of atomic operations so rate limits
+and login lockouts can be enforced per process, per host or per cluster:
+
+- MemoryBackend: process-local dicts (single worker, development, tests)
+- SQLiteBackend: a WAL-mode SQLite file shared by all gunicorn workers on one host
+- RedisBackend:  any Redis-protocol server, shared by all nodes; each operation is
+                 one round trip (server-side Lua script or pipeline) and uses the
+                 Redis server clock, so skew between nodes does not matter
+
+Select with RATE_LIMIT_BACKEND=memory|sqlite|redis (see get_backend_from_env).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Failed login attempts are counted within this window (seconds)
+FAILURE_WINDOW = 600
+
+
+class MemoryBackend:
+    """
+    Process-local GCRA state: one float (theoretical arrival time) per key.
+    The key table is LRU-bounded; sweep() drops replenished keys.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self.buckets: "OrderedDict[str, float]" = OrderedDict()  # key -> TAT
+        self.lockouts: Dict[str, float] = {}  # identifier -> lockout expiry (epoch seconds)
+        self.failed_attempts: Dict[str, list] = {}  # identifier -> [count, window_start]
+
+    def gcra(self, key: str, interval: float, time_window: float, now: float) -> bool:
+        """Atomically apply one request; returns True if it must be rejected"""
+        with self._lock:
+            tat = self.buckets.get(key, now)
+            if tat < now:
+                tat = now
+            new_tat = tat + interval
+            if new_tat - now > time_window:
+                return True
+
+            self.buckets[key] = new_tat
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_keys:
+                # Evict least recently used key
+                self.buckets.popitem(last=False)
+        return False
+
+    def get_lockout(self, identifier: str, now: float) -> Optional[float]:
+        with self._lock:
+            lockout_until = self.lockouts.get(identifier)
+            if lockout_until is None:
+                return None
+            if now < lockout_until:
+                return lockout_until
+            # Lockout expired, remove it
+            del self.lockouts[identifier]
+            self.failed_attempts.pop(identifier, None)
+        return None
+
+    def record_failure(self, identifier: str, max_attempts: int, lockout_seconds: float,
+                       now: float) -> Optional[float]:
+        with self._lock:
+            entry = self.failed_attempts.get(identifier)
+            if entry is None or now - entry[1] > FAILURE_WINDOW:
+                entry = [0, now]
+                self.failed_attempts[identifier] = entry
+            entry[0] += 1
+            if entry[0] >= max_attempts:
+                lockout_until = now + lockout_seconds
+                self.lockouts[identifier] = lockout_until
+                return lockout_until
+        return None
+
+    def clear(self, identifier: str):
+        with self._lock:
+            self.failed_attempts.pop(identifier, None)
+            self.lockouts.pop(identifier, None)
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            expired = [k for k, tat in self.buckets.items() if tat <= now]
+            for k in expired:
+                del self.buckets[k]
+            for k in [k for k, until in self.lockouts.items() if until <= now]:
+                del self.lockouts[k]
+            for k in [k for k, (_, start) in self.failed_attempts.items() if now - start > FAILURE_WINDOW]:
+                del self.failed_attempts[k]
+        return len(expired)
+
+
+class SQLiteBackend:
+    """
+    Host-wide state in a SQLite file. Each operation is a single
+    BEGIN IMMEDIATE transaction, so concurrent workers update keys atomically.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 2000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        # Create the schema on a throwaway connection; request threads open their own lazily
+        conn = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS rl_buckets (key TEXT PRIMARY KEY, tat REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS rl_failures (key TEXT PRIMARY KEY, count INTEGER NOT NULL, window_start REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS rl_lockouts (key TEXT PRIMARY KEY, until REAL NOT NULL);
+            """)
+        finally:
+            conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def gcra(self, key: str, interval: float, time_window: float, now: float) -> bool:
+        def op(conn):
+            row = conn.execute('SELECT tat FROM rl_buckets WHERE key = ?', (key,)).fetchone()
+            tat = max(row[0], now) if row else now
+            new_tat = tat + interval
+            if new_tat - now > time_window:
+                return True
+            conn.execute('INSERT OR REPLACE INTO rl_buckets (key, tat) VALUES (?, ?)', (key, new_tat))
+            return False
+        return self._transaction(op)
+
+    def get_lockout(self, identifier: str, now: float) -> Optional[float]:
+        row = self._conn().execute('SELECT until FROM rl_lockouts WHERE key = ?', (identifier,)).fetchone()
+        if row and now < row[0]:
+            return row[0]
+        return None
+
+    def record_failure(self, identifier: str, max_attempts: int, lockout_seconds: float,
+                       now: float) -> Optional[float]:
+        def op(conn):
+            row = conn.execute('SELECT count, window_start FROM rl_failures WHERE key = ?', (identifier,)).fetchone()
+            if row is None or now - row[1] > FAILURE_WINDOW:
+                count, start = 1, now
+            else:
+                count, start = row[0] + 1, row[1]
+            conn.execute('INSERT OR REPLACE INTO rl_failures (key, count, window_start) VALUES (?, ?, ?)',
+                         (identifier, count, start))
+            if count >= max_attempts:
+                until = now + lockout_seconds
+                conn.execute('INSERT OR REPLACE INTO rl_lockouts (key, until) VALUES (?, ?)', (identifier, until))
+                return until
+            return None
+        return self._transaction(op)
+
+    def clear(self, identifier: str):
+        def op(conn):
+            conn.execute('DELETE FROM rl_failures WHERE key = ?', (identifier,))
+            conn.execute('DELETE FROM rl_lockouts WHERE key = ?', (identifier,))
+        self._transaction(op)
+
+    def sweep(self, now: float) -> int:
+        def op(conn):
+            removed = conn.execute('DELETE FROM rl_buckets WHERE tat <= ?', (now,)).rowcount
+            conn.execute('DELETE FROM rl_lockouts WHERE until <= ?', (now,))
+            conn.execute('DELETE FROM rl_failures WHERE ? - window_start > ?', (now, FAILURE_WINDOW))
+            return removed
+        return self._transaction(op)
+
+
+# Time comes from the Redis server (TIME), not the caller: every node then uses
+# one clock, so clock skew between nodes cannot stretch or shrink the limit.
+# replicate_commands() lets Redis < 5 write after reading TIME (a no-op later).
+_REDIS_NOW = """
+if redis.replicate_commands then redis.replicate_commands() end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+"""
+
+# GCRA as a server-side script: atomic and a single round trip.
+# KEYS[1] = bucket key; ARGV = interval, time_window (seconds, float)
+_REDIS_GCRA = _REDIS_NOW + """
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - now > window then return 1 end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return 0
+"""
+
+# KEYS[1] = failures counter, KEYS[2] = lockout key; ARGV = max_attempts, lockout_seconds, window
+_REDIS_RECORD_FAILURE = _REDIS_NOW + """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3])) end
+if count >= tonumber(ARGV[1]) then
+    local until_ts = now + tonumber(ARGV[2])
+    redis.call('SET', KEYS[2], tostring(until_ts), 'EX', math.ceil(tonumber(ARGV[2])))
+    return tostring(until_ts)
+end
+return false
+"""
+
+
+class RedisBackend:
+    """
+    Cluster-wide state in Redis (or any Redis-protocol server such as
+    Valkey, KeyDB or Memorystore). Keys carry TTLs, so no sweep is needed.
+    """
+
+    def __init__(self, url: str, prefix: str = 'workhub:rl:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._gcra = self.client.register_script(_REDIS_GCRA)
+        self._record_failure = self.client.register_script(_REDIS_RECORD_FAILURE)
+
+    def gcra(self, key: str, interval: float, time_window: float, now: float) -> bool:
+        # now is ignored: the script reads the Redis server clock
+        return bool(self._gcra(keys=[f"{self.prefix}b:{key}"], args=[interval, time_window]))
+
+    def get_lockout(self, identifier: str, now: float) -> Optional[float]:
+        # The key expires with the lockout (server clock), so its presence is the answer
+        value = self.client.get(f"{self.prefix}l:{identifier}")
+        return float(value) if value is not None else None
+
+    def record_failure(self, identifier: str, max_attempts: int, lockout_seconds: float,
+                       now: float) -> Optional[float]:
+        result = self._record_failure(
+            keys=[f"{self.prefix}f:{identifier}", f"{self.prefix}l:{identifier}"],
+            args=[max_attempts, lockout_seconds, FAILURE_WINDOW],
+        )
+        return float(result) if result else None
+
+    def clear(self, identifier: str):
+        # Both deletes in one round trip
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(f"{self.prefix}f:{identifier}")
+        pipe.delete(f"{self.prefix}l:{identifier}")
+        pipe.execute()
+
+    def sweep(self, now: float) -> int:
+        return 0
+
+
+def get_backend_from_env():
+    """
+    Build the backend selected by RATE_LIMIT_BACKEND (default 'memory').
+    Falls back to MemoryBackend if the shared store cannot be initialized,
+    so a misconfiguration never takes the API down.
+    """
+    kind = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+    try:
+        if kind == 'sqlite':
+            path = os.environ.get('RATE_LIMIT_SQLITE_PATH', '/tmp/workhub_rate_limit.db')
+            return SQLiteBackend(path)
+        if kind == 'redis':
+            return RedisBackend(os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
+    except Exception as e:
+        logger.warning(f"Rate limit backend '{kind}' unavailable, using in-memory limits: {e}")
+    return MemoryBackend(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000)))
@@ -0,0 +1,243 @@
+"""
+Read-replica routing for read-only endpoints.
+
+Endpoints opt in with the @read_replica decorator (placed under @jwt_required)
+or a whole blueprint with use_read_replica(bp), which covers its GET requests.
+While routing is on, RoutingSession sends plain SELECTs to the 'replica' bind
+(see db_pool.py). Flushes, locking reads and everything outside those
+endpoints keep using the primary.
+
+Read-your-writes: once a user's request commits a write, that user's reads
+stay on the primary for READ_YOUR_WRITES_SECONDS, so replica lag never hides
+their own changes. The user's next request may land on any instance, so the
+markers must be in redis. The memory and sqlite stores are only seen by one
+process or one host: with either of them (or when redis is unavailable) an
+error is logged and every read stays on the primary. Without a replica bind
+nothing changes.
+
+Configuration (environment variables):
+    READ_YOUR_WRITES_SECONDS  Primary-only window after a user's write (default 10)
+    READ_YOUR_WRITES_BACKEND  memory|sqlite|redis (defaults to RATE_LIMIT_BACKEND)
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from db_pool import REPLICA_BIND
+
+logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+
+
+# ========== RECENT WRITE MARKERS ==========
+
+class MemoryWriteMarkers:
+    """Process-local user -> primary-until timestamps (single worker, tests)"""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, user_id: str, until: float):
+        with self._lock:
+            self._until[user_id] = until
+            self._until.move_to_end(user_id)
+            if len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+
+    def active(self, user_id: str, now: float) -> bool:
+        with self._lock:
+            return self._until.get(user_id, 0) > now
+
+
+class SQLiteWriteMarkers:
+    """Markers in a SQLite file shared by all gunicorn workers on one host"""
+
+    shared = False  # other instances never see these markers
+
+    def __init__(self, path: str, busy_timeout_ms: int = 2000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS recent_writes (user_id TEXT PRIMARY KEY, until REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def mark(self, user_id: str, until: float):
+        self._conn().execute("INSERT OR REPLACE INTO recent_writes (user_id, until) VALUES (?, ?)", (user_id, until))
+
+    def active(self, user_id: str, now: float) -> bool:
+        row = self._conn().execute("SELECT until FROM recent_writes WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None and row[0] > now
+
+
+class RedisWriteMarkers:
+    """Markers as expiring Redis keys, shared by all nodes"""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = 'workhub:ryw:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def mark(self, user_id: str, until: float):
+        ttl_ms = max(int((until - time.time()) * 1000), 1)
+        self.client.set(self.prefix + user_id, 1, px=ttl_ms)
+
+    def active(self, user_id: str, now: float) -> bool:
+        return bool(self.client.exists(self.prefix + user_id))
+
+
+def get_markers_from_env():
+    """Build the store selected by READ_YOUR_WRITES_BACKEND (falls back to memory)"""
+    kind = os.environ.get('READ_YOUR_WRITES_BACKEND') or os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    kind = kind.lower()
+    try:
+        if kind == 'sqlite':
+            return SQLiteWriteMarkers(os.environ.get('READ_YOUR_WRITES_SQLITE_PATH', '/tmp/workhub_recent_writes.db'))
+        if kind == 'redis':
+            return RedisWriteMarkers(os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
+    except Exception as e:
+        logger.warning(f"Read-your-writes store '{kind}' unavailable, using in-memory store: {e}")
+    return MemoryWriteMarkers()
+
+
+write_markers = get_markers_from_env()
+
+
+# ========== ROUTING ==========
+
+def replica_configured() -> bool:
+    return REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def _current_user_id():
+    """JWT identity of the request, or None (never raises)"""
+    try:
+        from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return str(identity) if identity is not None else None
+
+
+_unshared_markers_logged = False
+
+
+def _markers_are_shared() -> bool:
+    global _unshared_markers_logged
+    if write_markers.shared:
+        return True
+    if not _unshared_markers_logged:
+        _unshared_markers_logged = True
+        logger.error(
+            f"A read replica is configured but read-your-writes markers are in {type(write_markers).__name__}, "
+            "which other instances cannot see; set READ_YOUR_WRITES_BACKEND=redis. Reads stay on the primary."
+        )
+    return False
+
+
+def _route_reads_to_replica():
+    if not replica_configured() or not _markers_are_shared():
+        return
+    user_id = _current_user_id()
+    try:
+        if user_id is not None and write_markers.active(user_id, time.time()):
+            return
+    except Exception as e:
+        # Unknown write history: the primary is always safe
+        logger.warning(f"Read-your-writes check failed, reading from primary: {e}")
+        return
+    g._read_replica = True
+
+
+def read_replica(fn):
+    """Send this endpoint's SELECTs to the read replica (place under @jwt_required)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        _route_reads_to_replica()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def use_read_replica(blueprint):
+    """Send the SELECTs of every GET request in blueprint to the read replica"""
+    @blueprint.before_request
+    def _replica_reads():
+        if request.method in ('GET', 'HEAD'):
+            _route_reads_to_replica()
+    return blueprint
+
+
+def reading_from_replica() -> bool:
+    return has_request_context() and g.get('_read_replica', False) and not g.get('_db_wrote', False)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends replica-routed SELECTs to the 'replica' bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._flushing or not reading_from_replica():
+            return engine
+        if clause is None or not getattr(clause, 'is_select', False) or getattr(clause, '_for_update_arg', None) is not None:
+            return engine
+        engines = self._db.engines
+        # Only tables on the default bind are replicated
+        if engine is engines.get(None) and REPLICA_BIND in engines:
+            return engines[REPLICA_BIND]
+        return engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_write(session, flush_context):
+    # The rest of this request reads its own writes from the primary
+    if has_request_context():
+        g._db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    # query.update() / delete() and insert() statements skip the flush
+    if has_request_context() and (orm_execute_state.is_update or orm_execute_state.is_delete
+                                  or orm_execute_state.is_insert):
+        g._db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_writer(session):
+    if not has_request_context() or not g.get('_db_wrote') or g.get('_db_write_marked'):
+        return
+    if not replica_configured():
+        return
+    g._db_write_marked = True
+    user_id = _current_user_id()
+    if user_id is None:
+        return
+    try:
+        write_markers.mark(user_id, time.time() + READ_YOUR_WRITES_WINDOW)
+    except Exception as e:
+        logger.warning(f"Could not record write for read-your-writes routing: {e}")
@@ -4,12 +4,18 @@ from models import db, Task, User, TimeLog, Project, Sprint
 from datetime import datetime, timedelta
 from auth import admin_required, get_current_user
 from permissions import Permission
-import pandas as pd
+from lazy_init import lazy_import
+from read_routing import use_read_replica
 import io
 from sqlalchemy import func
 from io import StringIO
 
+# pandas takes ~0.5 s to import; only the export endpoints need it
+pd = lazy_import('pandas')
+
 reports_bp = Blueprint('reports', __name__)
+# Reports are read-only and tolerate replica lag
+use_read_replica(reports_bp)
 
 @reports_bp.route('/personal/task-status', methods=['GET'])
 @jwt_required()
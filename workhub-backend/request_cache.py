@@ -0,0 +1,205 @@
+"""
+Request-scoped identity map for the current user and their memberships.
+
+Within a single request the same lookups are repeated by decorators, handlers
+and helpers (get_current_user, ProjectMember / ChatGroupMember checks). The
+results are memoized on flask.g so each one hits the database at most once per
+request. Entries are dropped when a flush in the same request writes a User,
+ProjectMember or ChatGroupMember row, or a bulk query.update() / delete()
+targets one of those tables, so handlers always see their own writes.
+
+Only requests are cached. Long-lived app contexts (upload and preview worker
+threads, CLI scripts) always read from the database, because they would
+otherwise keep serving identities and memberships from when they started.
+"""
+
+import logging
+import threading
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters (lookups served from g instead of the database)
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _identity_map():
+    """Return the per-request cache dict, creating it on first use"""
+    cache = getattr(g, '_identity_map', None)
+    if cache is None:
+        cache = {'users': {}, 'project_ids': {}, 'group_ids': {}, 'hits': 0, 'misses': 0}
+        g._identity_map = cache
+    return cache
+
+
+def _record(cache, hit: bool):
+    key = 'hits' if hit else 'misses'
+    cache[key] += 1
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_user(user_id):
+    """Get a User by id, loading it at most once per request"""
+    if user_id is None:
+        return None
+    if not has_request_context():
+        from models import User
+        return User.query.get(user_id)
+
+    cache = _identity_map()
+    users = cache['users']
+    if user_id in users:
+        _record(cache, True)
+        return users[user_id]
+
+    from models import User
+    user = User.query.get(user_id)
+    users[user_id] = user
+    _record(cache, False)
+    return user
+
+
+def get_project_ids(user_id) -> frozenset:
+    """Get the ids of all projects the user is a member of"""
+    if user_id is None:
+        return frozenset()
+
+    from models import ProjectMember
+
+    def _load():
+        rows = ProjectMember.query.with_entities(ProjectMember.project_id).filter_by(user_id=user_id).all()
+        return frozenset(r[0] for r in rows)
+
+    return _memoized('project_ids', user_id, _load)
+
+
+def get_group_ids(user_id) -> frozenset:
+    """Get the ids of all chat groups the user is a member of"""
+    if user_id is None:
+        return frozenset()
+
+    from models import ChatGroupMember
+
+    def _load():
+        rows = ChatGroupMember.query.with_entities(ChatGroupMember.group_id).filter_by(user_id=user_id).all()
+        return frozenset(r[0] for r in rows)
+
+    return _memoized('group_ids', user_id, _load)
+
+
+def is_project_member(project_id, user_id) -> bool:
+    """Check project membership using the cached membership set"""
+    if project_id is None or user_id is None:
+        return False
+    try:
+        return int(project_id) in get_project_ids(int(user_id))
+    except (TypeError, ValueError):
+        return False
+
+
+def is_group_member(group_id, user_id) -> bool:
+    """Check chat group membership using the cached membership set"""
+    if group_id is None or user_id is None:
+        return False
+    try:
+        return int(group_id) in get_group_ids(int(user_id))
+    except (TypeError, ValueError):
+        return False
+
+
+def _memoized(bucket, user_id, loader):
+    if not has_request_context():
+        return loader()
+
+    cache = _identity_map()
+    entries = cache[bucket]
+    if user_id in entries:
+        _record(cache, True)
+        return entries[user_id]
+
+    value = loader()
+    entries[user_id] = value
+    _record(cache, False)
+    return value
+
+
+def invalidate(user_id=None, bucket=None):
+    """
+    Drop cached entries for the current request.
+
+    Args:
+        user_id: Only drop entries for this user (default: all users)
+        bucket: One of 'users', 'project_ids', 'group_ids' (default: all)
+    """
+    if not has_request_context():
+        return
+    cache = getattr(g, '_identity_map', None)
+    if cache is None:
+        return
+
+    buckets = [bucket] if bucket else ['users', 'project_ids', 'group_ids']
+    for name in buckets:
+        if user_id is None:
+            cache[name].clear()
+        else:
+            cache[name].pop(user_id, None)
+    with _stats_lock:
+        _stats['invalidations'] += 1
+
+
+def request_stats() -> dict:
+    """Hits/misses for the current request (hits == queries saved)"""
+    cache = getattr(g, '_identity_map', None) if has_request_context() else None
+    if cache is None:
+        return {'hits': 0, 'misses': 0}
+    return {'hits': cache['hits'], 'misses': cache['misses']}
+
+
+def get_stats() -> dict:
+    """Process-wide counters since startup"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_on_flush(session, flush_context):
+    """Drop cached entries touched by writes flushed in this request"""
+    if not has_request_context() or getattr(g, '_identity_map', None) is None:
+        return
+
+    from models import User, ProjectMember, ChatGroupMember
+
+    try:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User):
+                invalidate(obj.id, 'users')
+            elif isinstance(obj, ProjectMember):
+                invalidate(obj.user_id, 'project_ids')
+            elif isinstance(obj, ChatGroupMember):
+                invalidate(obj.user_id, 'group_ids')
+    except Exception as e:
+        # Never break a flush because of cache bookkeeping; fall back to a full reset
+        logger.debug(f"Identity map invalidation failed, clearing cache: {e}")
+        invalidate()
+
+
+# Tables whose bulk writes make a bucket stale; the affected users are unknown
+_BULK_BUCKETS = {'users': 'users', 'project_members': 'project_ids', 'chat_group_members': 'group_ids'}
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_on_bulk_write(orm_execute_state):
+    """query.update() / delete() skip the flush; drop the whole bucket they touch"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    if not has_request_context() or getattr(g, '_identity_map', None) is None:
+        return
+    mapper = orm_execute_state.bind_mapper
+    bucket = _BULK_BUCKETS.get(mapper.local_table.name) if mapper is not None else None
+    if bucket is not None:
+        invalidate(bucket=bucket)
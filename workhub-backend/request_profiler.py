@@ -0,0 +1,338 @@
+"""
+On-demand profiling of individual requests.
+
+A request is profiled when an admin sends the X-Profile header, or when it is
+picked by PROFILE_SAMPLE_RATE (optionally limited to some endpoints or users,
+e.g. chat.get_conversations for one heavy user). Two modes:
+
+    sample   (default) a background thread samples the request thread's stack
+             every PROFILE_INTERVAL_MS; the result is in collapsed-stack format
+             ("outer;inner;leaf count"), ready for flamegraph.pl or speedscope
+    cprofile deterministic cProfile; the top functions are stored and the raw
+             .pstats file is kept next to the profile (snakeviz, flameprof)
+
+Each profile is saved as JSON together with the request's SQL timeline from
+query_stats, and its id is returned in the X-Profile-Id header. Admins list
+them at GET /api/health/profiles and fetch one at GET /api/health/profiles/<id>
+(?format=collapsed for the raw stacks). With cloud storage enabled, profiles
+are stored in the bucket under profiles/, so whichever instance serves the
+listing sees every instance's profiles. Otherwise they go to PROFILE_DIR on
+local disk, and with several instances each one only lists its own.
+
+Configuration (environment variables):
+    PROFILE_DIR          Local directory for profiles without cloud storage (default /tmp/workhub_profiles)
+    PROFILE_MAX_FILES    Profiles kept; the oldest are deleted (in the bucket, when profiles are listed) (default 50)
+    PROFILE_SAMPLE_RATE  Fraction of matching requests to profile (default 0)
+    PROFILE_ENDPOINTS    Comma-separated Flask endpoints eligible for sampling (default all)
+    PROFILE_USER_IDS     Comma-separated user ids eligible for sampling (default all)
+    PROFILE_MODE         Mode for sampled requests: sample|cprofile (default sample)
+    PROFILE_INTERVAL_MS  Stack sampling interval (default 5)
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+import query_stats
+import storage_service as storage_module
+from storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+# Object name prefix in the bucket
+PROFILE_PREFIX = 'profiles'
+MODES = ('sample', 'cprofile')
+TOP_FUNCTIONS = 60
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _env_list(name):
+    return {item.strip() for item in os.environ.get(name, '').split(',') if item.strip()}
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Starts a profiler for selected requests and stores the results"""
+
+    def __init__(self):
+        self.directory = os.environ.get('PROFILE_DIR', '/tmp/workhub_profiles')
+        self.max_files = int(os.environ.get('PROFILE_MAX_FILES', 50))
+        self.sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+        self.endpoints = _env_list('PROFILE_ENDPOINTS')
+        self.user_ids = _env_list('PROFILE_USER_IDS')
+        self.default_mode = os.environ.get('PROFILE_MODE', 'sample')
+        self.interval = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+
+    # ---- selection ----
+
+    def _user_id(self):
+        try:
+            from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            return None
+        return str(identity) if identity is not None else None
+
+    def _requested_mode(self):
+        """Mode asked for with the X-Profile header, if the caller is an admin"""
+        value = request.headers.get(PROFILE_HEADER)
+        if not value:
+            return None
+        user_id = self._user_id()
+        if user_id is None:
+            return None
+        from request_cache import get_user
+        user = get_user(int(user_id)) if user_id.isdigit() else None
+        if not user or user.role not in ('admin', 'super_admin'):
+            return None
+        return value.lower() if value.lower() in MODES else 'sample'
+
+    def _sampled_mode(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if self.endpoints and request.endpoint not in self.endpoints:
+            return None
+        if self.user_ids and self._user_id() not in self.user_ids:
+            return None
+        return self.default_mode
+
+    # ---- request hooks ----
+
+    def start(self):
+        mode = self._requested_mode() or self._sampled_mode()
+        if mode is None:
+            return
+        state = {'mode': mode, 'started': time.perf_counter(), 'started_at': datetime.utcnow()}
+        if mode == 'cprofile':
+            state['profiler'] = cProfile.Profile()
+            state['profiler'].enable()
+        else:
+            state['sampler'] = StackSampler(threading.get_ident(), self.interval)
+            state['sampler'].start()
+        g._profile = state
+
+    def finish(self, response):
+        state = g.pop('_profile', None)
+        if state is None:
+            return response
+        duration_ms = (time.perf_counter() - state['started']) * 1000
+        profile = {
+            'id': uuid.uuid4().hex,
+            'mode': state['mode'],
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'user_id': self._user_id(),
+            'started_at': state['started_at'].isoformat() + 'Z',
+            'duration_ms': round(duration_ms, 2),
+            'sql': self._sql_timeline(state['started']),
+        }
+        profiler = state.get('profiler')
+        if profiler is not None:
+            profiler.disable()
+            profile['functions'] = self._cprofile_summary(profiler)
+        else:
+            sampler = state['sampler']
+            stacks = sampler.stop()
+            profile['interval_ms'] = self.interval * 1000
+            profile['samples'] = sampler.samples
+            profile['collapsed'] = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        try:
+            self._save(profile, profiler)
+            response.headers['X-Profile-Id'] = profile['id']
+        except Exception as e:
+            # Profiling must never fail the request (disk full, bucket 403/5xx, ...)
+            logger.warning(f"Could not save request profile: {e}")
+        return response
+
+    # ---- results ----
+
+    def _sql_timeline(self, started):
+        stats = query_stats.current_stats()
+        if stats is None:
+            return {'count': 0, 'total_ms': 0.0, 'statements': []}
+        return {
+            'count': stats.count,
+            'total_ms': round(stats.total_ms, 2),
+            'statements': [
+                {'offset_ms': round((at - started) * 1000, 2), 'duration_ms': round(ms, 2), 'sql': shape}
+                for at, ms, shape in stats.timeline
+            ],
+        }
+
+    def _cprofile_summary(self, profiler):
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        functions = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+            functions.append({
+                'function': f"{name} ({os.path.basename(filename)}:{line})",
+                'calls': calls,
+                'own_ms': round(own * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            })
+        functions.sort(key=lambda f: -f['cumulative_ms'])
+        return functions[:TOP_FUNCTIONS]
+
+    # ---- storage ----
+
+    def _bucket(self):
+        """The Cloud Storage bucket when cloud storage is enabled, else None (local PROFILE_DIR)"""
+        if not storage_service.cloud_enabled():
+            return None
+        return storage_module.get_storage_client().bucket(storage_module.CLOUD_STORAGE_BUCKET)
+
+    def _save(self, profile, profiler=None):
+        bucket = self._bucket()
+        if bucket is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{profile['id']}.json")
+            with open(path, 'w') as fh:
+                json.dump(profile, fh)
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(self.directory, f"{profile['id']}.pstats"))
+            self._prune()
+            return
+
+        name = f"{PROFILE_PREFIX}/{profile['id']}"
+        data = json.dumps(profile).encode('utf-8')
+        bucket.blob(f"{name}.json").upload_from_file(io.BytesIO(data), content_type='application/json')
+        if profiler is not None:
+            with tempfile.TemporaryDirectory(prefix='profile-') as tmp:
+                path = os.path.join(tmp, 'profile.pstats')
+                profiler.dump_stats(path)
+                bucket.blob(f"{name}.pstats").upload_from_filename(path, content_type='application/octet-stream')
+        # Old profiles in the bucket are pruned by list_profiles, off the request path
+
+    def _prune(self):
+        files = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')),
+            key=os.path.getmtime,
+        )
+        for path in files[:max(len(files) - self.max_files, 0)]:
+            for candidate in (path, path[:-len('.json')] + '.pstats'):
+                try:
+                    os.remove(candidate)
+                except FileNotFoundError:
+                    pass
+
+    def _bucket_profiles(self, bucket):
+        """Stored profile objects in the bucket, newest first"""
+        objects = [blob for blob in bucket.list_blobs(prefix=f"{PROFILE_PREFIX}/") if blob.name.endswith('.json')]
+        objects.sort(key=lambda blob: blob.updated.timestamp() if blob.updated else 0, reverse=True)
+        return objects
+
+    def _prune_bucket(self, bucket):
+        """Delete all but the newest max_files profiles in the bucket; returns the ones kept"""
+        objects = self._bucket_profiles(bucket)
+        for blob in objects[self.max_files:]:
+            for name in (blob.name, blob.name[:-len('.json')] + '.pstats'):
+                try:
+                    bucket.blob(name).delete()
+                except Exception:
+                    pass
+        return objects[:self.max_files]
+
+    def _profile_ids(self):
+        bucket = self._bucket()
+        if bucket is not None:
+            return [blob.name.rsplit('/', 1)[-1][:-len('.json')] for blob in self._prune_bucket(bucket)]
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def list_profiles(self):
+        """Summaries of stored profiles, newest first"""
+        summaries = []
+        for profile_id in self._profile_ids()[:self.max_files]:
+            profile = self.load(profile_id)
+            if profile:
+                summaries.append({key: profile.get(key) for key in (
+                    'id', 'mode', 'method', 'path', 'endpoint', 'status', 'user_id', 'started_at', 'duration_ms'
+                )} | {'sql_queries': profile.get('sql', {}).get('count', 0)})
+        summaries.sort(key=lambda p: p['started_at'] or '', reverse=True)
+        return summaries
+
+    def load(self, profile_id):
+        if not _PROFILE_ID.match(profile_id or ''):
+            return None
+        bucket = self._bucket()
+        try:
+            if bucket is None:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as fh:
+                    return json.load(fh)
+            with tempfile.TemporaryDirectory(prefix='profile-') as tmp:
+                path = os.path.join(tmp, 'profile.json')
+                bucket.blob(f"{PROFILE_PREFIX}/{profile_id}.json").download_to_filename(path)
+                with open(path) as fh:
+                    return json.load(fh)
+        except Exception:
+            return None
+
+    def abandon(self, exc=None):
+        """Stop a profiler whose request never reached after_request"""
+        state = g.pop('_profile', None)
+        if state is None:
+            return
+        if state.get('profiler') is not None:
+            state['profiler'].disable()
+        if state.get('sampler') is not None:
+            state['sampler'].stop()
+
+    def init_app(self, app):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.abandon)
+
+
+# Export singleton instance
+request_profiler = RequestProfiler()
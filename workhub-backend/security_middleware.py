@@ -8,38 +8,57 @@ Security middleware for P0 requirements:
 
 import functools
 import hashlib
+import logging
 import secrets
+import threading
 import time
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Optional
 from flask import request, jsonify, session, g
 from flask_jwt_extended import get_jwt_identity
 
+from rate_limit_backends import MemoryBackend, get_backend_from_env
+import metrics
+
+logger = logging.getLogger(__name__)
+
 
 # ========== RATE LIMITING ==========
 
 class RateLimiter:
     """
-    In-memory rate limiter (P0).
-    For production, use Redis or similar distributed cache.
+    Rate limiter (P0) using GCRA (generic cell rate algorithm).
+    
+    Each (identifier, limit) key stores a single float: the theoretical arrival
+    time (TAT) of the next request, so a check is O(1) regardless of traffic.
+    State lives in a pluggable backend (see rate_limit_backends):
+    in-process memory, a SQLite file shared by all workers on a host, or Redis
+    shared by all nodes. A daemon thread sweeps replenished keys every
+    sweep_interval seconds. Backend errors fail open so the API stays up.
     """
     
-    def __init__(self):
-        self.requests: Dict[str, list] = {}
-        self.lockouts: Dict[str, datetime] = {}
-        self.failed_attempts: Dict[str, list] = {}
+    def __init__(self, backend=None, max_keys: int = 100000, sweep_interval: float = 60.0):
+        self.backend = backend or MemoryBackend(max_keys=max_keys)
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+    
+    def _ensure_sweeper(self):
+        """Start the sweep thread lazily (after gunicorn forks workers)"""
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='rate-limiter-sweep', daemon=True)
+            self._sweeper.start()
     
-    def _cleanup_old_entries(self, key: str, time_window: int):
-        """Remove entries older than time_window seconds"""
-        if key in self.requests:
-            cutoff = time.time() - time_window
-            self.requests[key] = [t for t in self.requests[key] if t > cutoff]
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
     
-    def _cleanup_old_failures(self, key: str, time_window: int = 600):
-        """Remove failed attempts older than time_window seconds (default 10 min)"""
-        if key in self.failed_attempts:
-            cutoff = time.time() - time_window
-            self.failed_attempts[key] = [t for t in self.failed_attempts[key] if t > cutoff]
+    def sweep(self, now: float = None) -> int:
+        """Drop keys whose state has fully replenished; returns number removed"""
+        return self.backend.sweep(time.time() if now is None else now)
     
     def is_rate_limited(self, identifier: str, max_requests: int, time_window: int) -> bool:
         """
@@ -53,31 +72,22 @@ class RateLimiter:
         Returns:
             True if rate limited, False otherwise
         """
-        self._cleanup_old_entries(identifier, time_window)
-        
-        if identifier not in self.requests:
-            self.requests[identifier] = []
-        
-        # Check current request count
-        if len(self.requests[identifier]) >= max_requests:
-            return True
-        
-        # Record this request
-        self.requests[identifier].append(time.time())
-        return False
+        self._ensure_sweeper()
+        # Budgets are per limit, so a chatty endpoint cannot exhaust a stricter one
+        key = f"{identifier}|{max_requests}/{time_window}"
+        try:
+            return self.backend.gcra(key, time_window / max_requests, time_window, time.time())
+        except Exception as e:
+            logger.warning(f"Rate limit backend error, allowing request: {e}")
+            return False
     
     def is_locked_out(self, identifier: str) -> bool:
         """Check if identifier is currently locked out (P0)"""
-        if identifier in self.lockouts:
-            lockout_until = self.lockouts[identifier]
-            if datetime.utcnow() < lockout_until:
-                return True
-            else:
-                # Lockout expired, remove it
-                del self.lockouts[identifier]
-                if identifier in self.failed_attempts:
-                    del self.failed_attempts[identifier]
-        return False
+        try:
+            return self.backend.get_lockout(identifier, time.time()) is not None
+        except Exception as e:
+            logger.warning(f"Rate limit backend error checking lockout: {e}")
+            return False
     
     def record_failed_attempt(self, identifier: str, max_attempts: int = 5, 
                              lockout_minutes: int = 10) -> Optional[datetime]:
@@ -92,31 +102,24 @@ class RateLimiter:
         Returns:
             Lockout expiry datetime if locked out, None otherwise
         """
-        self._cleanup_old_failures(identifier)
-        
-        if identifier not in self.failed_attempts:
-            self.failed_attempts[identifier] = []
-        
-        self.failed_attempts[identifier].append(time.time())
-        
-        # Check if lockout threshold reached
-        if len(self.failed_attempts[identifier]) >= max_attempts:
-            lockout_until = datetime.utcnow() + timedelta(minutes=lockout_minutes)
-            self.lockouts[identifier] = lockout_until
-            return lockout_until
-        
-        return None
+        self._ensure_sweeper()
+        try:
+            lockout_until = self.backend.record_failure(identifier, max_attempts, lockout_minutes * 60, time.time())
+        except Exception as e:
+            logger.warning(f"Rate limit backend error recording failure: {e}")
+            return None
+        return datetime.utcfromtimestamp(lockout_until) if lockout_until else None
     
     def clear_failed_attempts(self, identifier: str):
         """Clear failed attempts after successful login"""
-        if identifier in self.failed_attempts:
-            del self.failed_attempts[identifier]
-        if identifier in self.lockouts:
-            del self.lockouts[identifier]
+        try:
+            self.backend.clear(identifier)
+        except Exception as e:
+            logger.warning(f"Rate limit backend error clearing failures: {e}")
 
 
-# Global rate limiter instance
-rate_limiter = RateLimiter()
+# Global rate limiter instance (backend chosen by RATE_LIMIT_BACKEND)
+rate_limiter = RateLimiter(backend=get_backend_from_env())
 
 
 def rate_limit(max_requests: int = 5, time_window: int = 60, 
@@ -141,6 +144,7 @@ def rate_limit(max_requests: int = 5, time_window: int = 60,
             
             # Check rate limit
             if rate_limiter.is_rate_limited(identifier, max_requests, time_window):
+                metrics.observe_rate_limited()
                 return jsonify({
                     'error': 'Rate limit exceeded. Please try again later.',
                     'code': 'RATE_LIMITED'
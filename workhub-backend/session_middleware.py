@@ -1,14 +1,25 @@
 """
 Session timeout middleware for automatic logout after inactivity
 """
-from flask import request, jsonify, g
+from flask import request, jsonify, g, make_response, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity, decode_token
 from datetime import datetime, timedelta
 import functools
+import hashlib
+import logging
+import os
+
+from idempotency import idempotency_store, STATE_DONE
+
+logger = logging.getLogger(__name__)
 
 # Session timeout in minutes (configurable)
 SESSION_TIMEOUT_MINUTES = 30
 
+# Idempotency settings
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.environ.get('IDEMPOTENCY_MAX_BODY_BYTES', 1024 * 1024))
+
 def session_timeout_required(f):
     """
     Decorator that checks if the user's session is still valid
@@ -51,45 +62,98 @@ def session_timeout_required(f):
 
 def prevent_duplicate_submission(f):
     """
-    Decorator to prevent duplicate form submissions
-    Uses a simple in-memory cache (in production, use Redis or database)
+    Decorator that makes a mutating endpoint idempotent.
+
+    Clients may send an ``Idempotency-Key`` header: the first response for that
+    key is stored (IDEMPOTENCY_TTL_SECONDS, default 24h) and replayed for retries
+    without running the handler. A retry while the first request is still
+    running gets 409; reusing a key with a different body gets 422. Replays
+    carry the original status, body and headers.
+
+    Requests without the header are processed as before: posting the same
+    comment twice is legitimate, and only the client can tell a retry apart.
+    The web client sends one key per submission (see submit() in
+    workhub-frontend/src/services/api.js).
+
+    The key store is shared across workers (see idempotency.py).
     """
-    submission_cache = {}
-    
     @functools.wraps(f)
     def decorated_function(*args, **kwargs):
+        client_key = (request.headers.get('Idempotency-Key') or '').strip()
+        if not client_key or request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            return f(*args, **kwargs)
+        if len(client_key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+
         try:
-            # Get user ID and request data to create a unique key
             user_id = get_jwt_identity()
-            request_data = request.get_json() or {}
-            
-            # Create a unique key based on user, endpoint, and data
-            cache_key = f"{user_id}_{request.endpoint}_{hash(str(sorted(request_data.items())))}"
-            
-            # Check if this exact submission was made recently (within 5 seconds)
-            current_time = datetime.utcnow()
-            if cache_key in submission_cache:
-                last_submission = submission_cache[cache_key]
-                if current_time - last_submission < timedelta(seconds=5):
-                    return jsonify({'error': 'Duplicate submission detected. Please wait before submitting again.'}), 429
-            
-            # Record this submission
-            submission_cache[cache_key] = current_time
-            
-            # Clean up old entries (simple cleanup)
-            if len(submission_cache) > 1000:
-                # Remove entries older than 1 minute
-                cutoff_time = current_time - timedelta(minutes=1)
-                submission_cache = {k: v for k, v in submission_cache.items() if v > cutoff_time}
-            
-            return f(*args, **kwargs)
-            
+        except Exception:
+            user_id = None
+        # Hash the raw body; cheaper than parsing and sorting the JSON
+        fingerprint = hashlib.sha256(request.get_data(cache=True) or b'').hexdigest()
+        store_key = f"key:{user_id}:{request.endpoint}:{client_key}"
+        ttl = IDEMPOTENCY_TTL_SECONDS
+
+        try:
+            reserved, record = idempotency_store.reserve(store_key, fingerprint, ttl)
         except Exception as e:
-            # If there's an error in duplicate detection, allow the request to proceed
+            # The store is an optimization; never block writes because it is down
+            logger.warning(f"Idempotency store unavailable, processing request: {e}")
             return f(*args, **kwargs)
-    
+
+        if not reserved:
+            if record and record.get('fingerprint') != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used with a different request body'}), 422
+            if not record or record.get('state') != STATE_DONE:
+                return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+            replay = Response(record.get('body') or b'', status=record['status'], mimetype=record.get('mimetype'))
+            for name, value in record.get('headers') or []:
+                replay.headers.add(name, value)
+            replay.headers['Idempotent-Replayed'] = 'true'
+            return replay
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            _release(store_key)
+            raise
+
+        if response.status_code >= 500 or response.direct_passthrough or response.is_streamed:
+            # Server errors stay retryable; streamed bodies are not stored
+            _release(store_key)
+            return response
+
+        body = response.get_data()
+        if len(body) > IDEMPOTENCY_MAX_BODY_BYTES:
+            _release(store_key)
+            return response
+        try:
+            idempotency_store.complete(store_key, {
+                'state': STATE_DONE,
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'mimetype': response.mimetype,
+                'headers': [[name, value] for name, value in response.headers.items()
+                            if name.lower() not in _NOT_REPLAYED_HEADERS],
+                'body': body,
+            }, ttl)
+        except Exception as e:
+            logger.warning(f"Failed to store idempotent response: {e}")
+        return response
+
     return decorated_function
 
+
+# Recomputed for the replay (Content-Type/Length) or bound to the original exchange (cookies)
+_NOT_REPLAYED_HEADERS = {'content-type', 'content-length', 'set-cookie'}
+
+
+def _release(store_key):
+    try:
+        idempotency_store.release(store_key)
+    except Exception as e:
+        logger.warning(f"Failed to release idempotency key: {e}")
+
 def validate_cross_field_logic(f):
     """
     Decorator for cross-field validation
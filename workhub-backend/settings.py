@@ -3,11 +3,13 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, SystemSettings, User
 from auth import admin_required, get_current_user
 from permissions import Permission
+from collection_versions import conditional_get
 
 settings_bp = Blueprint('settings', __name__)
 
 @settings_bp.route('/system', methods=['GET'])
 @jwt_required()
+@conditional_get('system_settings', 'users')
 def get_system_settings():
     """
     View system settings - requires SETTINGS_VIEW permission
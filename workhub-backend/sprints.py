@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required
 from models import db, Sprint
 from auth import get_current_user
 from permissions import Permission
+from session_middleware import prevent_duplicate_submission
 from validators import validator, ValidationError
 
 
@@ -31,6 +32,7 @@ def list_sprints():
 
 @sprints_bp.route('/', methods=['POST'])
 @jwt_required()
+@prevent_duplicate_submission
 def create_sprint():
     try:
         current_user = get_current_user()
@@ -26,6 +26,7 @@ fi
 # Run database initialization and migrations (idempotent)
 echo "Running database initialization and schema migrations..."
 python init_db.py || echo "Init DB failed but continuing..."
+python init_cloud_sql.py || echo "Schema migration failed but continuing..."
 
 # Start the Flask application
 echo "Starting Flask application..."
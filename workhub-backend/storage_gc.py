@@ -0,0 +1,298 @@
+"""
+Mark-and-sweep garbage collection for stored attachment files.
+
+Mark:  recount every blob's references (task attachments plus chat and group
+       file messages), correct ref_count and release blobs nothing uses.
+Sweep: walk storage (UPLOAD_FOLDER, and the bucket in cloud mode) and delete
+       files that no database row points at.
+
+Both phases work in fixed-size batches, so memory stays flat however large
+the tables or the bucket get. Files younger than the grace period are never
+touched, which keeps uploads that have not committed yet safe. The same pass
+recomputes the storage_usage counters.
+
+Run periodically (cron / Cloud Scheduler, e.g. as a Cloud Run job):
+    python storage_gc.py [--dry-run]
+or as an admin: POST /api/files/gc?dry_run=true starts a run in a background
+thread of the instance that receives it and answers 202 at once (a full pass
+can outlast the request timeout); GET /api/files/gc reports that instance's
+last run. Cloud Run throttles CPU outside requests unless CPU is always
+allocated, so the scheduled job is the dependable route there.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import storage_service as storage_module
+from storage_service import storage_service, PREVIEW_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('STORAGE_GC_BATCH_SIZE', 500))
+GRACE_PERIOD = timedelta(hours=int(os.environ.get('STORAGE_GC_GRACE_HOURS', 24)))
+
+# Staged chunked uploads are cleaned up by upload_sessions
+SKIP_DIRS = {'.incoming'}
+
+
+def _new_report(dry_run):
+    return {
+        'dry_run': dry_run,
+        'blobs_checked': 0,
+        'ref_counts_fixed': 0,
+        'blobs_released': 0,
+        'files_scanned': 0,
+        'orphans_deleted': 0,
+        'bytes_reclaimed': 0,
+        'usage_rows_updated': 0,
+    }
+
+
+# ========== MARK ==========
+
+def _iter_file_messages(model, since=None):
+    """Yield parsed file payloads of chat messages, paging by primary key"""
+    query = model.query.with_entities(model.id, model.content).filter(model.content.like('%"type": "file"%'))
+    if since is not None:
+        query = query.filter(model.created_at >= since)
+    last_id = 0
+    while True:
+        rows = query.filter(model.id > last_id).order_by(model.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return
+        for message_id, content in rows:
+            try:
+                data = json.loads(content)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(data, dict):
+                yield data
+        last_id = rows[-1][0]
+
+
+def _chat_references(since=None):
+    """(Counter of blob_id -> chat references, set of legacy file_key paths)"""
+    from models import ChatMessage, GroupMessage
+    blob_refs = Counter()
+    legacy_keys = set()
+    for model in (ChatMessage, GroupMessage):
+        for data in _iter_file_messages(model, since):
+            if data.get('blob_id'):
+                blob_refs[int(data['blob_id'])] += 1
+            elif data.get('file_key'):
+                legacy_keys.add(data['file_key'])
+    return blob_refs, legacy_keys
+
+
+def mark(report, dry_run=False):
+    """Reconcile blob reference counts with the rows that actually use them"""
+    from models import db, Blob, FileAttachment
+
+    started = datetime.utcnow()
+    chat_refs, legacy_keys = _chat_references()
+    cutoff = started - GRACE_PERIOD
+    columns = (Blob.id, Blob.ref_count, Blob.created_at, Blob.storage_state,
+               Blob.storage_path, Blob.preview_status, Blob.size)
+    last_id = 0
+    while True:
+        blobs = db.session.query(*columns).filter(Blob.id > last_id).order_by(Blob.id).limit(BATCH_SIZE).all()
+        if not blobs:
+            break
+        last_id = blobs[-1].id
+        attachment_refs = dict(db.session.query(FileAttachment.blob_id, db.func.count(FileAttachment.id)).filter(
+            FileAttachment.blob_id.in_([b.id for b in blobs])
+        ).group_by(FileAttachment.blob_id).all())
+        # Messages sent since the chat scan began; counting some twice only delays a release
+        recent_refs, _ = _chat_references(since=started)
+
+        for blob in blobs:
+            report['blobs_checked'] += 1
+            refs = attachment_refs.get(blob.id, 0) + chat_refs[blob.id] + recent_refs[blob.id]
+            if refs == blob.ref_count:
+                continue
+            if refs == 0 and (blob.created_at is None or blob.created_at > cutoff or blob.storage_state == 'uploading'):
+                continue
+            if dry_run:
+                report['blobs_released' if refs == 0 else 'ref_counts_fixed'] += 1
+                continue
+            # Only apply the new count if nobody changed it while we were counting
+            updated = Blob.query.filter(Blob.id == blob.id, Blob.ref_count == blob.ref_count).update(
+                {Blob.ref_count: refs}, synchronize_session=False
+            )
+            if updated and refs == 0:
+                Blob.query.filter(Blob.id == blob.id, Blob.ref_count <= 0).delete(synchronize_session=False)
+                db.session.commit()
+                storage_service._delete_object(blob.storage_path)
+                if blob.preview_status == 'ready':
+                    storage_service._delete_object(blob.storage_path + PREVIEW_SUFFIX)
+                report['blobs_released'] += 1
+                report['bytes_reclaimed'] += blob.size or 0
+                continue
+            if updated:
+                report['ref_counts_fixed'] += 1
+            db.session.commit()
+    return legacy_keys
+
+
+def recount_usage(report, dry_run=False):
+    """Rebuild storage_usage from file_attachments (fixes any drift in the running counters)"""
+    from models import db, FileAttachment, StorageUsage
+
+    totals = {}
+    query = db.session.query(
+        FileAttachment.user_id, db.func.count(FileAttachment.id), db.func.sum(FileAttachment.file_size)
+    ).group_by(FileAttachment.user_id)
+    for user_id, files, size in query.yield_per(BATCH_SIZE):
+        totals[user_id] = (int(files), int(size or 0))
+    totals[None] = (sum(f for f, _ in totals.values()), sum(s for _, s in totals.values()))
+
+    existing = {row.user_id: row for row in StorageUsage.query.all()}
+    for user_id, (files, size) in totals.items():
+        row = existing.pop(user_id, None)
+        if row and (row.file_count, row.total_bytes) == (files, size):
+            continue
+        report['usage_rows_updated'] += 1
+        if dry_run:
+            continue
+        if row:
+            row.file_count, row.total_bytes = files, size
+        else:
+            db.session.add(StorageUsage(user_id=user_id, file_count=files, total_bytes=size))
+    for row in existing.values():
+        report['usage_rows_updated'] += 1
+        if not dry_run:
+            db.session.delete(row)
+    if not dry_run:
+        db.session.commit()
+
+
+# ========== SWEEP ==========
+
+def _iter_local_files(upload_folder):
+    """Yield (path, size, modified) for every stored file under UPLOAD_FOLDER"""
+    for root, dirs, files in os.walk(upload_folder):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+
+def _iter_cloud_files():
+    """Yield (gs:// path, size, modified) for every content-addressed object in the bucket"""
+    bucket_name = storage_module.CLOUD_STORAGE_BUCKET
+    # Only blobs/ is owned exclusively by us; the bucket may hold other data
+    for blob in storage_module.get_storage_client().bucket(bucket_name).list_blobs(prefix='blobs/'):
+        yield f"gs://{bucket_name}/{blob.name}", blob.size or 0, blob.updated
+
+
+def _referenced(paths, legacy_paths):
+    """Subset of paths that a database row points at"""
+    from models import db, Blob, FileAttachment
+    bases = {p[:-len(PREVIEW_SUFFIX)] if p.endswith(PREVIEW_SUFFIX) else p for p in paths}
+    live = set(legacy_paths & bases)
+    live.update(p for (p,) in db.session.query(Blob.storage_path).filter(Blob.storage_path.in_(bases)))
+    live.update(p for (p,) in db.session.query(FileAttachment.file_path).filter(FileAttachment.file_path.in_(bases)))
+    return {p for p in paths if (p[:-len(PREVIEW_SUFFIX)] if p.endswith(PREVIEW_SUFFIX) else p) in live}
+
+
+def _sweep_batch(batch, legacy_paths, report, dry_run):
+    live = _referenced({path for path, _, _ in batch}, legacy_paths)
+    for path, size, _ in batch:
+        if path in live:
+            continue
+        if not dry_run and not storage_service._delete_object(path):
+            continue
+        report['orphans_deleted'] += 1
+        report['bytes_reclaimed'] += size
+
+
+def sweep(report, legacy_keys, dry_run=False):
+    """Delete stored files that no blob, attachment or chat message references"""
+    upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    legacy_paths = {os.path.join(upload_folder, key) for key in legacy_keys}
+    sources = [_iter_local_files(upload_folder)]
+    if storage_service.cloud_enabled():
+        sources.append(_iter_cloud_files())
+
+    cutoff = datetime.now(timezone.utc) - GRACE_PERIOD
+    for source in sources:
+        batch = []
+        for path, size, modified in source:
+            report['files_scanned'] += 1
+            if modified is None or modified > cutoff:
+                continue
+            batch.append((path, size, modified))
+            if len(batch) >= BATCH_SIZE:
+                _sweep_batch(batch, legacy_paths, report, dry_run)
+                batch = []
+        if batch:
+            _sweep_batch(batch, legacy_paths, report, dry_run)
+
+
+def collect_garbage(dry_run=False):
+    """Run mark, usage recount and sweep; returns a report of what was (or would be) reclaimed"""
+    from models import db
+    report = _new_report(dry_run)
+    try:
+        legacy_keys = mark(report, dry_run)
+        recount_usage(report, dry_run)
+        sweep(report, legacy_keys, dry_run)
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Storage GC finished: {report}")
+    return report
+
+
+# ========== BACKGROUND RUNS ==========
+
+_run_lock = threading.Lock()
+_last_run = {'state': 'idle'}
+
+
+def start_background(app, dry_run=False):
+    """Start collect_garbage in a daemon thread; False if this process is already running one"""
+    global _last_run
+    if not _run_lock.acquire(blocking=False):
+        return False
+    _last_run = {'state': 'running', 'dry_run': dry_run, 'started_at': datetime.utcnow().isoformat() + 'Z'}
+
+    def run():
+        global _last_run
+        started_at = _last_run['started_at']
+        try:
+            with app.app_context():
+                report = collect_garbage(dry_run=dry_run)
+            _last_run = {'state': 'finished', 'started_at': started_at,
+                         'finished_at': datetime.utcnow().isoformat() + 'Z', 'report': report}
+        except Exception as e:
+            logger.error(f"Storage GC failed: {e}")
+            _last_run = {'state': 'failed', 'dry_run': dry_run, 'started_at': started_at,
+                         'finished_at': datetime.utcnow().isoformat() + 'Z', 'error': str(e)}
+        finally:
+            _run_lock.release()
+
+    threading.Thread(target=run, name='storage-gc', daemon=True).start()
+    return True
+
+
+def last_run():
+    """State of this process's most recent background run"""
+    return dict(_last_run)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO)
+    with create_app().app_context():
+        print(json.dumps(collect_garbage(dry_run='--dry-run' in sys.argv), indent=2))
@@ -2,12 +2,27 @@
 Cloud Storage Service for GCP Integration
 Handles file uploads to Google Cloud Storage when USE_CLOUD_STORAGE is enabled
 Falls back to local storage otherwise
+
+Attachments are content-addressed: contents are stored once under
+blobs/<sha256[:2]>/<sha256> and tracked in the blobs table with a reference
+count, so identical uploads share one stored object.
 """
 
 import os
+import hashlib
 import logging
-from typing import Optional, BinaryIO
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, BinaryIO, Tuple, Iterable
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from werkzeug.datastructures import FileStorage
+from lazy_init import LazyValue
+from read_routing import RoutingSession
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +31,62 @@ USE_CLOUD_STORAGE = os.environ.get('USE_CLOUD_STORAGE', 'false').lower() == 'tru
 CLOUD_STORAGE_BUCKET = os.environ.get('CLOUD_STORAGE_BUCKET')
 GCP_PROJECT = os.environ.get('GCP_PROJECT')
 
-# Lazy import Google Cloud Storage (only if needed)
-if USE_CLOUD_STORAGE:
+# Rendered previews are stored next to their blob (see preview_service)
+PREVIEW_SUFFIX = '.preview.jpg'
+
+# Signed URLs are reused until this fraction of their lifetime remains
+SIGNED_URL_REFRESH_FRACTION = 0.2
+SIGNED_URL_CACHE_SIZE = int(os.environ.get('SIGNED_URL_CACHE_SIZE', 1024))
+
+# Chunks of resumable uploads (see upload_sessions), under UPLOAD_FOLDER or in the bucket
+STAGING_PREFIX = '.incoming'
+# Session.info key of objects to delete once the transaction commits
+_PENDING_DELETES_KEY = 'storage_pending_deletes'
+
+# Cloud Storage compose accepts at most 32 source objects
+MAX_COMPOSE_SOURCES = 32
+
+# Store uploads locally and push them to the bucket in the background (see upload_pipeline).
+# Only safe when UPLOAD_FOLDER is a volume shared by every instance: until the push
+# finishes, other instances cannot serve the file, and a recycled instance loses it.
+UPLOAD_PUSH_ASYNC = os.environ.get('UPLOAD_PUSH_ASYNC', 'false').lower() == 'true'
+
+def _create_storage_client():
+    """Build the Cloud Storage client (imports google.cloud.storage and loads credentials)"""
+    if not USE_CLOUD_STORAGE:
+        return None
+    if os.environ.get('FAKE_GCS_ROOT'):
+        # Offline development/tests: gs:// objects are files under FAKE_GCS_ROOT
+        from fake_gcs import FakeStorageClient
+        return FakeStorageClient(os.environ['FAKE_GCS_ROOT'])
     try:
         from google.cloud import storage
-        storage_client = storage.Client(project=GCP_PROJECT) if GCP_PROJECT else storage.Client()
+        return storage.Client(project=GCP_PROJECT) if GCP_PROJECT else storage.Client()
     except Exception as e:
         logger.warning(f"Failed to initialize Google Cloud Storage client: {e}")
-        storage_client = None
-else:
-    storage_client = None
+        return None
+
+
+# Created on first use instead of at import, which keeps worker startup fast
+_storage_client = LazyValue('google.cloud.storage client', _create_storage_client)
+
+
+def get_storage_client():
+    """The Cloud Storage client, or None when cloud storage is disabled or unavailable"""
+    return _storage_client.get()
+
+
+# (file_path, expiration_minutes) -> (url, monotonic time after which it is regenerated)
+_signed_urls: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+_signed_url_lock = threading.Lock()
+
+
+def _split_gs_path(file_path: str) -> Optional[Tuple[str, str]]:
+    """Split gs://bucket/name into (bucket, name)"""
+    path_parts = file_path.replace('gs://', '', 1).split('/', 1)
+    if len(path_parts) != 2:
+        return None
+    return path_parts[0], path_parts[1]
 
 
 class StorageService:
@@ -34,7 +95,8 @@ class StorageService:
     @staticmethod
     def save_file(file: FileStorage, filename: str, subfolder: str = 'uploads') -> str:
         """
-        Save a file to storage (local or cloud based on configuration)
+        Save a file to storage (local or cloud based on configuration).
+        In cloud mode upload errors are raised; nothing is written locally.
         
         Args:
             file: The file object to save
@@ -44,7 +106,7 @@ class StorageService:
         Returns:
             The file path or URL where the file was saved
         """
-        if USE_CLOUD_STORAGE and storage_client and CLOUD_STORAGE_BUCKET:
+        if USE_CLOUD_STORAGE and get_storage_client() and CLOUD_STORAGE_BUCKET:
             return StorageService._save_to_cloud(file, filename, subfolder)
         else:
             return StorageService._save_to_local(file, filename, subfolder)
@@ -53,7 +115,7 @@ class StorageService:
     def _save_to_cloud(file: FileStorage, filename: str, subfolder: str) -> str:
         """Save file to Google Cloud Storage"""
         try:
-            bucket = storage_client.bucket(CLOUD_STORAGE_BUCKET)
+            bucket = get_storage_client().bucket(CLOUD_STORAGE_BUCKET)
             blob_name = f"{subfolder}/{filename}"
             blob = bucket.blob(blob_name)
             
@@ -71,10 +133,10 @@ class StorageService:
             return file_path
             
         except Exception as e:
+            # No local fallback: the instance's disk is not shared and does not survive a restart,
+            # so the upload fails and the client retries it
             logger.error(f"Error uploading to Cloud Storage: {e}")
-            # Fallback to local storage
-            logger.warning("Falling back to local storage")
-            return StorageService._save_to_local(file, filename, subfolder)
+            raise
     
     @staticmethod
     def _save_to_local(file: FileStorage, filename: str, subfolder: str) -> str:
@@ -86,23 +148,334 @@ class StorageService:
         os.makedirs(full_path, exist_ok=True)
         
         file_path = os.path.join(full_path, filename)
-        file.save(file_path)
+        # Write to a temp name and rename so readers never see a partial file
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        file.save(tmp_path)
+        os.replace(tmp_path, file_path)
         
         logger.info(f"File saved locally: {file_path}")
         return file_path
     
+    @staticmethod
+    def save_path(source_path: str, filename: str, subfolder: str = 'uploads',
+                  content_type: Optional[str] = None, local_only: bool = False) -> str:
+        """
+        Store a file that is already on local disk (e.g. a finished chunked upload).
+        Locally the file is moved into place (no copy); in cloud mode it is
+        uploaded and the local file is removed. Upload errors are raised, like
+        save_file, and the source file is left in place.
+        
+        Returns:
+            The file path or URL where the file was saved
+        """
+        if not local_only and USE_CLOUD_STORAGE and get_storage_client() and CLOUD_STORAGE_BUCKET:
+            try:
+                bucket = get_storage_client().bucket(CLOUD_STORAGE_BUCKET)
+                blob_name = f"{subfolder}/{filename}"
+                bucket.blob(blob_name).upload_from_filename(source_path, content_type=content_type)
+            except Exception as e:
+                logger.error(f"Error uploading to Cloud Storage: {e}")
+                raise
+            os.remove(source_path)
+            file_path = f"gs://{CLOUD_STORAGE_BUCKET}/{blob_name}"
+            logger.info(f"File uploaded to Cloud Storage: {file_path}")
+            return file_path
+        
+        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
+        full_path = os.path.join(upload_folder, subfolder) if subfolder else upload_folder
+        os.makedirs(full_path, exist_ok=True)
+        file_path = os.path.join(full_path, filename)
+        os.replace(source_path, file_path)
+        logger.info(f"File saved locally: {file_path}")
+        return file_path
+    
+    @staticmethod
+    def cloud_enabled() -> bool:
+        """True when a Cloud Storage bucket is configured and reachable"""
+        return bool(USE_CLOUD_STORAGE and get_storage_client() and CLOUD_STORAGE_BUCKET)
+    
+    @staticmethod
+    def async_push_enabled() -> bool:
+        """New blobs are stored locally first and pushed to the bucket in the background"""
+        return StorageService.cloud_enabled() and UPLOAD_PUSH_ASYNC
+    
+    # ========== CONTENT-ADDRESSED BLOBS ==========
+    
+    @staticmethod
+    def hash_stream(stream: BinaryIO, chunk_size: int = 256 * 1024) -> Tuple[str, int]:
+        """Return (sha256 hex, size) of a seekable stream and rewind it"""
+        hasher = hashlib.sha256()
+        size = 0
+        stream.seek(0)
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            hasher.update(data)
+            size += len(data)
+        stream.seek(0)
+        return hasher.hexdigest(), size
+    
+    @staticmethod
+    def find_blob(sha256: str):
+        """Return the Blob with this content hash, or None"""
+        from models import Blob
+        return Blob.query.filter_by(sha256=sha256).first() if sha256 else None
+    
+    @staticmethod
+    def store_blob_file(file: FileStorage, content_type: Optional[str] = None):
+        """
+        Store an uploaded file by content hash and return its Blob (caller commits).
+        If the content is already stored, only the reference count changes.
+        """
+        sha256, size = StorageService.hash_stream(file.stream)
+        folder = StorageService._blob_folder(sha256)
+        if StorageService.async_push_enabled():
+            # Written locally now; upload_pipeline copies it to the bucket
+            writer = lambda: StorageService._save_to_local(file, sha256, folder)
+        else:
+            writer = lambda: StorageService.save_file(file, sha256, subfolder=folder)
+        return StorageService._store_blob(sha256, size, content_type or file.content_type, writer)
+    
+    @staticmethod
+    def store_blob_path(source_path: str, sha256: str, size: int, content_type: Optional[str] = None):
+        """Store a local file whose hash is already known (e.g. a finished chunked upload)"""
+        blob = StorageService._store_blob(
+            sha256, size, content_type,
+            lambda: StorageService.save_path(source_path, sha256, subfolder=StorageService._blob_folder(sha256),
+                                             content_type=content_type,
+                                             local_only=StorageService.async_push_enabled())
+        )
+        # Duplicate content: the staged copy is not needed
+        if os.path.exists(source_path):
+            os.remove(source_path)
+        return blob
+    
+    @staticmethod
+    def add_blob_reference(blob):
+        """Atomically increment a blob's reference count (caller commits)"""
+        from models import db, Blob
+        Blob.query.filter_by(id=blob.id).update({Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False)
+        db.session.expire(blob, ['ref_count'])
+        return blob
+    
+    @staticmethod
+    def release_blob(blob) -> bool:
+        """
+        Drop one reference to a blob; the row is removed when the last reference
+        goes away, and the stored object once that is committed (caller commits).
+        Returns True if deleted.
+        """
+        from models import db, Blob
+        Blob.query.filter_by(id=blob.id).update({Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False)
+        deleted = Blob.query.filter(Blob.id == blob.id, Blob.ref_count <= 0).delete(synchronize_session=False)
+        if not deleted:
+            db.session.expire(blob, ['ref_count'])
+            return False
+        db.session.expunge(blob)
+        StorageService.delete_after_commit(blob.storage_path)
+        if blob.preview_status == 'ready':
+            StorageService.delete_after_commit(blob.storage_path + PREVIEW_SUFFIX)
+        return True
+    
+    @staticmethod
+    def _blob_folder(sha256: str) -> str:
+        return f"blobs/{sha256[:2]}"
+    
+    @staticmethod
+    def _store_blob(sha256: str, size: int, content_type: Optional[str], writer):
+        from models import db, Blob
+        blob = Blob.query.filter_by(sha256=sha256).first()
+        if blob:
+            logger.info(f"Deduplicated upload: blob {sha256[:12]} already stored")
+            return StorageService.add_blob_reference(blob)
+        
+        storage_path = writer()
+        blob = Blob(sha256=sha256, size=size, content_type=content_type, storage_path=storage_path, ref_count=1,
+                    storage_state='remote' if storage_path.startswith('gs://') else 'local')
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Another request stored the same content concurrently; share its row
+            blob = Blob.query.filter_by(sha256=sha256).first()
+            return StorageService.add_blob_reference(blob)
+        return blob
+    
+    # ========== UPLOAD STAGING ==========
+
+    @staticmethod
+    def _staging_folder(upload_id: str) -> str:
+        return f"{STAGING_PREFIX}/{upload_id}"
+
+    @staticmethod
+    def staging_path(upload_id: str) -> str:
+        """The local file chunks of an upload are written into (without cloud storage)"""
+        folder = os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), StorageService._staging_folder(upload_id))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, 'data')
+
+    @staticmethod
+    def stage_part(stream: BinaryIO, upload_id: str, name: str) -> str:
+        """
+        Upload one chunk of an in-progress upload to the bucket as its own object,
+        straight from the stream. Unlike save_path there is no fallback to local
+        disk; errors are raised. Returns the part's gs:// path.
+        """
+        blob_name = f"{StorageService._staging_folder(upload_id)}/{name}"
+        get_storage_client().bucket(CLOUD_STORAGE_BUCKET).blob(blob_name).upload_from_file(
+            stream, content_type='application/octet-stream'
+        )
+        return f"gs://{CLOUD_STORAGE_BUCKET}/{blob_name}"
+
+    @staticmethod
+    def delete_part(part: str):
+        """Remove one staged part (e.g. a chunk that was refused after it was uploaded)"""
+        StorageService._delete_object(part)
+
+    @staticmethod
+    def compose_parts(parts: Iterable[str], subfolder: str, filename: str,
+                      content_type: Optional[str] = None) -> str:
+        """
+        Concatenate staged gs:// parts into one object in the bucket without
+        moving the bytes through this instance. Cloud Storage composes at most
+        MAX_COMPOSE_SOURCES objects at a time, so longer lists are composed in
+        rounds through intermediate objects. Returns the new object's gs:// path.
+        """
+        bucket = get_storage_client().bucket(CLOUD_STORAGE_BUCKET)
+        sources = [bucket.blob(_split_gs_path(part)[1]) for part in parts]
+        blob_name = f"{subfolder}/{filename}"
+        intermediates = []
+        try:
+            while len(sources) > MAX_COMPOSE_SOURCES:
+                merged = []
+                for i in range(0, len(sources), MAX_COMPOSE_SOURCES):
+                    group = sources[i:i + MAX_COMPOSE_SOURCES]
+                    if len(group) == 1:
+                        merged.append(group[0])
+                        continue
+                    intermediate = bucket.blob(f"{blob_name}.compose-{uuid.uuid4().hex[:8]}")
+                    intermediate.compose(group)
+                    intermediates.append(intermediate)
+                    merged.append(intermediate)
+                sources = merged
+            target = bucket.blob(blob_name)
+            if content_type:
+                target.content_type = content_type
+            target.compose(sources)
+        finally:
+            for intermediate in intermediates:
+                try:
+                    intermediate.delete()
+                except Exception as e:
+                    logger.warning(f"Failed to remove intermediate object {intermediate.name}: {e}")
+        return f"gs://{CLOUD_STORAGE_BUCKET}/{blob_name}"
+
+    @staticmethod
+    def compose_staged(upload_id: str, parts: Iterable[str]) -> str:
+        """Compose an upload's parts into one staged object (removed with the rest by delete_staged)"""
+        return StorageService.compose_parts(parts, StorageService._staging_folder(upload_id), 'assembled')
+
+    @staticmethod
+    def store_blob_parts(parts: Iterable[str], sha256: str, size: int, content_type: Optional[str] = None):
+        """Store staged gs:// parts whose hash is already known by composing them (caller commits)"""
+        folder = StorageService._blob_folder(sha256)
+        return StorageService._store_blob(
+            sha256, size, content_type,
+            lambda: StorageService.compose_parts(parts, folder, sha256, content_type=content_type)
+        )
+
+    @staticmethod
+    def open_read(file_path: str):
+        """Open a stored file (local path or gs:// URL) for streaming reads"""
+        if file_path.startswith('gs://'):
+            bucket_name, blob_name = _split_gs_path(file_path)
+            return get_storage_client().bucket(bucket_name).blob(blob_name).open('rb')
+        return open(file_path, 'rb')
+
+    @staticmethod
+    def delete_staged(upload_id: str):
+        """Remove everything staged for an upload: its local file and its parts in the bucket"""
+        folder = StorageService._staging_folder(upload_id)
+        if StorageService.cloud_enabled():
+            try:
+                for blob in get_storage_client().bucket(CLOUD_STORAGE_BUCKET).list_blobs(prefix=f"{folder}/"):
+                    blob.delete()
+            except Exception as e:
+                logger.warning(f"Failed to remove staged parts of upload {upload_id}: {e}")
+        local_folder = os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), folder)
+        shutil.rmtree(local_folder, ignore_errors=True)
+
+    # ========== USAGE ACCOUNTING ==========
+    
+    @staticmethod
+    def adjust_usage(user_id: Optional[int], files: int, size: int):
+        """
+        Apply an attachment count/byte delta to the uploader's counters and the
+        all-users total (caller commits). Negative deltas record deletions.
+        """
+        from models import db, StorageUsage
+        if not files and not size:
+            return
+        for owner in (user_id, None):
+            condition = StorageUsage.user_id.is_(None) if owner is None else StorageUsage.user_id == owner
+            values = {
+                StorageUsage.file_count: StorageUsage.file_count + files,
+                StorageUsage.total_bytes: StorageUsage.total_bytes + size,
+                StorageUsage.updated_at: datetime.utcnow()
+            }
+            if StorageUsage.query.filter(condition).update(values, synchronize_session=False):
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(StorageUsage(user_id=owner, file_count=files, total_bytes=size))
+            except IntegrityError:
+                # Created concurrently by another request
+                StorageUsage.query.filter(condition).update(values, synchronize_session=False)
+    
+    @staticmethod
+    def get_usage(user_id: Optional[int] = None) -> Tuple[int, int]:
+        """(file_count, total_bytes) for one uploader, or for everyone when user_id is None"""
+        from models import StorageUsage
+        condition = StorageUsage.user_id.is_(None) if user_id is None else StorageUsage.user_id == user_id
+        row = StorageUsage.query.filter(condition).first()
+        return (row.file_count, row.total_bytes) if row else (0, 0)
+    
     @staticmethod
     def delete_file(file_path: str) -> bool:
         """
         Delete a file from storage
         
+        Content-addressed files are reference counted: this drops one reference
+        and the stored object is removed only when no attachment uses it. The
+        object is deleted after the caller commits, so a failed commit leaves
+        the rows pointing at a file that still exists.
+        
         Args:
             file_path: The path to the file (local path or gs:// URL)
             
         Returns:
-            True if deleted successfully, False otherwise
+            True if deleted successfully (or a reference was released), False otherwise
         """
+        from models import Blob
+        blob = Blob.query.filter_by(storage_path=file_path).first()
+        if blob:
+            StorageService.release_blob(blob)
+            return True
+        StorageService.delete_after_commit(file_path)
+        return True
+    
+    @staticmethod
+    def delete_after_commit(file_path: str):
+        """Delete a stored object once the current transaction commits (nothing happens on rollback)"""
+        from models import db
+        db.session.info.setdefault(_PENDING_DELETES_KEY, []).append(file_path)
+    
+    @staticmethod
+    def _delete_object(file_path: str) -> bool:
+        """Delete the stored object itself, ignoring reference counts"""
         if file_path.startswith('gs://'):
+            StorageService.invalidate_signed_urls(file_path)
             return StorageService._delete_from_cloud(file_path)
         else:
             return StorageService._delete_from_local(file_path)
@@ -118,7 +491,7 @@ class StorageService:
                 return False
             
             bucket_name, blob_name = path_parts
-            bucket = storage_client.bucket(bucket_name)
+            bucket = get_storage_client().bucket(bucket_name)
             blob = bucket.blob(blob_name)
             blob.delete()
             
@@ -144,6 +517,20 @@ class StorageService:
             logger.error(f"Error deleting local file: {e}")
             return False
     
+    @staticmethod
+    def download_to_path(file_path: str, dest_path: str) -> bool:
+        """Copy a stored file (local path or gs:// URL) to a local path"""
+        try:
+            if file_path.startswith('gs://'):
+                bucket_name, blob_name = file_path.replace('gs://', '').split('/', 1)
+                get_storage_client().bucket(bucket_name).blob(blob_name).download_to_filename(dest_path)
+            else:
+                shutil.copyfile(file_path, dest_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error downloading {file_path}: {e}")
+            return False
+    
     @staticmethod
     def file_exists(file_path: str) -> bool:
         """Check if a file exists in storage"""
@@ -156,12 +543,12 @@ class StorageService:
     def _cloud_file_exists(file_path: str) -> bool:
         """Check if file exists in Cloud Storage"""
         try:
-            path_parts = file_path.replace('gs://', '').split('/', 1)
-            if len(path_parts) != 2:
+            parts = _split_gs_path(file_path)
+            if not parts:
                 return False
             
-            bucket_name, blob_name = path_parts
-            bucket = storage_client.bucket(bucket_name)
+            bucket_name, blob_name = parts
+            bucket = get_storage_client().bucket(bucket_name)
             blob = bucket.blob(blob_name)
             return blob.exists()
             
@@ -174,6 +561,10 @@ class StorageService:
         """
         Generate a signed URL for temporary access to a cloud storage file
         
+        URLs are cached per process and reused until only
+        SIGNED_URL_REFRESH_FRACTION of their lifetime is left, so repeated
+        downloads of the same file skip the signing call.
+        
         Args:
             file_path: The gs:// path to the file
             expiration_minutes: How long the URL should be valid
@@ -181,18 +572,26 @@ class StorageService:
         Returns:
             A signed URL, or None if not using cloud storage or error occurs
         """
-        if not file_path.startswith('gs://') or not storage_client:
+        if not file_path.startswith('gs://') or not get_storage_client():
             return None
         
+        key = (file_path, expiration_minutes)
+        now = time.monotonic()
+        with _signed_url_lock:
+            cached = _signed_urls.get(key)
+            if cached and cached[1] > now:
+                _signed_urls.move_to_end(key)
+                return cached[0]
+        
         try:
             from datetime import timedelta
             
-            path_parts = file_path.replace('gs://', '').split('/', 1)
-            if len(path_parts) != 2:
+            parts = _split_gs_path(file_path)
+            if not parts:
                 return None
             
-            bucket_name, blob_name = path_parts
-            bucket = storage_client.bucket(bucket_name)
+            bucket_name, blob_name = parts
+            bucket = get_storage_client().bucket(bucket_name)
             blob = bucket.blob(blob_name)
             
             # Generate signed URL
@@ -201,11 +600,43 @@ class StorageService:
                 method='GET'
             )
             
-            return url
-            
         except Exception as e:
             logger.error(f"Error generating signed URL: {e}")
             return None
+        
+        lifetime = expiration_minutes * 60
+        with _signed_url_lock:
+            _signed_urls[key] = (url, now + lifetime * (1 - SIGNED_URL_REFRESH_FRACTION))
+            _signed_urls.move_to_end(key)
+            while len(_signed_urls) > SIGNED_URL_CACHE_SIZE:
+                _signed_urls.popitem(last=False)
+        return url
+    
+    @staticmethod
+    def invalidate_signed_urls(file_path: str):
+        """Forget cached signed URLs for a file (e.g. after it is deleted)"""
+        with _signed_url_lock:
+            for key in [k for k in _signed_urls if k[0] == file_path]:
+                del _signed_urls[key]
+
+
+# ========== DEFERRED DELETES ==========
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _delete_committed(session):
+    # Objects of rows whose deletion is now committed; storage_gc reclaims any that fail here
+    for file_path in session.info.pop(_PENDING_DELETES_KEY, []):
+        try:
+            StorageService._delete_object(file_path)
+        except Exception as e:
+            logger.error(f"Error deleting {file_path} from storage: {e}")
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _keep_rolled_back(session, previous_transaction):
+    # The rows still point at these objects; a rolled-back savepoint leaves the outer transaction's deletes
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_DELETES_KEY, None)
 
 
 # Export singleton instance
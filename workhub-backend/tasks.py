@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timezone
+import logging
 
 from models import db, Task, User, Notification, Comment, TimeLog, FileAttachment, ProjectMember
 from notifications import create_notification_with_email as notify_with_email
@@ -12,6 +13,14 @@ from auth import admin_required, get_current_user
 from permissions import Permission
 from validators import validator, ValidationError  # <-- relaxed, exception-based
 from security_middleware import rate_limit
+from read_routing import read_replica
+from collection_versions import conditional_get
+from json_provider import json_array
+from session_middleware import prevent_duplicate_submission
+from file_uploads import delete_attachments
+from request_cache import get_user, get_project_ids, is_project_member as _is_project_member
+
+logger = logging.getLogger(__name__)
 
 tasks_bp = Blueprint('tasks', __name__)  # app.py registers with url_prefix (e.g., "/api/tasks")
 
@@ -24,7 +33,7 @@ def _get_current_user():
         uid_int = int(uid) if uid is not None else None
     except (TypeError, ValueError):
         return None
-    return User.query.get(uid_int) if uid_int is not None else None
+    return get_user(uid_int) if uid_int is not None else None
 
 
 def create_notification(user_id, title, message, notification_type, task_id=None):
@@ -125,6 +134,8 @@ def _ensure_comment_parent_column():
 @tasks_bp.route('/', methods=['GET'])
 @rate_limit(max_requests=120, time_window=60)
 @jwt_required()
+@read_replica
+@conditional_get('tasks', 'users', 'projects', 'sprints', 'project_members')
 def get_tasks():
     try:
         _ensure_task_project_sprint_columns()
@@ -147,7 +158,7 @@ def get_tasks():
             query = Task.query
         elif role in ('manager', 'team_lead'):
             # Limit to tasks from projects the user is a member of; also include tasks assigned to them lacking project
-            member_project_ids = [m.project_id for m in ProjectMember.query.filter_by(user_id=current_user.id).all()]
+            member_project_ids = list(get_project_ids(current_user.id))
             if member_project_ids:
                 query = Task.query.filter(
                     or_(Task.project_id.in_(member_project_ids), Task.assigned_to == current_user.id)
@@ -214,13 +225,11 @@ def get_tasks():
             return jsonify({'items': items, 'meta': meta}), 200
         else:
             tasks = query.all()
-            return jsonify([t.to_dict() for t in tasks]), 200
+            # Long lists are streamed while they serialize
+            return json_array(tasks, Task.to_dict), 200
     except Exception as e:
         # Log and include details for diagnosis
-        try:
-            print(f"/api/tasks GET error: {e}")
-        except Exception:
-            pass
+        logger.exception(f"/api/tasks GET error: {e}")
         return jsonify({'error': 'Failed to fetch tasks', 'details': str(e)}), 500
 
 
@@ -253,9 +262,7 @@ def get_task(task_id):
         try:
             d = task.to_dict(include_subtasks=True)
         except Exception as e:
-            print(f"Error in task.to_dict(): {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error in task.to_dict(): {e}")
             # Build basic dict manually if to_dict fails
             d = {
                 'id': task.id,
@@ -278,9 +285,7 @@ def get_task(task_id):
             else:
                 d['comments'] = []
         except Exception as e:
-            print(f"Error getting comments: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error getting comments: {e}")
             d['comments'] = []
         try:
             if hasattr(task, 'time_logs'):
@@ -289,15 +294,11 @@ def get_task(task_id):
             else:
                 d['time_logs'] = []
         except Exception as e:
-            print(f"Error getting time_logs: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error getting time_logs: {e}")
             d['time_logs'] = []
         return jsonify(d), 200
     except Exception as e:
-        import traceback
-        print(f"/api/tasks/{task_id} GET error: {e}")
-        traceback.print_exc()
+        logger.exception(f"/api/tasks/{task_id} GET error: {e}")
         return jsonify({'error': 'Failed to fetch task', 'details': str(e)}), 500
 
 
@@ -305,6 +306,7 @@ def get_task(task_id):
 
 @tasks_bp.route('/', methods=['POST'])
 @jwt_required()
+@prevent_duplicate_submission
 def create_task():
     try:
         _ensure_task_project_sprint_columns()
@@ -330,11 +332,11 @@ def create_task():
             if not data.get('project_id'):
                 return jsonify({'error': 'Managers and Team Leads must specify project_id when creating tasks'}), 400
             # current user must be member of the project
-            if not ProjectMember.query.filter_by(project_id=data['project_id'], user_id=current_user.id).first():
+            if not _is_project_member(data['project_id'], current_user.id):
                 return jsonify({'error': 'You may only create tasks within your projects'}), 403
             # if assigning, the assignee must also be a member of the same project
             if data.get('assigned_to'):
-                if not ProjectMember.query.filter_by(project_id=data['project_id'], user_id=data['assigned_to']).first():
+                if not _is_project_member(data['project_id'], data['assigned_to']):
                     return jsonify({'error': 'Assignee must be a member of the same project'}), 400
 
         task = Task(
@@ -396,9 +398,7 @@ def update_task(task_id):
         actor_role = (current_user.role or 'viewer').lower()
         is_project_member = False
         if actor_role in ('manager', 'team_lead') and task.project_id:
-            is_project_member = ProjectMember.query.filter_by(
-                project_id=task.project_id, user_id=current_user.id
-            ).first() is not None
+            is_project_member = _is_project_member(task.project_id, current_user.id)
         
         if not (has_update_permission or is_assignee or is_project_member):
             return jsonify({'error': 'Access denied'}), 403
@@ -429,9 +429,7 @@ def update_task(task_id):
                     current_task_project = task.project_id
                     can_manage_current_task = False
                     if current_task_project:
-                        can_manage_current_task = ProjectMember.query.filter_by(
-                            project_id=current_task_project, user_id=current_user.id
-                        ).first() is not None
+                        can_manage_current_task = _is_project_member(current_task_project, current_user.id)
                     else:
                         # If task has no project, managers/team leads can't manage it (must have project)
                         return jsonify({'error': 'Tasks must belong to a project you are assigned to'}), 403
@@ -441,7 +439,7 @@ def update_task(task_id):
                     if 'project_id' in payload:
                         if not proj_id:
                             return jsonify({'error': 'project_id is required for managers and team leads'}), 400
-                        if not ProjectMember.query.filter_by(project_id=proj_id, user_id=current_user.id).first():
+                        if not _is_project_member(proj_id, current_user.id):
                             return jsonify({'error': 'You may only move tasks to projects you are assigned to'}), 403
                     elif not can_manage_current_task:
                         return jsonify({'error': 'You may only update tasks within your assigned projects'}), 403
@@ -451,7 +449,7 @@ def update_task(task_id):
                     if 'assigned_to' in payload and v.get('assigned_to'):
                         if not target_project_id:
                             return jsonify({'error': 'project_id is required to change assignment'}), 400
-                        if not ProjectMember.query.filter_by(project_id=target_project_id, user_id=v['assigned_to']).first():
+                        if not _is_project_member(target_project_id, v['assigned_to']):
                             return jsonify({'error': 'Assignee must be a member of the same project'}), 400
                 if 'title' in payload:
                     task.title = v['title']
@@ -583,9 +581,7 @@ def delete_task(task_id):
         actor_role = (current_user.role or 'viewer').lower()
         is_project_member = False
         if actor_role in ('manager', 'team_lead') and task.project_id:
-            is_project_member = ProjectMember.query.filter_by(
-                project_id=task.project_id, user_id=current_user.id
-            ).first() is not None
+            is_project_member = _is_project_member(task.project_id, current_user.id)
         
         if not (can_delete_any or (current_user.has_permission(Permission.TASKS_DELETE) and (is_creator or is_project_member))):
             return jsonify({'error': 'Access denied'}), 403
@@ -600,7 +596,7 @@ def delete_task(task_id):
         # Remove dependent records with NOT NULL FKs
         TimeLog.query.filter_by(task_id=task_id).delete(synchronize_session=False)
         Comment.query.filter_by(task_id=task_id).delete(synchronize_session=False)
-        FileAttachment.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+        delete_attachments(FileAttachment.query.filter_by(task_id=task_id))
         db.session.flush()
 
         db.session.delete(task)
@@ -620,6 +616,7 @@ def delete_task(task_id):
 
 @tasks_bp.route('/<int:task_id>/comments', methods=['POST'])
 @jwt_required()
+@prevent_duplicate_submission
 def add_comment(task_id):
     try:
         _ensure_comment_parent_column()
@@ -813,9 +810,7 @@ def get_calendar_tasks():
                 if end_date.tzinfo:
                     end_date = end_date.astimezone(timezone.utc).replace(tzinfo=None)
             except Exception as e:
-                import traceback
-                print(f"Date parsing error: {e}")
-                traceback.print_exc()
+                logger.info(f"Date parsing error: {e}")
                 return jsonify({'error': f'Invalid date format. Use ISO 8601 format. Error: {str(e)}'}), 400
 
         # Base scope by role (same logic as get_tasks)
@@ -823,7 +818,7 @@ def get_calendar_tasks():
         if role in ('super_admin', 'admin'):
             query = Task.query
         elif role in ('manager', 'team_lead'):
-            member_project_ids = [m.project_id for m in ProjectMember.query.filter_by(user_id=current_user.id).all()]
+            member_project_ids = list(get_project_ids(current_user.id))
             if member_project_ids:
                 query = Task.query.filter(
                     or_(Task.project_id.in_(member_project_ids), Task.assigned_to == current_user.id)
@@ -897,9 +892,7 @@ def update_task_due_date(task_id):
             can_update = True
         elif role in ('manager', 'team_lead'):
             if task.project_id:
-                can_update = ProjectMember.query.filter_by(
-                    project_id=task.project_id, user_id=current_user.id
-                ).first() is not None
+                can_update = _is_project_member(task.project_id, current_user.id)
             can_update = can_update or task.assigned_to == current_user.id
         else:
             can_update = task.assigned_to == current_user.id
@@ -1139,6 +1132,7 @@ def bulk_delete():
         db.session.flush()
         TimeLog.query.filter(TimeLog.task_id.in_(task_ids)).delete(synchronize_session=False)
         Comment.query.filter(Comment.task_id.in_(task_ids)).delete(synchronize_session=False)
+        delete_attachments(FileAttachment.query.filter(FileAttachment.task_id.in_(task_ids)))
         db.session.flush()
         for task in tasks:
             db.session.delete(task)
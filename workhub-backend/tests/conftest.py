@@ -0,0 +1,50 @@
+"""
+Shared fixtures for tests that need a Flask app with a database and logged-in users
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from models import db, User
+
+
+def _add_users(session):
+    """User 1 is an admin, user 2 a developer"""
+    session.add_all([
+        User(id=1, email='admin@example.com', password_hash='x', name='Admin', role='admin'),
+        User(id=2, email='dev@example.com', password_hash='x', name='Dev', role='developer'),
+    ])
+
+
+@pytest.fixture
+def add_users():
+    return _add_users
+
+
+@pytest.fixture
+def make_app():
+    """
+    Factory for a Flask app with SQLAlchemy and JWT set up, the tables created and
+    the two users added. app.auth maps each user id to its Authorization header.
+    Extra keyword arguments are set on app.config; seed(session) adds further rows.
+    """
+    def _make(database_uri='sqlite://', seed=None, **config):
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=database_uri, JWT_SECRET_KEY='test-secret', **config)
+        db.init_app(app)
+        JWTManager(app)
+        with app.app_context():
+            db.create_all()
+            _add_users(db.session)
+            if seed:
+                seed(db.session)
+            db.session.commit()
+            app.auth = {uid: {'Authorization': f'Bearer {create_access_token(identity=str(uid))}'} for uid in (1, 2)}
+        return app
+    return _make
@@ -0,0 +1,108 @@
+"""
+Tests for collection versions and conditional GETs on list endpoints
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from models import db, Project, Notification
+import collection_versions
+from collection_versions import MemoryVersionStore, SQLiteVersionStore
+from notifications import notifications_bp
+from projects import projects_bp
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, make_app):
+    monkeypatch.setattr(collection_versions, 'version_store', MemoryVersionStore())
+    app = make_app(f"sqlite:///{tmp_path / 'app.db'}", seed=lambda session: session.add_all([
+        Project(id=1, name='Platform', owner_id=1),
+        Notification(user_id=1, title='Assigned', message='Task 1'),
+    ]))
+    app.register_blueprint(projects_bp, url_prefix='/api/projects')
+    app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+    return app
+
+
+def _revalidate(client, url, headers):
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200 and first.headers['ETag'].startswith('W/')
+    return first, client.get(url, headers={**headers, 'If-None-Match': first.headers['ETag']})
+
+
+def test_unchanged_list_is_answered_with_304(app):
+    client = app.test_client()
+    first, second = _revalidate(client, '/api/projects/', app.auth[1])
+    assert second.status_code == 304 and second.data == b''
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert 'no-cache' in second.headers['Cache-Control'] and 'private' in second.headers['Cache-Control']
+
+    # Query arguments are part of the representation
+    other = client.get('/api/projects/?search=Plat', headers={**app.auth[1], 'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+
+
+def test_committed_writes_change_the_etag(app):
+    client = app.test_client()
+    first, _ = _revalidate(client, '/api/projects/', app.auth[1])
+    with app.app_context():
+        db.session.get(Project, 1).name = 'Platform Core'
+        db.session.commit()
+    response = client.get('/api/projects/', headers={**app.auth[1], 'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200 and response.get_json()[0]['name'] == 'Platform Core'
+
+    # Rolled-back writes are never committed, so nothing changes yet
+    second = response.headers['ETag']
+    with app.app_context():
+        db.session.add(Project(name='Draft', owner_id=1))
+        db.session.flush()
+        db.session.rollback()
+    assert client.get('/api/projects/', headers={**app.auth[1], 'If-None-Match': second}).status_code == 304
+
+
+def test_notifications_are_versioned_per_user(app):
+    client = app.test_client()
+    first, _ = _revalidate(client, '/api/notifications/', app.auth[1])
+
+    with app.app_context():
+        db.session.add(Notification(user_id=2, title='Assigned', message='Task 2'))
+        db.session.commit()
+    headers = {**app.auth[1], 'If-None-Match': first.headers['ETag']}
+    assert client.get('/api/notifications/', headers=headers).status_code == 304
+
+    # Bulk updates skip the flush and bump the whole table
+    assert client.put('/api/notifications/mark-all-read', headers=app.auth[1]).status_code == 200
+    response = client.get('/api/notifications/', headers=headers)
+    assert response.status_code == 200 and response.get_json()[0]['is_read'] is True
+
+
+def test_without_a_store_responses_have_no_etag(app, monkeypatch):
+    monkeypatch.setattr(collection_versions, 'version_store', None)
+    response = app.test_client().get('/api/projects/', headers=app.auth[1])
+    assert response.status_code == 200 and 'ETag' not in response.headers
+
+
+def test_sqlite_store_is_shared_and_monotonic(tmp_path):
+    path = str(tmp_path / 'versions.db')
+    writer, reader = SQLiteVersionStore(path), SQLiteVersionStore(path)
+    assert reader.get(['tasks', 'users']) == [0, 0]
+    writer.bump(['tasks'])
+    first = reader.get(['tasks'])[0]
+    writer.bump(['tasks'])
+    second, users = reader.get(['tasks', 'users'])
+    assert second > first > 0 and users == 0
+
+
+def test_store_defaults_to_off_unless_redis_is_configured(tmp_path, monkeypatch):
+    monkeypatch.delenv('COLLECTION_VERSION_BACKEND', raising=False)
+    monkeypatch.setenv('COLLECTION_VERSION_SQLITE_PATH', str(tmp_path / 'versions.db'))
+    # The Dockerfile's per-instance sqlite rate limiter is not enough across Cloud Run instances
+    monkeypatch.setenv('RATE_LIMIT_BACKEND', 'sqlite')
+    assert collection_versions.get_store_from_env() is None
+
+    monkeypatch.setenv('COLLECTION_VERSION_BACKEND', 'sqlite')
+    assert isinstance(collection_versions.get_store_from_env(), SQLiteVersionStore)
@@ -0,0 +1,106 @@
+"""
+Tests for response compression
+"""
+import sys
+import os
+import gzip
+import json
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask, jsonify, send_file
+
+import compression
+import json_provider
+from json_provider import json_array
+
+ITEMS = [{'id': n, 'title': f'Task {n}', 'status': 'todo', 'assignee_name': 'Alice'} for n in range(200)]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(compression, 'budget', compression.CompressionBudget(200))
+    (tmp_path / 'notes.txt').write_text('meeting notes ' * 500)
+    (tmp_path / 'photo.png').write_bytes(b'\x89PNG' + b'\x00' * 5000)
+
+    app = Flask(__name__)
+    json_provider.init_app(app)
+    compression.init_app(app)
+
+    @app.route('/tasks')
+    def tasks():
+        return jsonify(ITEMS)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return json_array(ITEMS)
+
+    @app.route('/files/<name>')
+    def files(name):
+        return send_file(tmp_path / name, conditional=True)
+
+    return app
+
+
+def _decode(response):
+    if response.headers.get('Content-Encoding') == 'br':
+        import brotli
+        return brotli.decompress(response.data)
+    if response.headers.get('Content-Encoding') == 'gzip':
+        return gzip.decompress(response.data)
+    return response.data
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip, deflate, br', 'br' if compression.brotli else 'gzip'),
+    ('gzip', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiates_accept_encoding(app, accept, expected):
+    response = app.test_client().get('/tasks', headers={'Accept-Encoding': accept})
+    assert response.headers.get('Content-Encoding') == expected
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(_decode(response)) == ITEMS
+
+
+def test_small_bodies_and_compressed_files_are_left_alone(app):
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    assert 'Content-Encoding' not in client.get('/small', headers=headers).headers
+    assert 'Content-Encoding' not in client.get('/files/photo.png', headers=headers).headers
+    # Range requests are served from the identity representation
+    ranged = client.get('/files/notes.txt', headers={**headers, 'Range': 'bytes=0-9'})
+    assert ranged.status_code == 206 and 'Content-Encoding' not in ranged.headers
+
+    text = client.get('/files/notes.txt', headers=headers)
+    assert text.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(text.data).startswith(b'meeting notes')
+    assert text.headers['ETag'].startswith('W/')
+
+
+def test_streamed_lists_are_compressed_incrementally(app, monkeypatch):
+    monkeypatch.setattr(json_provider, 'STREAM_MIN_ITEMS', 10)
+    response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    assert json.loads(gzip.decompress(response.data)) == ITEMS
+
+
+def test_levels_step_down_and_stop_at_the_cpu_budget(app):
+    budget = compression.budget
+    assert budget.level('gzip') == 6
+    assert budget.level('gzip', size=5 * 1024 * 1024) == 1
+    budget.record(0.12)  # 60% of a 200 ms budget
+    assert budget.level('gzip') == 4
+    budget.record(0.1)
+    assert budget.level('gzip') is None
+
+    response = app.test_client().get('/tasks', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,74 @@
+"""
+Tests for Idempotency-Key handling in session_middleware.prevent_duplicate_submission
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask, jsonify
+
+import session_middleware
+from idempotency import MemoryIdempotencyStore, SQLiteIdempotencyStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(session_middleware, 'idempotency_store', MemoryIdempotencyStore())
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/items', methods=['POST'])
+    @session_middleware.prevent_duplicate_submission
+    def create_item():
+        calls.append(1)
+        return jsonify({'id': len(calls)}), 201, {'Location': f'/items/{len(calls)}'}
+
+    test_client = app.test_client()
+    test_client.calls = calls
+    return test_client
+
+
+def test_same_key_replays_stored_response_without_running_handler(client):
+    headers = {'Idempotency-Key': 'abc'}
+    first = client.post('/items', json={'name': 'x'}, headers=headers)
+    second = client.post('/items', json={'name': 'x'}, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.get_json() == first.get_json() == {'id': 1}
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.headers['Location'] == first.headers['Location'] == '/items/1'
+    assert len(client.calls) == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client):
+    client.post('/items', json={'name': 'x'}, headers={'Idempotency-Key': 'abc'})
+    response = client.post('/items', json={'name': 'y'}, headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 422
+    assert len(client.calls) == 1
+
+
+def test_requests_without_key_are_never_deduplicated(client):
+    # Posting the same comment twice in a row is legitimate
+    assert client.post('/items', json={'name': 'x'}).status_code == 201
+    assert client.post('/items', json={'name': 'x'}).status_code == 201
+    assert len(client.calls) == 2
+
+
+def test_memory_store_is_bounded():
+    store = MemoryIdempotencyStore(max_entries=10)
+    for i in range(100):
+        store.reserve(f'k{i}', 'fp', 60)
+    assert len(store._entries) == 10
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'idem.db')
+    a, b = SQLiteIdempotencyStore(path), SQLiteIdempotencyStore(path)
+    assert a.reserve('k', 'fp', 60) == (True, None)
+    a.complete('k', {'state': 'done', 'fingerprint': 'fp', 'status': 201, 'body': b'{}'}, 60)
+    reserved, record = b.reserve('k', 'fp', 60)
+    assert reserved is False
+    assert record['status'] == 201 and record['body'] == b'{}'
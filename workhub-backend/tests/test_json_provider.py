@@ -0,0 +1,91 @@
+"""
+Tests for the orjson JSON provider and streamed list responses
+"""
+import sys
+import os
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask, jsonify, request
+
+import json_provider
+from json_provider import json_array, json_object
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    json_provider.init_app(app)
+
+    @app.route('/native')
+    def native():
+        return jsonify({
+            'naive': datetime(2025, 3, 14, 9, 26, 53),
+            'aware': datetime(2025, 3, 14, 12, 26, 53, tzinfo=timezone.utc),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'point': Point(1, 2),
+            'amount': Decimal('12.50'),
+            'counts': {1: 'one'},
+            'emoji': '👍',
+            'huge': 2 ** 70,
+        })
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return jsonify(request.get_json())
+
+    @app.route('/array')
+    def array():
+        return json_array(list(range(7)), lambda n: None if n == 3 else {'n': n}), 200
+
+    @app.route('/object')
+    def obj():
+        return json_object({'name': 'Platform'}, tasks=(list(range(5)), lambda n: {'n': n}))
+
+    return app
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason='orjson not installed')
+def test_native_types_serialize_like_the_models(app):
+    response = app.test_client().get('/native')
+    assert response.data.decode('utf-8').count('👍') == 1  # UTF-8, not \\u escapes
+    assert response.get_json() == {
+        'naive': '2025-03-14T09:26:53Z',
+        'aware': '2025-03-14T12:26:53Z',
+        'id': '12345678-1234-5678-1234-567812345678',
+        'point': {'x': 1, 'y': 2},
+        'amount': '12.50',
+        'counts': {'1': 'one'},
+        'emoji': '👍',
+        'huge': 2 ** 70,
+    }
+    client = app.test_client()
+    assert client.post('/echo', json={'a': [1, 'b']}).get_json() == {'a': [1, 'b']}
+
+
+@pytest.mark.parametrize('min_items, streamed', [(500, False), (2, True)])
+def test_list_responses_stream_past_the_threshold(app, monkeypatch, min_items, streamed):
+    monkeypatch.setattr(json_provider, 'STREAM_MIN_ITEMS', min_items)
+    monkeypatch.setattr(json_provider, 'STREAM_CHUNK_ITEMS', 2)
+    client = app.test_client()
+
+    response = client.get('/array')
+    assert ('Content-Length' not in response.headers) == streamed
+    assert json.loads(response.data) == [{'n': n} for n in (0, 1, 2, 4, 5, 6)]
+
+    response = client.get('/object')
+    assert ('Content-Length' not in response.headers) == streamed
+    assert json.loads(response.data) == {'name': 'Platform', 'tasks': [{'n': n} for n in range(5)]}
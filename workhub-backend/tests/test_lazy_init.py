@@ -0,0 +1,41 @@
+"""
+Tests for lazy initialization and a DB-free create_app
+"""
+import sys
+import os
+import subprocess
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lazy_init import LazyValue, lazy_import, init_timings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lazy_value_builds_once_and_is_timed():
+    calls = []
+    value = LazyValue('test value', lambda: calls.append(1) or 'ready')
+    assert not value.initialized
+    assert value.get() == 'ready'
+    assert value.get() == 'ready'
+    assert calls == [1]
+    assert 'test value' in init_timings()
+
+
+def test_lazy_import_defers_until_attribute_access():
+    module = lazy_import('json')
+    assert module.dumps({'a': 1}) == '{"a": 1}'
+
+
+def test_create_app_does_no_database_or_heavy_imports():
+    # Unreachable database: any connection attempt during startup would fail or hang
+    env = dict(os.environ, DB_DIALECT='mssql', DB_HOST='127.0.0.1', DB_PORT='1', USE_CLOUD_STORAGE='true')
+    script = (
+        "import sys, app; app.create_app(); "
+        "assert 'pandas' not in sys.modules, 'pandas imported at startup'; "
+        "assert 'google.cloud.storage' not in sys.modules, 'GCS client built at startup'"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
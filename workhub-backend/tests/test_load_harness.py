@@ -0,0 +1,61 @@
+"""
+Tests for the synthetic dataset generator and the load-test report
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'seeds'))
+
+from flask import Flask
+
+from models import db, Task, ChatConversation, ChatMessage, Notification
+from generate_dataset import DatasetGenerator, parse_args
+from load_test import percentile, summarize
+
+
+def _generate(seed):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    args = parse_args(['--scale', '0.05', '--seed', str(seed), '--batch-size', '50'])
+    with app.app_context():
+        db.create_all()
+        counts = DatasetGenerator(args).run('x')
+        db.session.commit()
+        conversations = ChatConversation.query.all()
+        snapshot = {
+            'tasks': [(t.title, t.project_id, t.parent_task_id, t.blocks_task_id) for t in Task.query.order_by(Task.id)],
+            'pairs': {(c.user1_id, c.user2_id) for c in conversations},
+            'messages': ChatMessage.query.count(),
+            'notifications': Notification.query.count(),
+        }
+    return counts, snapshot, len(conversations)
+
+
+def test_generator_is_deterministic_and_consistent():
+    counts, snapshot, conversation_count = _generate(7)
+    assert counts['users'] == 10 and counts['tasks'] == 250
+    assert counts['chat_messages'] > 0 and counts['notifications'] > 0
+    # No duplicate user pairs (uq_chat_users) and dependencies point at earlier tasks of the same project
+    assert len(snapshot['pairs']) == conversation_count
+    projects = {n + 1: project for n, (_, project, _, _) in enumerate(snapshot['tasks'])}
+    for task_id, (_, project, parent, blocks) in enumerate(snapshot['tasks'], start=1):
+        for other in (parent, blocks):
+            assert other is None or (other < task_id and projects[other] == project)
+
+    assert _generate(7)[1] == snapshot
+
+
+def test_report_percentiles():
+    values = sorted(float(v) for v in range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 99) == 99.0
+
+    rows, total = summarize({'GET /a': [1.0, 2.0, 3.0], 'GET /b': [10.0]}, {'GET /b': {'500': 1}}, duration=2)
+    assert [row['endpoint'] for row in rows] == ['GET /a', 'GET /b']
+    assert rows[0]['p50_ms'] == 2.0 and rows[0]['rps'] == 1.5
+    assert total['requests'] == 4 and total['errors'] == {'500': 1} and total['max_ms'] == 10.0
@@ -0,0 +1,42 @@
+"""
+Tests for queued JSON logging and error sampling
+"""
+import sys
+import os
+import json
+import logging
+import queue
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import JsonFormatter, ErrorSampler, RequestQueueHandler
+
+
+def _record(msg, level=logging.ERROR, exc_info=None):
+    return logging.LogRecord('workhub.test', level, __file__, 1, msg, None, exc_info)
+
+
+def test_json_formatter_merges_dict_messages():
+    record = _record({'path': '/api/tasks', 'status': 200}, level=logging.INFO)
+    record.request_id = 'abc'
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['path'] == '/api/tasks' and entry['status'] == 200
+    assert entry['request_id'] == 'abc' and entry['severity'] == 'INFO'
+
+
+def test_repeated_errors_are_sampled():
+    sampler = ErrorSampler(burst=3, sample_every=10)
+    passed = [r for r in (_record(f"Error loading conversation {i}") for i in range(23)) if sampler.filter(r)]
+    # First 3, then every 10th after the burst; ids do not make messages distinct
+    assert len(passed) == 5
+    assert passed[-1].suppressed == 9
+    assert sampler.filter(_record('info', level=logging.INFO))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = RequestQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record('first'))
+    handler.handle(_record('second'))
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
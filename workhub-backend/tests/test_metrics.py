@@ -0,0 +1,75 @@
+"""
+Tests for the Prometheus /metrics endpoint
+"""
+import sys
+import os
+import subprocess
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+
+import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not metrics.enabled, reason='prometheus_client not installed')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+    return app
+
+
+def test_requests_are_counted_by_endpoint(app):
+    client = app.test_client()
+    client.get('/ping')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'workhub_http_requests_total{endpoint="ping",method="GET",status="200"}' in body
+    assert 'workhub_http_request_duration_seconds_bucket{endpoint="ping"' in body
+
+
+def test_metrics_token_required_when_configured(app, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_metrics_refused_in_production_without_a_token(app, monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    monkeypatch.setenv('FLASK_ENV', 'production')
+    assert app.test_client().get('/metrics').status_code == 403
+
+
+def test_entry_points_other_than_gunicorn_create_the_sample_directory(tmp_path):
+    # e.g. the migrate-database job runs 'python init_cloud_sql.py', which imports app
+    multiproc_dir = tmp_path / 'not-created-yet'
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(multiproc_dir))
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND_DIR, env=env, check=True, timeout=120)
+    assert multiproc_dir.is_dir()
+
+
+def test_samples_from_separate_workers_are_aggregated(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    worker = (
+        "import metrics; from flask import Flask; app = Flask('w'); metrics.init_app(app); "
+        "app.add_url_rule('/ping', 'ping', lambda: 'pong'); app.test_client().get('/ping')"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', worker], cwd=BACKEND_DIR, env=env, check=True, timeout=60)
+    scrape = (
+        "import metrics; from flask import Flask; app = Flask('s'); metrics.init_app(app); "
+        "print(app.test_client().get('/metrics').get_data(as_text=True))"
+    )
+    result = subprocess.run([sys.executable, '-c', scrape], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True, timeout=60)
+    assert 'workhub_http_requests_total{endpoint="ping",method="GET",status="200"} 2.0' in result.stdout
@@ -0,0 +1,128 @@
+"""
+Tests for the bcrypt hashing service and the rehash-on-login path
+"""
+import sys
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+from models import db, User
+import password_hashing
+from password_hashing import PasswordHasher, PasswordHashingBusy, get_hash_rounds
+
+FAST_ROUNDS = 4
+
+
+def _hasher(monkeypatch, workers, **env):
+    monkeypatch.setenv('BCRYPT_LOG_ROUNDS', str(FAST_ROUNDS))
+    monkeypatch.setenv('BCRYPT_POOL_WORKERS', str(workers))
+    for key, value in env.items():
+        monkeypatch.setenv(key, str(value))
+    hasher = PasswordHasher()
+    hasher.init_app(Flask(__name__))
+    return hasher
+
+
+def test_hashes_on_the_pool(monkeypatch):
+    hasher = _hasher(monkeypatch, workers=1)
+    try:
+        hashed = hasher.hash('s3cret-pass')
+        assert get_hash_rounds(hashed) == FAST_ROUNDS
+        assert hasher.check(hashed, 's3cret-pass') and not hasher.check(hashed, 'wrong')
+        metrics = hasher.get_metrics()['hash']
+        assert metrics['count'] == 1 and metrics['inline'] == 0
+    finally:
+        hasher.shutdown()
+
+
+def test_falls_back_inline_without_a_pool_or_when_saturated(monkeypatch):
+    hasher = _hasher(monkeypatch, workers=0)
+    assert hasher.check(hasher.hash('pw'), 'pw')
+    assert hasher.get_metrics()['hash']['inline'] == 1
+
+    hasher = _hasher(monkeypatch, workers=1, BCRYPT_POOL_MAX_PENDING=1)
+    hasher._executor = object()  # never used: no pending slot is free
+    hasher._pending.acquire()
+    assert hasher.check(hasher.hash('pw'), 'pw')
+    assert hasher.get_metrics()['check']['inline'] == 1
+    assert hasher.check('not-a-bcrypt-hash', 'pw') is False
+
+
+class _StuckFuture:
+    def result(self, timeout=None):
+        raise FutureTimeoutError()
+
+    def cancel(self):
+        return False
+
+
+class _StuckExecutor:
+    """Pool whose jobs never finish in time"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        return _StuckFuture()
+
+
+def test_pool_timeout_fails_fast_instead_of_hashing_again(monkeypatch):
+    hasher = _hasher(monkeypatch, workers=1)
+    hasher._executor = _StuckExecutor()
+    inline_calls = []
+    monkeypatch.setattr(password_hashing, '_hash_password', lambda *a: inline_calls.append(a))
+    with pytest.raises(PasswordHashingBusy):
+        hasher.hash('pw')
+    assert hasher._executor.submitted == 1 and inline_calls == []
+    # The pending slot is released for the next request
+    assert hasher._pending.acquire(blocking=False)
+
+    app = Flask(__name__)
+    hasher.init_app(app)
+
+    @app.route('/busy')
+    def busy():
+        raise PasswordHashingBusy('hash')
+
+    response = app.test_client().get('/busy')
+    assert response.status_code == 503 and response.headers['Retry-After']
+
+
+def test_needs_rehash_when_the_cost_factor_changed(monkeypatch):
+    hasher = _hasher(monkeypatch, workers=0)
+    hashed = hasher.hash('pw')
+    assert hasher.needs_rehash(hashed) is False
+    hasher.log_rounds = FAST_ROUNDS + 1
+    assert hasher.needs_rehash(hashed) is True
+    assert hasher.needs_rehash('legacy-plaintext') is False
+
+
+def test_login_upgrades_the_stored_hash(monkeypatch):
+    from auth import auth_bp
+
+    hasher = _hasher(monkeypatch, workers=0)
+    monkeypatch.setattr(password_hashing, 'password_hasher', hasher)
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', JWT_SECRET_KEY='test-secret-key-with-enough-bytes!')
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    with app.app_context():
+        db.create_all()
+        user = User(id=1, email='dev@example.com', name='Dev', role='developer', signup_status='approved')
+        user.set_password('Correct-Horse-9')
+        db.session.add(user)
+        db.session.commit()
+
+    hasher.log_rounds = FAST_ROUNDS + 1
+    response = app.test_client().post('/api/auth/login', json={'email': 'dev@example.com', 'password': 'Correct-Horse-9'})
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        assert get_hash_rounds(db.session.get(User, 1).password_hash) == FAST_ROUNDS + 1
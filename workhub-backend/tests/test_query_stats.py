@@ -0,0 +1,60 @@
+"""
+Tests for per-request query counting and N+1 detection
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask, jsonify
+
+from models import db, User
+import query_stats
+from query_stats import normalize_statement, track_queries, NPlusOneError
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', TESTING=True, QUERY_N_PLUS_ONE_THRESHOLD=5)
+    db.init_app(app)
+    query_stats.init_app(app)
+
+    @app.route('/users/one-by-one')
+    def one_by_one():
+        ids = [u.id for u in User.query.with_entities(User.id).all()]
+        return jsonify([db.session.get(User, user_id).email for user_id in ids])
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(email=f'u{i}@example.com', password_hash='x', name=f'U{i}', role='developer')
+                            for i in range(8)])
+        db.session.commit()
+    yield app
+
+
+def test_normalize_collapses_literals_and_in_lists():
+    assert normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?)  AND name = 'x'") == \
+        normalize_statement("SELECT * FROM t\nWHERE id IN (?, ?) AND name = 'yy'") == \
+        "SELECT * FROM t WHERE id IN (?...) AND name = ?"
+
+
+def test_track_queries_counts_statements(app):
+    with app.app_context():
+        db.session.expunge_all()
+        with track_queries() as stats:
+            User.query.filter_by(email='u1@example.com').first()
+            User.query.filter_by(email='u2@example.com').first()
+    assert stats.count == 2
+    assert len(stats.shapes) == 1
+
+
+def test_n_plus_one_logged_or_raised_in_strict_mode(app):
+    client = app.test_client()
+    assert client.get('/users/one-by-one').status_code == 200
+
+    app.config['QUERY_N_PLUS_ONE_STRICT'] = True
+    with pytest.raises(NPlusOneError):
+        client.get('/users/one-by-one')
@@ -0,0 +1,82 @@
+"""
+Tests for the GCRA-based RateLimiter in security_middleware
+"""
+import sys
+import os
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from security_middleware import RateLimiter
+from rate_limit_backends import SQLiteBackend
+
+
+def test_allows_burst_up_to_limit_then_blocks():
+    """Exactly max_requests pass inside one window"""
+    limiter = RateLimiter()
+    results = [limiter.is_rate_limited('1.2.3.4', 5, 60) for _ in range(6)]
+    assert results == [False] * 5 + [True]
+
+
+def test_limits_are_tracked_per_limit_config():
+    """A busy endpoint does not consume the budget of a stricter one"""
+    limiter = RateLimiter()
+    for _ in range(100):
+        limiter.is_rate_limited('1.2.3.4', 120, 60)
+    assert limiter.is_rate_limited('1.2.3.4', 5, 300) is False
+
+
+def test_key_table_is_bounded_and_swept():
+    """LRU bound caps memory; sweep drops fully replenished keys"""
+    limiter = RateLimiter(max_keys=100)
+    for i in range(1000):
+        limiter.is_rate_limited(f"10.0.0.{i}", 10, 60)
+    assert len(limiter.backend.buckets) == 100
+
+    assert limiter.sweep(now=time.time() + 3600) == 100
+    assert len(limiter.backend.buckets) == 0
+
+
+def test_lockout_after_failed_attempts():
+    limiter = RateLimiter()
+    for _ in range(4):
+        assert limiter.record_failed_attempt('a@b.com', max_attempts=5) is None
+    assert limiter.record_failed_attempt('a@b.com', max_attempts=5) is not None
+    assert limiter.is_locked_out('a@b.com')
+
+    limiter.clear_failed_attempts('a@b.com')
+    assert not limiter.is_locked_out('a@b.com')
+
+
+def test_sqlite_backend_shares_state_between_limiters(tmp_path):
+    """Two limiters (e.g. two gunicorn workers) on one file enforce one budget"""
+    path = str(tmp_path / 'rl.db')
+    worker_a = RateLimiter(backend=SQLiteBackend(path))
+    worker_b = RateLimiter(backend=SQLiteBackend(path))
+    results = [w.is_rate_limited('1.2.3.4', 4, 60) for w in (worker_a, worker_b) * 3]
+    assert results == [False] * 4 + [True, True]
+
+    for _ in range(3):
+        worker_a.record_failed_attempt('a@b.com', max_attempts=3)
+    assert worker_b.is_locked_out('a@b.com')
+
+
+def test_redis_scripts_use_the_server_clock(monkeypatch):
+    """Nodes with skewed clocks must share one limit: the scripts read Redis TIME"""
+    import redis
+    import rate_limit_backends
+
+    calls = []
+
+    class FakeRedis:
+        def register_script(self, script):
+            assert "redis.call('TIME')" in script
+            return lambda keys, args: calls.append(args) or 0
+
+    monkeypatch.setattr(redis.Redis, 'from_url', staticmethod(lambda *a, **kw: FakeRedis()))
+    backend = rate_limit_backends.RedisBackend('redis://localhost:6379/0')
+    skewed_now = time.time() + 3600
+    backend.gcra('1.2.3.4', 12.0, 60, skewed_now)
+    backend.record_failure('1.2.3.4', 5, 900, skewed_now)
+    assert all(skewed_now not in args for args in calls)
@@ -0,0 +1,94 @@
+"""
+Tests for read-replica routing, using two SQLite files as primary and replica
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import Session
+
+from models import db, Project, ProjectMember
+import read_routing
+from projects import projects_bp
+
+
+def _seed(session, project_name):
+    # The replica is a copy of the primary except for the project row, so results show which one was read
+    session.add_all([
+        Project(id=1, name=project_name, owner_id=1),
+        ProjectMember(project_id=1, user_id=2),
+    ])
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, make_app, add_users):
+    markers = read_routing.MemoryWriteMarkers()
+    markers.shared = True  # stands in for redis
+    monkeypatch.setattr(read_routing, 'write_markers', markers)
+    app = make_app(
+        f"sqlite:///{tmp_path / 'primary.db'}",
+        seed=lambda session: _seed(session, 'primary'),
+        SQLALCHEMY_BINDS={'replica': f"sqlite:///{tmp_path / 'replica.db'}"},
+    )
+    app.register_blueprint(projects_bp, url_prefix='/api/projects')
+
+    @app.route('/api/test/write', methods=['POST'])
+    @jwt_required()
+    def write():
+        db.session.add(Project(name='new', owner_id=1))
+        db.session.commit()
+        return jsonify({'ok': True}), 201
+
+    with app.app_context():
+        replica = db.engines['replica']
+        db.metadata.create_all(bind=replica)
+        with Session(replica) as session:
+            add_users(session)
+            _seed(session, 'replica')
+            session.commit()
+    yield app
+    # init_app registered an (empty) metadata for the bind; other test apps have no replica
+    db.metadatas.pop('replica', None)
+
+
+def _project_names(client, headers):
+    response = client.get('/api/projects/', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return sorted(p['name'] for p in response.get_json())
+
+
+def test_list_endpoint_reads_from_replica(app):
+    assert _project_names(app.test_client(), app.auth[1]) == ['replica']
+
+
+def test_reads_follow_own_writes_to_primary(app, monkeypatch):
+    client = app.test_client()
+    assert client.post('/api/test/write', headers=app.auth[1]).status_code == 201
+
+    # The writer sees their new row; other users keep reading the replica
+    assert _project_names(client, app.auth[1]) == ['new', 'primary']
+    assert _project_names(client, app.auth[2]) == ['replica']
+
+    # Once the window has passed the writer is back on the replica
+    monkeypatch.setattr(read_routing.time, 'time', lambda: 10 ** 10)
+    assert _project_names(client, app.auth[1]) == ['replica']
+
+
+def test_without_replica_bind_everything_reads_primary(app):
+    app.config['SQLALCHEMY_BINDS'] = {}
+    assert _project_names(app.test_client(), app.auth[1]) == ['primary']
+
+
+def test_markers_other_instances_cannot_see_keep_reads_on_primary(app, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(read_routing, 'write_markers', read_routing.SQLiteWriteMarkers(str(tmp_path / 'ryw.db')))
+    monkeypatch.setattr(read_routing, '_unshared_markers_logged', False)
+    client = app.test_client()
+    assert _project_names(client, app.auth[1]) == ['primary']
+    assert _project_names(client, app.auth[2]) == ['primary']
+    errors = [r for r in caplog.records if r.levelname == 'ERROR' and 'READ_YOUR_WRITES_BACKEND=redis' in r.message]
+    assert len(errors) == 1
@@ -0,0 +1,73 @@
+"""
+Tests for the request-scoped identity map (request_cache)
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+
+from models import db, User, Project, ProjectMember
+import request_cache
+from request_cache import get_user, get_project_ids, is_project_member, request_stats
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            User(id=1, email='admin@example.com', password_hash='x', name='Admin', role='admin'),
+            Project(id=1, name='Platform', owner_id=1),
+            Project(id=2, name='Mobile', owner_id=1),
+            ProjectMember(project_id=1, user_id=1),
+        ])
+        db.session.commit()
+    return app
+
+
+def test_lookups_hit_the_database_once_per_request(app):
+    with app.test_request_context():
+        assert get_user(1).name == 'Admin'
+        assert get_user(1) is get_user(1)
+        assert is_project_member(1, 1) and not is_project_member(2, 1)
+        assert request_stats() == {'hits': 3, 'misses': 2}
+
+    # A new request starts empty
+    with app.test_request_context():
+        get_user(1)
+        assert request_stats() == {'hits': 0, 'misses': 1}
+
+
+def test_flushed_and_bulk_writes_invalidate(app):
+    with app.test_request_context():
+        assert get_project_ids(1) == frozenset({1})
+        db.session.add(ProjectMember(project_id=2, user_id=1))
+        db.session.flush()
+        assert get_project_ids(1) == frozenset({1, 2})
+
+        # query.update() / delete() skip the flush
+        ProjectMember.query.filter_by(project_id=1).delete(synchronize_session=False)
+        assert get_project_ids(1) == frozenset({2})
+        get_user(1)
+        misses = request_stats()['misses']
+        User.query.filter_by(id=1).update({User.role: 'viewer'}, synchronize_session=False)
+        get_user(1)
+        assert request_stats()['misses'] == misses + 1
+
+
+def test_app_contexts_outside_requests_are_not_cached(app):
+    # Worker threads and CLI scripts keep one app context open for their whole run
+    with app.app_context():
+        assert get_project_ids(1) == frozenset({1})
+        db.session.add(ProjectMember(project_id=2, user_id=1))
+        db.session.commit()
+        # No request to invalidate: a cached set would still say {1}
+        assert get_project_ids(1) == frozenset({1, 2})
+        assert request_cache.request_stats() == {'hits': 0, 'misses': 0}
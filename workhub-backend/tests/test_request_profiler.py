@@ -0,0 +1,101 @@
+"""
+Tests for on-demand request profiling
+"""
+import sys
+import os
+import time
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import jsonify
+
+from models import User
+import query_stats
+from request_profiler import RequestProfiler
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, make_app):
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path))
+    app = make_app()
+    query_stats.init_app(app)
+    app.profiler = RequestProfiler()
+    app.profiler.init_app(app)
+
+    @app.route('/slow')
+    def slow():
+        User.query.count()
+        time.sleep(0.05)
+        return jsonify({'ok': True})
+
+    return app
+
+
+def test_admin_header_profiles_request_with_sql_timeline(app):
+    client = app.test_client()
+    response = client.get('/slow', headers=dict(app.auth[1], **{'X-Profile': 'sample'}))
+    profile = app.profiler.load(response.headers['X-Profile-Id'])
+    assert profile['endpoint'] == 'slow'
+    assert profile['samples'] > 0
+    assert any('slow (' in line for line in profile['collapsed'])
+    assert profile['sql']['count'] >= 1
+
+    response = client.get('/slow', headers=dict(app.auth[1], **{'X-Profile': 'cprofile'}))
+    profile = app.profiler.load(response.headers['X-Profile-Id'])
+    assert any(f['function'].startswith('slow (') for f in profile['functions'])
+    assert [p['id'] for p in app.profiler.list_profiles()][0] == profile['id']
+
+
+def test_header_ignored_for_non_admins_and_sampling_filters(app):
+    client = app.test_client()
+    assert 'X-Profile-Id' not in client.get('/slow', headers=dict(app.auth[2], **{'X-Profile': '1'})).headers
+
+    app.profiler.sample_rate = 1.0
+    app.profiler.user_ids = {'1'}
+    assert 'X-Profile-Id' not in client.get('/slow', headers=app.auth[2]).headers
+    assert 'X-Profile-Id' in client.get('/slow', headers=app.auth[1]).headers
+
+
+def test_profiles_are_shared_through_the_bucket_in_cloud_mode(app, tmp_path, monkeypatch):
+    import storage_service
+    from fake_gcs import FakeStorageClient
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+    app.profiler.max_files = 2
+
+    client = app.test_client()
+    ids = [client.get('/slow', headers=dict(app.auth[1], **{'X-Profile': mode})).headers['X-Profile-Id']
+           for mode in ('cprofile', 'sample', 'sample')]
+    assert not list(tmp_path.glob('*.json'))
+
+    # Another instance, with its own empty PROFILE_DIR, lists and loads them from the bucket
+    other = RequestProfiler()
+    other.directory = str(tmp_path / 'other')
+    other.max_files = 2
+    assert [p['id'] for p in other.list_profiles()] == ids[:0:-1]
+    assert other.load(ids[2])['endpoint'] == 'slow'
+    assert other.load(ids[0]) is None
+    names = {blob.name for blob in client_gcs.bucket('workhub').list_blobs(prefix='profiles/')}
+    assert names == {f'profiles/{ids[1]}.json', f'profiles/{ids[2]}.json'}
+
+
+def test_failed_profile_upload_does_not_fail_the_request(app, tmp_path, monkeypatch):
+    import storage_service
+    from fake_gcs import FakeBlob, FakeStorageClient
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+
+    def forbidden(*args, **kwargs):
+        raise RuntimeError('403 Forbidden')  # google.api_core errors are not OSErrors
+
+    monkeypatch.setattr(FakeBlob, 'upload_from_file', forbidden)
+    response = app.test_client().get('/slow', headers=dict(app.auth[1], **{'X-Profile': 'sample'}))
+    assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
@@ -0,0 +1,70 @@
+"""
+Tests for StorageService cloud paths, run offline against the fake GCS backend
+"""
+import sys
+import os
+import io
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import storage_service
+from fake_gcs import FakeStorageClient
+from storage_service import StorageService
+
+
+@pytest.fixture
+def gcs(tmp_path, monkeypatch):
+    client = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client)
+    storage_service._signed_urls.clear()
+    yield client
+    storage_service._signed_urls.clear()
+
+
+def _save(name, data, subfolder='blobs/ab'):
+    return StorageService.save_file(FileStorage(io.BytesIO(data), filename=name), name, subfolder=subfolder)
+
+
+def test_signed_urls_are_cached_until_close_to_expiry(gcs, monkeypatch):
+    path = _save('report.pdf', b'%PDF')
+    assert path == 'gs://workhub/blobs/ab/report.pdf'
+
+    gcs.api_calls = 0
+    first = StorageService.generate_signed_url(path, expiration_minutes=15)
+    assert StorageService.generate_signed_url(path, expiration_minutes=15) == first
+    assert gcs.api_calls == 1
+
+    # Past 80% of the lifetime a fresh URL is signed
+    now = storage_service.time.monotonic()
+    monkeypatch.setattr(storage_service.time, 'monotonic', lambda: now + 13 * 60)
+    StorageService.generate_signed_url(path, expiration_minutes=15)
+    assert gcs.api_calls == 2
+
+    # Deleting the object drops its cached URLs
+    StorageService._delete_object(path)
+    assert not storage_service._signed_urls
+
+
+def test_failed_cloud_upload_raises_instead_of_writing_locally(gcs, tmp_path, monkeypatch):
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('503 Service Unavailable')
+
+    monkeypatch.setattr('fake_gcs.FakeBlob.upload_from_file', fail)
+    monkeypatch.setattr('fake_gcs.FakeBlob.upload_from_filename', fail)
+    with pytest.raises(RuntimeError):
+        _save('report.pdf', b'%PDF')
+
+    source = tmp_path / 'assembled'
+    source.write_bytes(b'data')
+    with pytest.raises(RuntimeError):
+        StorageService.save_path(str(source), 'assembled', subfolder='blobs/ab')
+    assert source.exists()
+    assert not (tmp_path / 'uploads').exists()
@@ -0,0 +1,114 @@
+"""
+Tests for refresh-token rotation, reuse detection and the JWT denylist
+"""
+import sys
+import os
+import uuid
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, decode_token, jwt_required
+
+from models import db, User, RefreshToken
+import token_service
+from token_service import BloomFilter, TokenDenylist, issue_token_pair, is_token_revoked
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(token_service, 'token_denylist', TokenDenylist(sync_interval=5))
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', JWT_SECRET_KEY='test-secret-key-with-enough-bytes!')
+    db.init_app(app)
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(is_token_revoked)
+
+    from auth import auth_bp
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+
+    @app.route('/api/me')
+    @jwt_required()
+    def me():
+        return jsonify({'ok': True})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, email='dev@example.com', password_hash='x', name='Dev', role='developer',
+                            signup_status='approved'))
+        db.session.commit()
+        access, refresh, _ = issue_token_pair(db.session.get(User, 1))
+        db.session.commit()
+    app.tokens = {'access': access, 'refresh': refresh}
+    return app
+
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_rotation_issues_a_new_pair(app):
+    client = app.test_client()
+    response = client.post('/api/auth/refresh', headers=_bearer(app.tokens['refresh']))
+    assert response.status_code == 200
+    pair = response.get_json()
+    assert pair['refresh_token'] != app.tokens['refresh']
+    assert client.get('/api/me', headers=_bearer(pair['access_token'])).status_code == 200
+
+    with app.app_context():
+        old = decode_token(app.tokens['refresh'])
+        new = decode_token(pair['refresh_token'])
+        assert new['fam'] == old['fam']
+        record = RefreshToken.query.filter_by(jti=old['jti']).one()
+        assert record.revoked_at is not None and record.replaced_by == new['jti']
+
+
+def test_reusing_a_rotated_refresh_token_revokes_the_family(app):
+    client = app.test_client()
+    rotated = client.post('/api/auth/refresh', headers=_bearer(app.tokens['refresh'])).get_json()
+
+    # A stolen copy of the first token is replayed
+    assert client.post('/api/auth/refresh', headers=_bearer(app.tokens['refresh'])).status_code == 401
+    # The legitimate holder's newer token is now revoked as well
+    assert client.post('/api/auth/refresh', headers=_bearer(rotated['refresh_token'])).status_code == 401
+    with app.app_context():
+        assert RefreshToken.query.filter_by(revoked_at=None).count() == 0
+
+
+def test_logged_out_access_token_is_rejected_by_every_worker_within_the_sync_interval(app, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(token_service.time, 'monotonic', lambda: clock[0])
+    other_worker = TokenDenylist(sync_interval=5)
+    with app.app_context():
+        jti = decode_token(app.tokens['access'])['jti']
+        assert other_worker.is_revoked(jti) is False  # first sync happens here
+
+    client = app.test_client()
+    assert client.post('/api/auth/logout', headers=_bearer(app.tokens['access'])).status_code == 200
+    # The worker that handled the logout rejects it immediately
+    assert client.get('/api/me', headers=_bearer(app.tokens['access'])).status_code == 401
+
+    with app.app_context():
+        # Other workers see it at their next sync, at most sync_interval later
+        clock[0] += 4
+        assert other_worker.is_revoked(jti) is False
+        clock[0] += 1
+        assert other_worker.is_revoked(jti) is True
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    members = [uuid.uuid4().hex for _ in range(1000)]
+    for jti in members:
+        bloom.add(jti)
+    assert all(jti in bloom for jti in members)
+
+    # Over capacity it only degrades towards false positives
+    extra = [uuid.uuid4().hex for _ in range(3000)]
+    for jti in extra:
+        bloom.add(jti)
+    assert all(jti in bloom for jti in members + extra)
+    outsiders = [uuid.uuid4().hex for _ in range(1000)]
+    assert sum(jti in bloom for jti in outsiders) < 1000
@@ -0,0 +1,593 @@
+"""
+Tests for the chunked, resumable upload protocol in upload_sessions
+"""
+import sys
+import os
+import io
+import hashlib
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from models import db, User, Task, FileAttachment, Blob
+import preview_service
+from upload_sessions import upload_sessions_bp
+from file_uploads import file_uploads_bp
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path))
+    # Render previews inline so tests are deterministic
+    monkeypatch.setattr(preview_service.preview_service, 'workers', 0)
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        JWT_SECRET_KEY='test-secret',
+        UPLOAD_FOLDER=str(tmp_path),
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(upload_sessions_bp, url_prefix='/api/uploads')
+    app.register_blueprint(file_uploads_bp, url_prefix='/api/files')
+    with app.app_context():
+        db.create_all()
+        user = User(email='dev@example.com', password_hash='x', name='Dev', role='developer')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Task(title='Task', created_by=user.id, assigned_to=user.id))
+        db.session.commit()
+        app.auth = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    app.instance_upload_folder = tmp_path
+    yield app
+
+
+def _create(client, app, size, filename='notes.txt', sha256=None):
+    response = client.post('/api/uploads', headers=app.auth, json={
+        'target_type': 'task', 'target_id': 1, 'filename': filename, 'size': size, 'sha256': sha256
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['upload_id']
+
+
+def _put(client, app, upload_id, data, start, total):
+    headers = dict(app.auth)
+    headers['Content-Range'] = f'bytes {start}-{start + len(data) - 1}/{total}'
+    return client.put(f'/api/uploads/{upload_id}', headers=headers, data=data,
+                      content_type='application/octet-stream')
+
+
+def test_chunked_upload_creates_attachment(app):
+    client = app.test_client()
+    payload = os.urandom(300 * 1024)
+    upload_id = _create(client, app, len(payload))
+
+    for start in range(0, len(payload), 100 * 1024):
+        assert _put(client, app, upload_id, payload[start:start + 100 * 1024], start, len(payload)).status_code == 200
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth,
+                           json={'sha256': hashlib.sha256(payload).hexdigest()})
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert body['sha256'] == hashlib.sha256(payload).hexdigest()
+    assert body['attachment']['file_size'] == len(payload)
+
+    with app.app_context():
+        attachment = FileAttachment.query.get(body['attachment']['id'])
+        with open(attachment.file_path, 'rb') as fh:
+            assert fh.read() == payload
+
+
+def test_resume_after_dropped_chunk_and_gap_rejected(app):
+    client = app.test_client()
+    payload = b'a' * 1000 + b'b' * 1000
+    upload_id = _create(client, app, len(payload))
+
+    assert _put(client, app, upload_id, payload[:1000], 0, len(payload)).status_code == 200
+    # A chunk that skips ahead is refused with the offset to resume from
+    gap = _put(client, app, upload_id, payload[1500:], 1500, len(payload))
+    assert gap.status_code == 409
+    assert gap.get_json()['received_bytes'] == 1000
+
+    # A chunk that was already accepted is refused as well
+    assert _put(client, app, upload_id, payload[:1000], 0, len(payload)).get_json()['received_bytes'] == 1000
+    status = client.get(f'/api/uploads/{upload_id}', headers=app.auth).get_json()
+    assert _put(client, app, upload_id, payload[status['received_bytes']:], status['received_bytes'],
+                len(payload)).status_code == 200
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth, json={})
+    assert response.status_code == 201
+    assert response.get_json()['sha256'] == hashlib.sha256(payload).hexdigest()
+
+
+def test_concurrent_chunks_are_serialized_on_the_session(app, monkeypatch):
+    import upload_sessions
+
+    client = app.test_client()
+    payload = b'x' * 100 + b'y' * 100
+    upload_id = _create(client, app, len(payload))
+    racing = []
+    original_write = upload_sessions._write_local
+
+    def write_while_another_put_lands(upload, start, reader):
+        if not racing:
+            # A second PUT for the same offset arrives (e.g. at another instance) meanwhile
+            racing.append(_put(client, app, upload_id, b'z' * 100, 0, len(payload)))
+        return original_write(upload, start, reader)
+
+    monkeypatch.setattr(upload_sessions, '_write_local', write_while_another_put_lands)
+    assert _put(client, app, upload_id, payload[:100], 0, len(payload)).status_code == 200
+    # Refused before any of its bytes were written
+    assert racing[0].status_code == 409
+
+    assert _put(client, app, upload_id, payload[100:], 100, len(payload)).status_code == 200
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth)
+    assert response.status_code == 201
+    assert response.get_json()['sha256'] == hashlib.sha256(payload).hexdigest()
+    # The staging file went with the session
+    assert not list((app.instance_upload_folder / '.incoming').rglob('*'))
+
+
+def test_claim_of_a_dead_put_is_taken_over(app, monkeypatch):
+    from datetime import datetime
+    from models import UploadSession
+    import upload_sessions
+
+    client = app.test_client()
+    payload = os.urandom(2000)
+    upload_id = _create(client, app, len(payload))
+    assert _put(client, app, upload_id, payload[:1000], 0, len(payload)).status_code == 200
+    with app.app_context():
+        # The PUT for the second chunk died after claiming the session
+        UploadSession.query.filter_by(id=upload_id).update({
+            UploadSession.status: 'receiving', UploadSession.claim_id: 'dead', UploadSession.claimed_at: datetime.utcnow()
+        })
+        db.session.commit()
+    assert _put(client, app, upload_id, payload[1000:], 1000, len(payload)).status_code == 409
+
+    with app.app_context():
+        UploadSession.query.filter_by(id=upload_id).update(
+            {UploadSession.claimed_at: datetime.utcnow() - upload_sessions.CHUNK_CLAIM_TIMEOUT * 2}
+        )
+        db.session.commit()
+    assert _put(client, app, upload_id, payload[1000:], 1000, len(payload)).status_code == 200
+    # Chunks went to another process: completion hashes the staging file instead
+    upload_sessions._hash_states.clear()
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth)
+    assert response.status_code == 201
+    assert response.get_json()['sha256'] == hashlib.sha256(payload).hexdigest()
+
+
+def test_chunks_are_composed_in_the_bucket_in_cloud_mode(app, tmp_path, monkeypatch):
+    import shutil
+    import storage_service
+    import upload_sessions
+    from fake_gcs import FakeStorageClient
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'UPLOAD_PUSH_ASYNC', False)
+    monkeypatch.setattr(storage_service, 'MAX_COMPOSE_SOURCES', 2)
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+
+    client = app.test_client()
+    for name, keep_hash in (('a.txt', True), ('b.txt', False)):
+        payload = os.urandom(3000)
+        upload_id = _create(client, app, len(payload), name)
+        for start in range(0, len(payload), 1000):
+            assert _put(client, app, upload_id, payload[start:start + 1000], start, len(payload)).status_code == 200
+        staged = tmp_path / 'gcs' / 'workhub' / '.incoming' / upload_id
+        assert len(list(staged.iterdir())) == 3
+        # Nothing of the upload is on local disk
+        assert not (tmp_path / '.incoming').exists() or not list((tmp_path / '.incoming').rglob('*'))
+
+        if not keep_hash:
+            # The chunks reached another instance, which has no running hash
+            upload_sessions._hash_states.clear()
+        shutil.rmtree(tmp_path / '.incoming', ignore_errors=True)
+        response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth)
+        assert response.status_code == 201, response.get_json()
+        sha256 = response.get_json()['sha256']
+        assert sha256 == hashlib.sha256(payload).hexdigest()
+        assert (tmp_path / 'gcs' / 'workhub' / 'blobs' / sha256[:2] / sha256).read_bytes() == payload
+        assert not staged.exists() or not list(staged.iterdir())
+    with app.app_context():
+        blobs = Blob.query.all()
+        assert all(b.storage_path == f'gs://workhub/blobs/{b.sha256[:2]}/{b.sha256}' for b in blobs)
+        # Intermediate compose objects were removed
+        stored = sorted(p.name for p in (tmp_path / 'gcs' / 'workhub' / 'blobs').rglob('*') if p.is_file())
+        assert stored == sorted(b.sha256 for b in blobs)
+
+
+def test_incomplete_upload_and_checksum_mismatch(app):
+    client = app.test_client()
+    upload_id = _create(client, app, 10)
+    _put(client, app, upload_id, b'12345', 0, 10)
+    assert client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth).status_code == 409
+
+    _put(client, app, upload_id, b'67890', 5, 10)
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth, json={'sha256': '0' * 64})
+    assert response.status_code == 422
+
+
+def test_disallowed_extension_rejected_before_upload(app):
+    client = app.test_client()
+    response = client.post('/api/uploads', headers=app.auth, json={
+        'target_type': 'task', 'target_id': 1, 'filename': 'run.exe', 'size': 10
+    })
+    assert response.status_code == 400
+
+
+def _upload(client, app, payload, filename='notes.txt'):
+    upload_id = _create(client, app, len(payload), filename)
+    _put(client, app, upload_id, payload, 0, len(payload))
+    return client.post(f'/api/uploads/{upload_id}/complete', headers=app.auth).get_json()
+
+
+def test_identical_content_is_stored_once_and_reference_counted(app):
+    client = app.test_client()
+    payload = b'same bytes' * 100
+    first = _upload(client, app, payload, 'a.txt')
+    second = _upload(client, app, payload, 'b.txt')
+
+    with app.app_context():
+        assert Blob.query.count() == 1
+        blob = Blob.query.first()
+        assert blob.ref_count == 2
+        attachments = FileAttachment.query.all()
+        assert {a.file_path for a in attachments} == {blob.storage_path}
+        storage_path = blob.storage_path
+
+    assert client.delete(f"/api/files/attachment/{first['attachment']['id']}", headers=app.auth).status_code == 200
+    with app.app_context():
+        assert Blob.query.first().ref_count == 1
+    assert os.path.exists(storage_path)
+
+    assert client.delete(f"/api/files/attachment/{second['attachment']['id']}", headers=app.auth).status_code == 200
+    with app.app_context():
+        assert Blob.query.count() == 0
+        # Usage counters follow uploads and deletes
+        from storage_service import storage_service
+        assert storage_service.get_usage() == (0, 0)
+    assert not os.path.exists(storage_path)
+
+
+def test_known_hash_completes_without_sending_bytes(app):
+    client = app.test_client()
+    payload = b'already uploaded' * 50
+    _upload(client, app, payload)
+
+    digest = hashlib.sha256(payload).hexdigest()
+    response = client.post('/api/uploads', headers=app.auth, json={
+        'target_type': 'task', 'target_id': 1, 'filename': 'copy.txt', 'size': len(payload), 'sha256': digest
+    })
+    session = response.get_json()
+    assert session['blob_exists'] is True
+
+    done = client.post(f"/api/uploads/{session['upload_id']}/complete", headers=app.auth)
+    assert done.status_code == 201
+    assert done.get_json()['deduplicated'] is True
+    with app.app_context():
+        assert Blob.query.first().ref_count == 2
+
+
+def test_another_user_cannot_link_a_blob_by_its_hash(app):
+    client = app.test_client()
+    payload = b'private report' * 50
+    _upload(client, app, payload, 'report.txt')
+    digest = hashlib.sha256(payload).hexdigest()
+
+    with app.app_context():
+        other = User(email='admin@example.com', password_hash='x', name='Admin', role='admin')
+        db.session.add(other)
+        db.session.commit()
+        other_auth = {'Authorization': f'Bearer {create_access_token(identity=str(other.id))}'}
+
+    response = client.post('/api/uploads', headers=other_auth, json={
+        'target_type': 'task', 'target_id': 1, 'filename': 'stolen.txt', 'size': len(payload), 'sha256': digest
+    })
+    session = response.get_json()
+    # Whether the content is stored is not revealed, and completing without the bytes fails
+    assert session['blob_exists'] is False
+    done = client.post(f"/api/uploads/{session['upload_id']}/complete", headers=other_auth)
+    assert done.status_code == 409
+    with app.app_context():
+        assert FileAttachment.query.count() == 1 and Blob.query.first().ref_count == 1
+
+    # Sending the bytes works, and the content is still stored only once
+    headers = {**other_auth, 'Content-Range': f'bytes 0-{len(payload) - 1}/{len(payload)}'}
+    assert client.put(f"/api/uploads/{session['upload_id']}", headers=headers, data=payload,
+                      content_type='application/octet-stream').status_code == 200
+    done = client.post(f"/api/uploads/{session['upload_id']}/complete", headers=other_auth)
+    assert done.status_code == 201 and done.get_json()['deduplicated'] is False
+    with app.app_context():
+        assert Blob.query.count() == 1 and Blob.query.first().ref_count == 2
+
+
+def test_download_supports_range_and_conditional_get(app):
+    client = app.test_client()
+    payload = bytes(range(256)) * 40
+    attachment_id = _upload(client, app, payload, 'clip.mp4')['attachment']['id']
+    url = f'/api/files/attachment/{attachment_id}/download'
+
+    full = client.get(url, headers=app.auth)
+    assert full.status_code == 200
+    assert full.headers['ETag'] == f'"{hashlib.sha256(payload).hexdigest()}"'
+    assert 'immutable' in full.headers['Cache-Control']
+    assert full.headers['Accept-Ranges'] == 'bytes'
+
+    partial = client.get(url, headers={**app.auth, 'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == payload[100:200]
+    assert partial.headers['Content-Range'] == f'bytes 100-199/{len(payload)}'
+
+    cached = client.get(url, headers={**app.auth, 'If-None-Match': full.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    assert client.get(url, headers={**app.auth, 'Range': f'bytes={len(payload) + 10}-'}).status_code == 416
+
+
+def test_preview_is_rendered_once_and_served_with_cache_headers(app, monkeypatch):
+    renders = []
+
+    def fake_renderer(source, dest):
+        renders.append(source)
+        with open(dest, 'wb') as fh:
+            fh.write(b'jpeg-bytes')
+        return True
+
+    monkeypatch.setattr(preview_service, '_renderer_for',
+                        lambda content_type: fake_renderer if content_type == 'image/png' else None)
+    client = app.test_client()
+    first = _upload(client, app, b'png' * 100, 'photo.png')['attachment']['id']
+    _upload(client, app, b'png' * 100, 'same-photo.png')
+    assert len(renders) == 1
+
+    preview = client.get(f'/api/files/attachment/{first}/preview', headers=app.auth)
+    assert preview.status_code == 200
+    assert preview.data == b'jpeg-bytes'
+    assert preview.mimetype == 'image/jpeg'
+    assert preview.headers['Content-Disposition'].startswith('inline')
+    assert 'immutable' in preview.headers['Cache-Control']
+
+    cached = client.get(f'/api/files/attachment/{first}/preview',
+                        headers={**app.auth, 'If-None-Match': preview.headers['ETag']})
+    assert cached.status_code == 304
+
+    text_id = _upload(client, app, b'plain text', 'notes.txt')['attachment']['id']
+    assert client.get(f'/api/files/attachment/{text_id}/preview', headers=app.auth).status_code == 404
+
+
+def test_preview_abandoned_by_a_dead_worker_is_claimed_again(app, monkeypatch):
+    from datetime import datetime, timedelta
+
+    renders = []
+
+    def fake_renderer(source, dest):
+        renders.append(source)
+        with open(dest, 'wb') as fh:
+            fh.write(b'jpeg-bytes')
+        return True
+
+    monkeypatch.setattr(preview_service, '_renderer_for',
+                        lambda content_type: fake_renderer if content_type == 'image/png' else None)
+    client = app.test_client()
+    attachment_id = _upload(client, app, b'png' * 100, 'photo.png')['attachment']['id']
+    url = f'/api/files/attachment/{attachment_id}/preview'
+
+    # The worker that claimed the preview died before recording a result
+    with app.app_context():
+        Blob.query.update({Blob.preview_status: 'pending', Blob.preview_claimed_at: datetime.utcnow()})
+        db.session.commit()
+    assert client.get(url, headers=app.auth).status_code == 202
+    assert len(renders) == 1
+
+    with app.app_context():
+        Blob.query.update({Blob.preview_claimed_at: datetime.utcnow() - preview_service.CLAIM_TIMEOUT
+                           - timedelta(seconds=1)})
+        db.session.commit()
+    assert client.get(url, headers=app.auth).status_code == 202
+    assert len(renders) == 2
+    response = client.get(url, headers=app.auth)
+    assert response.status_code == 200 and response.data == b'jpeg-bytes'
+
+
+def test_cloud_push_runs_after_local_write_in_parallel_parts(app, tmp_path, monkeypatch):
+    import storage_service
+    import upload_pipeline
+    from fake_gcs import FakeStorageClient, FakeBlob
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'UPLOAD_PUSH_ASYNC', True)
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+    monkeypatch.setattr(upload_pipeline.upload_pipeline, 'workers', 0)
+    monkeypatch.setattr(upload_pipeline, 'CHUNK_SIZE', 1024)
+    monkeypatch.setattr(upload_pipeline, 'RETRY_BACKOFF_SECONDS', 0)
+
+    # The first part upload fails; the push is retried
+    failures = []
+    original_upload = FakeBlob.upload_from_file
+
+    def flaky_upload(self, file_obj, content_type=None):
+        if not failures:
+            failures.append(self.name)
+            raise IOError('connection reset')
+        return original_upload(self, file_obj, content_type)
+
+    monkeypatch.setattr(FakeBlob, 'upload_from_file', flaky_upload)
+
+    client = app.test_client()
+    payload = os.urandom(5000)
+    response = client.post('/api/files/task/1/upload', headers=app.auth, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(payload), 'data.zip')})
+    assert response.status_code == 201, response.get_json()
+    attachment_id = response.get_json()['attachment']['id']
+    assert failures
+
+    with app.app_context():
+        blob = Blob.query.first()
+        assert blob.storage_state == 'remote'
+        assert blob.storage_path == f'gs://workhub/blobs/{blob.sha256[:2]}/{blob.sha256}'
+        assert FileAttachment.query.get(attachment_id).file_path == blob.storage_path
+        remote_file = tmp_path / 'gcs' / 'workhub' / 'blobs' / blob.sha256[:2] / blob.sha256
+    assert remote_file.read_bytes() == payload
+    # Parts were cleaned up and the local copy removed
+    assert len(list(remote_file.parent.iterdir())) == 1
+    assert not list((tmp_path / 'blobs').rglob('*'))[1:]
+
+    download = client.get(f'/api/files/attachment/{attachment_id}/download', headers=app.auth)
+    assert download.status_code == 302
+    assert 'Signature=' in download.headers['Location']
+
+
+def test_cloud_uploads_go_straight_to_the_bucket_without_a_shared_volume(app, tmp_path, monkeypatch):
+    import storage_service
+    from fake_gcs import FakeStorageClient
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+
+    client = app.test_client()
+    _upload(client, app, b'shared with every instance', 'notes.txt')
+    with app.app_context():
+        blob = Blob.query.first()
+        assert blob.storage_state == 'remote' and blob.storage_path.startswith('gs://workhub/')
+    assert not list((tmp_path / 'blobs').rglob('*'))
+
+
+def test_push_recovers_stale_claims_and_gives_up_on_missing_files(app, tmp_path, monkeypatch):
+    from datetime import datetime
+    import storage_service
+    import upload_pipeline
+    from fake_gcs import FakeStorageClient
+
+    pipeline = upload_pipeline.upload_pipeline
+    monkeypatch.setattr(pipeline, 'workers', 0)
+
+    client = app.test_client()
+    # Stored locally by instances whose pushes then died mid-way
+    _upload(client, app, b'kept' * 10, 'kept.txt')
+    _upload(client, app, b'lost' * 10, 'lost.txt')
+    with app.app_context():
+        kept, lost = Blob.query.order_by(Blob.id).all()
+        os.remove(lost.storage_path)
+        claimed_at = datetime.utcnow() - upload_pipeline.STALE_UPLOAD * 2
+        Blob.query.update({Blob.storage_state: 'uploading', Blob.storage_state_at: claimed_at})
+        db.session.commit()
+        kept_id, lost_id = kept.id, lost.id
+
+    client_gcs = FakeStorageClient(str(tmp_path / 'gcs'))
+    monkeypatch.setattr(storage_service, 'USE_CLOUD_STORAGE', True)
+    monkeypatch.setattr(storage_service, 'CLOUD_STORAGE_BUCKET', 'workhub')
+    monkeypatch.setattr(storage_service, 'UPLOAD_PUSH_ASYNC', True)
+    monkeypatch.setattr(storage_service, 'get_storage_client', lambda: client_gcs)
+    pipeline.resume_pending(app)
+    with app.app_context():
+        kept, lost = db.session.get(Blob, kept_id), db.session.get(Blob, lost_id)
+        assert kept.storage_state == 'remote' and kept.storage_path.startswith('gs://')
+        assert lost.storage_state == 'missing'
+
+    # A fresh claim belongs to a live worker and is left alone
+    with app.app_context():
+        Blob.query.filter_by(id=lost_id).update({Blob.storage_state: 'uploading',
+                                                 Blob.storage_state_at: datetime.utcnow()})
+        db.session.commit()
+    pipeline._push(app, lost_id)
+    with app.app_context():
+        assert db.session.get(Blob, lost_id).storage_state == 'uploading'
+
+
+def test_storage_gc_reclaims_orphans_and_fixes_counters(app, tmp_path):
+    import time
+    from datetime import datetime, timedelta
+    from models import StorageUsage
+    from storage_service import storage_service
+    from storage_gc import collect_garbage
+
+    client = app.test_client()
+    payload = b'keep me' * 10
+    _upload(client, app, payload, 'keep.txt')
+
+    two_days_ago = time.time() - 2 * 24 * 3600
+    orphan = tmp_path / 'blobs' / 'zz' / 'orphan'
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b'x' * 100)
+    os.utime(orphan, (two_days_ago, two_days_ago))
+    fresh = tmp_path / 'blobs' / 'zz' / 'still-uploading'
+    fresh.write_bytes(b'y')
+
+    leaked = tmp_path / 'blobs' / 'ee' / ('e' * 64)
+    leaked.parent.mkdir(parents=True)
+    leaked.write_bytes(b'leaked')
+    with app.app_context():
+        assert storage_service.get_usage() == (1, len(payload))
+        # A chat message that referenced this blob was removed without releasing it
+        db.session.add(Blob(sha256='e' * 64, size=6, storage_path=str(leaked), ref_count=1,
+                            created_at=datetime.utcnow() - timedelta(days=2)))
+        StorageUsage.query.filter(StorageUsage.user_id.is_(None)).update({StorageUsage.file_count: 42})
+        db.session.commit()
+
+        report = collect_garbage(dry_run=True)
+        assert report['blobs_released'] == 1 and report['orphans_deleted'] == 1
+        assert orphan.exists() and leaked.exists()
+
+        report = collect_garbage()
+        assert report['blobs_released'] == 1
+        assert report['orphans_deleted'] == 1
+        assert report['usage_rows_updated'] == 1
+        assert Blob.query.count() == 1
+        assert storage_service.get_usage() == (1, len(payload))
+
+    assert not orphan.exists() and not leaked.exists()
+    assert fresh.exists()
+    assert client.post('/api/files/gc', headers=app.auth).status_code == 403
+
+
+
+def test_gc_endpoint_runs_in_the_background(app):
+    import threading
+    import storage_gc
+
+    client = app.test_client()
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash='x', name='Admin', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        admin_auth = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+
+    response = client.post('/api/files/gc?dry_run=true', headers=admin_auth)
+    assert response.status_code == 202
+    for thread in threading.enumerate():
+        if thread.name == 'storage-gc':
+            thread.join(timeout=10)
+
+    status = client.get('/api/files/gc', headers=admin_auth).get_json()
+    assert status['state'] == 'finished'
+    assert status['report']['dry_run'] is True
+    assert client.get('/api/files/gc', headers=app.auth).status_code == 403
+
+def test_stored_file_is_deleted_only_when_the_delete_commits(app):
+    from file_uploads import delete_attachments
+
+    client = app.test_client()
+    _upload(client, app, b'keep me' * 10)
+    with app.app_context():
+        path = Blob.query.one().storage_path
+        delete_attachments(FileAttachment.query)
+        # e.g. a foreign key error at commit
+        db.session.rollback()
+        assert FileAttachment.query.count() == 1 and os.path.exists(path)
+
+        delete_attachments(FileAttachment.query)
+        db.session.commit()
+        assert Blob.query.count() == 0 and not os.path.exists(path)
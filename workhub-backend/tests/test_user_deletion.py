@@ -0,0 +1,54 @@
+"""
+Tests for deleting a user with rows that reference them
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, User, RevokedToken, UploadSession
+from auth import auth_bp
+from users import users_bp
+from storage_service import storage_service
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, make_app):
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    app = make_app(f"sqlite:///{tmp_path / 'app.db'}")
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(users_bp, url_prefix='/api/users')
+    with app.app_context():
+        # Enforce foreign keys like SQL Server does
+        event.listen(db.engine, 'connect', lambda conn, record: conn.execute('PRAGMA foreign_keys=ON'))
+        db.engine.dispose()
+    return app
+
+
+def test_user_who_logged_out_and_left_an_upload_can_be_deleted(app, tmp_path):
+    client = app.test_client()
+    assert client.post('/api/auth/logout', headers=app.auth[2]).status_code == 200
+
+    with app.app_context():
+        db.session.add(UploadSession(id='a' * 32, user_id=2, target_type='task', target_id=1, filename='f.bin',
+                                     total_size=20, received_bytes=10,
+                                     expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.commit()
+        with open(storage_service.staging_path('a' * 32), 'wb') as fh:
+            fh.write(b'x' * 10)
+    staged = tmp_path / 'uploads' / '.incoming' / ('a' * 32)
+    assert staged.exists()
+
+    response = client.delete('/api/users/2', headers=app.auth[1])
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        assert db.session.get(User, 2) is None
+        assert UploadSession.query.count() == 0
+        # The revoked JTI is still denied
+        assert RevokedToken.query.one().user_id is None
+    assert not staged.exists()
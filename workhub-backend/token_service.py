@@ -0,0 +1,285 @@
+"""
+Refresh-token rotation and JWT revocation.
+
+- Login issues a short-lived access token plus a refresh token. Every refresh
+  rotates the refresh token; presenting an already-rotated token revokes the
+  whole token family (reuse detection).
+- Revoked JWT ids are stored in the revoked_tokens table and mirrored in an
+  in-memory denylist fronted by a Bloom filter, so the per-request
+  token_in_blocklist_loader check is a few hash lookups with no DB access.
+  Each worker pulls new revocations incrementally every
+  JWT_DENYLIST_SYNC_SECONDS (default 5).
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import request
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+
+from models import db, RefreshToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)
+REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 14)))
+
+
+class TokenReuseError(Exception):
+    """A rotated (already used) refresh token was presented again"""
+    pass
+
+
+class InvalidRefreshToken(Exception):
+    """Refresh token is unknown, revoked or belongs to an inactive user"""
+    pass
+
+
+# ========== BLOOM FILTER ==========
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        for pos in self._positions(item):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+# ========== DENYLIST ==========
+
+class TokenDenylist:
+    """In-memory JTI denylist synced from the revoked_tokens table"""
+
+    def __init__(self, sync_interval: float = 5.0):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._entries = {}  # jti -> expiry timestamp
+        self._bloom = BloomFilter()
+        self._last_sync = 0.0
+        self._synced_until = None
+        self.stats = {'checks': 0, 'bloom_negatives': 0, 'syncs': 0}
+
+    def is_revoked(self, jti: str) -> bool:
+        """O(1) check; the Bloom filter answers 'not revoked' without touching the dict"""
+        self._maybe_sync()
+        self.stats['checks'] += 1
+        if jti not in self._bloom:
+            self.stats['bloom_negatives'] += 1
+            return False
+        with self._lock:
+            expires = self._entries.get(jti)
+        return expires is not None and expires > time.time()
+
+    def add_local(self, jti: str, expires_at: datetime):
+        with self._lock:
+            self._entries[jti] = expires_at.timestamp() if expires_at else time.time() + 86400
+            self._bloom.add(jti)
+
+    def revoke(self, jti: str, expires_at: datetime, token_type: str = 'access', user_id=None):
+        """Persist a revocation (caller commits) and apply it locally right away"""
+        if not RevokedToken.query.filter_by(jti=jti).first():
+            db.session.add(RevokedToken(
+                jti=jti,
+                token_type=token_type,
+                user_id=user_id,
+                expires_at=expires_at,
+            ))
+        self.add_local(jti, expires_at)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        # Only one thread per worker syncs; others keep using the current snapshot
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = now
+        finally:
+            self._lock.release()
+        try:
+            self._sync()
+        except Exception as e:
+            logger.warning(f"JWT denylist sync failed: {e}")
+
+    def _sync(self):
+        query = RevokedToken.query.with_entities(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+        if self._synced_until is not None:
+            # Small overlap tolerates clock skew between workers
+            query = query.filter(RevokedToken.revoked_at >= self._synced_until - timedelta(seconds=30))
+        else:
+            query = query.filter(RevokedToken.expires_at > datetime.utcnow())
+        rows = query.all()
+
+        latest = self._synced_until
+        now_ts = time.time()
+        with self._lock:
+            for jti, expires_at, revoked_at in rows:
+                self._entries[jti] = expires_at.timestamp() if expires_at else now_ts + 86400
+                self._bloom.add(jti)
+                if revoked_at and (latest is None or revoked_at > latest):
+                    latest = revoked_at
+            self._prune_locked(now_ts)
+        self._synced_until = latest or datetime.utcnow()
+        self.stats['syncs'] += 1
+
+    def _prune_locked(self, now_ts: float):
+        """Drop expired entries and rebuild the filter when it fills up"""
+        expired = [jti for jti, exp in self._entries.items() if exp <= now_ts]
+        for jti in expired:
+            del self._entries[jti]
+        if expired or self._bloom.count > self._bloom.capacity:
+            bloom = BloomFilter(capacity=max(10000, len(self._entries) * 2))
+            for jti in self._entries:
+                bloom.add(jti)
+            self._bloom = bloom
+
+
+token_denylist = TokenDenylist(sync_interval=float(os.environ.get('JWT_DENYLIST_SYNC_SECONDS', 5)))
+
+
+# ========== TOKEN ISSUANCE / ROTATION ==========
+
+def issue_token_pair(user, family_id: str = None):
+    """
+    Create an access token and a new refresh token for user.
+    The refresh token row is added to the session; the caller commits.
+
+    Returns:
+        (access_token, refresh_token, RefreshToken record)
+    """
+    family_id = family_id or uuid.uuid4().hex
+    access_token = create_access_token(identity=str(user.id), expires_delta=ACCESS_TOKEN_EXPIRES)
+    refresh_token = create_refresh_token(
+        identity=str(user.id),
+        expires_delta=REFRESH_TOKEN_EXPIRES,
+        additional_claims={'fam': family_id},
+    )
+    decoded = decode_token(refresh_token)
+
+    user_agent = None
+    try:
+        user_agent = (request.headers.get('User-Agent') or '')[:255] or None
+    except RuntimeError:
+        pass
+
+    record = RefreshToken(
+        user_id=user.id,
+        jti=decoded['jti'],
+        family_id=family_id,
+        expires_at=datetime.utcfromtimestamp(decoded['exp']),
+        user_agent=user_agent,
+    )
+    db.session.add(record)
+    return access_token, refresh_token, record
+
+
+def rotate_refresh_token(jwt_payload: dict):
+    """
+    Exchange a valid refresh token for a new access/refresh pair.
+
+    Raises:
+        TokenReuseError: the token was already rotated; its family is revoked
+        InvalidRefreshToken: unknown token or inactive user
+    """
+    record = RefreshToken.query.filter_by(jti=jwt_payload.get('jti')).first()
+    if not record:
+        raise InvalidRefreshToken('Unknown refresh token')
+
+    if record.revoked_at is not None:
+        revoke_token_family(record.family_id)
+        db.session.commit()
+        logger.warning(f"Refresh token reuse detected for user {record.user_id}; family revoked")
+        raise TokenReuseError('Refresh token has already been used')
+
+    user = record.user
+    if not user or getattr(user, 'signup_status', 'approved') != 'approved':
+        raise InvalidRefreshToken('User is not active')
+
+    access_token, refresh_token, new_record = issue_token_pair(user, record.family_id)
+
+    # Conditional update: only one concurrent request can consume this token
+    consumed = RefreshToken.query.filter_by(id=record.id, revoked_at=None).update(
+        {RefreshToken.revoked_at: datetime.utcnow(), RefreshToken.replaced_by: new_record.jti},
+        synchronize_session=False
+    )
+    if consumed != 1:
+        db.session.rollback()
+        raise TokenReuseError('Refresh token has already been used')
+
+    db.session.commit()
+    return access_token, refresh_token
+
+
+def revoke_token_family(family_id: str):
+    """Revoke every outstanding refresh token of a family (caller commits)"""
+    now = datetime.utcnow()
+    records = RefreshToken.query.filter_by(family_id=family_id, revoked_at=None).all()
+    for rec in records:
+        rec.revoked_at = now
+        token_denylist.revoke(rec.jti, rec.expires_at, token_type='refresh', user_id=rec.user_id)
+
+
+def revoke_refresh_token(refresh_token: str):
+    """Revoke the family of an encoded refresh token (used on logout)"""
+    try:
+        decoded = decode_token(refresh_token)
+    except Exception:
+        return False
+    if decoded.get('type') != 'refresh':
+        return False
+    record = RefreshToken.query.filter_by(jti=decoded.get('jti')).first()
+    if not record:
+        return False
+    revoke_token_family(record.family_id)
+    return True
+
+
+def revoke_access_token(jwt_payload: dict):
+    """Add the current access token to the denylist (caller commits)"""
+    expires_at = datetime.utcfromtimestamp(jwt_payload['exp']) if jwt_payload.get('exp') else datetime.utcnow() + ACCESS_TOKEN_EXPIRES
+    user_id = None
+    try:
+        user_id = int(jwt_payload.get('sub'))
+    except (TypeError, ValueError):
+        pass
+    token_denylist.revoke(jwt_payload['jti'], expires_at, token_type='access', user_id=user_id)
+
+
+def is_token_revoked(jwt_header, jwt_payload) -> bool:
+    """token_in_blocklist_loader callback"""
+    if jwt_payload.get('type') == 'refresh':
+        # Refresh tokens are validated against refresh_tokens in rotate_refresh_token,
+        # so reuse of a rotated token can still trigger family revocation
+        return False
+    return token_denylist.is_revoked(jwt_payload['jti'])
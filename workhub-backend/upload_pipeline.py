@@ -0,0 +1,281 @@
+"""
+Background push of stored blobs to Cloud Storage.
+
+With cloud storage enabled and UPLOAD_PUSH_ASYNC on, uploads are written to
+local disk first so the request returns as soon as the bytes are safe. A
+bounded thread pool then copies each new blob to the bucket in parallel chunks
+(composed into one object), points the blob and its attachments at the gs://
+path and removes the local copy. Until then only instances that can read
+UPLOAD_FOLDER can serve the file, so this mode needs UPLOAD_FOLDER on a volume
+shared by every instance; without one, uploads go straight to the bucket.
+
+Blob.storage_state moves local -> uploading -> remote. Failed pushes are
+retried with backoff and then left as local. A blob whose local file is gone
+moves to missing (logged; there is nothing left to push). resume_pending()
+re-queues local blobs and takes over 'uploading' claims whose storage_state_at
+is older than STALE_UPLOAD (the pushing worker died); it runs every
+RESUME_INTERVAL_SECONDS while a process has uploads to handle.
+
+Configuration (environment variables):
+    UPLOAD_PUSH_ASYNC          true stores locally and pushes in the background (default false)
+    UPLOAD_PUSH_WORKERS        Concurrent blob pushes (default 2, 0 pushes inline)
+    UPLOAD_PUSH_PART_WORKERS   Concurrent chunk uploads per blob (default 4)
+    UPLOAD_PUSH_CHUNK_SIZE     Chunk size in bytes (default 8 MB)
+    UPLOAD_PUSH_RETRIES        Attempts per push (default 5)
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+import storage_service as storage_module
+from storage_service import storage_service, PREVIEW_SUFFIX
+from preview_service import preview_service, STATUS_PENDING
+
+logger = logging.getLogger(__name__)
+
+STATE_LOCAL = 'local'
+STATE_UPLOADING = 'uploading'
+STATE_REMOTE = 'remote'
+STATE_MISSING = 'missing'
+
+PART_WORKERS = int(os.environ.get('UPLOAD_PUSH_PART_WORKERS', 4))
+CHUNK_SIZE = int(os.environ.get('UPLOAD_PUSH_CHUNK_SIZE', 8 * 1024 * 1024))
+MAX_ATTEMPTS = int(os.environ.get('UPLOAD_PUSH_RETRIES', 5))
+RETRY_BACKOFF_SECONDS = 1.0
+# Cloud Storage compose accepts at most 32 source objects
+MAX_PARTS = 32
+# An 'uploading' blob untouched for this long belongs to a crashed worker
+STALE_UPLOAD = timedelta(minutes=30)
+RESUME_INTERVAL_SECONDS = 5 * 60
+PREVIEW_WAIT_SECONDS = 120
+
+
+class UploadPipeline:
+    """Queues local blobs for upload to the configured bucket"""
+
+    def __init__(self):
+        self.workers = int(os.environ.get('UPLOAD_PUSH_WORKERS', 2))
+        self._executor = None
+        self._part_executor = None
+        self._lock = threading.Lock()
+        self._next_resume = 0.0
+
+    def _get_executors(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Parts get their own pool so blob jobs never wait on themselves
+                    self._part_executor = ThreadPoolExecutor(max_workers=PART_WORKERS, thread_name_prefix='push-part')
+                    self._executor = ThreadPoolExecutor(max_workers=max(self.workers, 1), thread_name_prefix='push')
+        return self._executor, self._part_executor
+
+    def process(self, blob):
+        """
+        Post-commit hook for a newly stored blob: push it to the bucket when it
+        is still local, otherwise just schedule its preview.
+        """
+        from flask import current_app
+        if not storage_service.async_push_enabled() or blob.storage_state != STATE_LOCAL \
+                or blob.storage_path.startswith('gs://'):
+            preview_service.schedule(blob)
+            return
+        app = current_app._get_current_object()
+        if self._resume_due():
+            self._submit(self.resume_pending, app)
+        self._submit(self._push, app, blob.id)
+
+    def _resume_due(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_resume:
+                return False
+            self._next_resume = now + RESUME_INTERVAL_SECONDS
+            return True
+
+    def _submit(self, fn, *args):
+        if self.workers <= 0:
+            fn(*args)
+            return
+        try:
+            self._get_executors()[0].submit(fn, *args)
+        except RuntimeError as e:
+            logger.warning(f"Upload queue unavailable: {e}")
+
+    @staticmethod
+    def _claimable():
+        """Blobs waiting for a push, including pushes abandoned by a dead worker"""
+        from models import Blob
+        stale = or_(Blob.storage_state_at.is_(None), Blob.storage_state_at < datetime.utcnow() - STALE_UPLOAD)
+        return or_(Blob.storage_state == STATE_LOCAL, and_(Blob.storage_state == STATE_UPLOADING, stale))
+
+    def resume_pending(self, app):
+        """Re-queue blobs that were never pushed or whose push was interrupted"""
+        from models import db, Blob
+        with app.app_context():
+            try:
+                pending = [row.id for row in db.session.query(Blob.id).filter(
+                    self._claimable(), ~Blob.storage_path.like('gs://%')
+                )]
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to list blobs awaiting upload: {e}")
+                return
+        for blob_id in pending:
+            self._submit(self._push, app, blob_id)
+
+    def _push(self, app, blob_id):
+        from models import db, Blob, FileAttachment
+        with app.app_context():
+            try:
+                # Claim the blob so one worker pushes it
+                claimed = Blob.query.filter(Blob.id == blob_id, self._claimable()).update(
+                    {Blob.storage_state: STATE_UPLOADING, Blob.storage_state_at: datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.session.commit()
+                if claimed != 1:
+                    return
+                blob = Blob.query.get(blob_id)
+                local_path = blob.storage_path
+                if not os.path.exists(local_path):
+                    self._mark_missing(blob_id, local_path)
+                    return
+                has_preview = self._wait_for_preview(app, blob)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to start upload of blob {blob_id}: {e}")
+                return
+
+            remote_path = None
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                try:
+                    remote_path = self._upload(local_path, blob.sha256, blob.content_type)
+                    if has_preview:
+                        self._upload(local_path + PREVIEW_SUFFIX, blob.sha256 + PREVIEW_SUFFIX, 'image/jpeg')
+                    break
+                except Exception as e:
+                    logger.warning(f"Upload of blob {blob.sha256[:12]} failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
+                    if not os.path.exists(local_path):
+                        # Deleted with its last reference, or lost with the disk it was on
+                        self._mark_missing(blob_id, local_path)
+                        return
+                    time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+            try:
+                if remote_path is None:
+                    Blob.query.filter_by(id=blob_id).update({
+                        Blob.storage_state: STATE_LOCAL,
+                        Blob.storage_attempts: Blob.storage_attempts + MAX_ATTEMPTS,
+                        Blob.storage_state_at: datetime.utcnow()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                    logger.error(f"Giving up on upload of blob {blob.sha256[:12]}; it stays on local disk")
+                    return
+
+                switched = Blob.query.filter(Blob.id == blob_id, Blob.storage_path == local_path).update({
+                    Blob.storage_path: remote_path,
+                    Blob.storage_state: STATE_REMOTE,
+                    Blob.storage_state_at: datetime.utcnow()
+                }, synchronize_session=False)
+                FileAttachment.query.filter_by(blob_id=blob_id).update(
+                    {FileAttachment.file_path: remote_path}, synchronize_session=False
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to record upload of blob {blob_id}: {e}")
+                return
+
+            if switched:
+                storage_service._delete_object(local_path)
+                if has_preview:
+                    storage_service._delete_object(local_path + PREVIEW_SUFFIX)
+                logger.info(f"Blob {blob.sha256[:12]} moved to {remote_path}")
+            else:
+                # The last reference was dropped mid-push
+                storage_service._delete_object(remote_path)
+                if has_preview:
+                    storage_service._delete_object(remote_path + PREVIEW_SUFFIX)
+
+    def _mark_missing(self, blob_id, local_path):
+        """The local copy is gone; stop retrying (the row is already gone if it was released)"""
+        from models import db, Blob
+        try:
+            marked = Blob.query.filter(Blob.id == blob_id, Blob.storage_path == local_path).update(
+                {Blob.storage_state: STATE_MISSING, Blob.storage_state_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to record missing file of blob {blob_id}: {e}")
+            return
+        if marked:
+            logger.error(f"Blob {blob_id} cannot be pushed: {local_path} no longer exists")
+
+    def _wait_for_preview(self, app, blob) -> bool:
+        """Render the preview from the local copy before it is removed; True if one exists"""
+        from models import db
+        if not preview_service.is_supported(blob.content_type):
+            return False
+        if preview_service.needs_render(blob):
+            preview_service._generate(app, blob.id)
+        deadline = time.monotonic() + PREVIEW_WAIT_SECONDS
+        db.session.refresh(blob)
+        while blob.preview_status == STATUS_PENDING and time.monotonic() < deadline:
+            time.sleep(0.5)
+            db.session.commit()  # end the transaction so the refresh sees other workers
+            db.session.refresh(blob)
+        return os.path.exists(blob.storage_path + PREVIEW_SUFFIX)
+
+    def _upload(self, local_path: str, name: str, content_type) -> str:
+        """Upload a local file in parallel chunks composed into one object; returns its gs:// path"""
+        bucket_name = storage_module.CLOUD_STORAGE_BUCKET
+        bucket = storage_module.get_storage_client().bucket(bucket_name)
+        blob_name = f"{storage_service._blob_folder(name)}/{name}"
+        size = os.path.getsize(local_path)
+        target = bucket.blob(blob_name)
+
+        chunk_size = max(CHUNK_SIZE, -(-size // MAX_PARTS))
+        if size <= chunk_size:
+            target.upload_from_filename(local_path, content_type=content_type)
+            return f"gs://{bucket_name}/{blob_name}"
+
+        token = uuid.uuid4().hex[:8]
+        offsets = list(range(0, size, chunk_size))
+        parts = [bucket.blob(f"{blob_name}.part-{index:02d}-{token}") for index in range(len(offsets))]
+
+        def upload_part(index):
+            with open(local_path, 'rb') as fh:
+                fh.seek(offsets[index])
+                data = fh.read(chunk_size)
+            parts[index].upload_from_file(io.BytesIO(data), content_type='application/octet-stream')
+
+        part_executor = self._get_executors()[1]
+        try:
+            futures = [part_executor.submit(upload_part, i) for i in range(len(parts))]
+            # Let every part finish before cleanup so none is left behind
+            wait(futures)
+            for future in futures:
+                future.result()
+            target.content_type = content_type
+            target.compose(parts)
+        finally:
+            for part in parts:
+                try:
+                    part.delete()
+                except Exception:
+                    pass
+        return f"gs://{bucket_name}/{blob_name}"
+
+
+# Export singleton instance
+upload_pipeline = UploadPipeline()
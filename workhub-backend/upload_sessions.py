@@ -0,0 +1,567 @@
+# workhub-backend/upload_sessions.py
+"""
+Chunked, resumable uploads for task attachments and chat files.
+
+Protocol:
+    POST   /api/uploads                 create a session (target, filename, size)
+    PUT    /api/uploads/<id>            send bytes; Content-Range: bytes <start>-<end>/<total>
+    GET    /api/uploads/<id>            current offset, to resume after a dropped connection
+    POST   /api/uploads/<id>/complete   verify and attach the file to its task/conversation/group
+    DELETE /api/uploads/<id>            abort
+
+Each chunk is streamed from the raw request body (nothing is buffered by
+Werkzeug) straight to where the session is staged: appended at its offset to
+one file under UPLOAD_FOLDER/.incoming without cloud storage, or uploaded as one
+part object in the bucket with it, so any instance can take the next chunk or
+the completion. A PUT first claims the session by a conditional update from
+the offset it starts at, so of two concurrent PUTs one writes and the other
+gets 409 before sending anything. A claim older than CHUNK_CLAIM_TIMEOUT belongs
+to a request that died and is taken over.
+
+The SHA-256 is computed while the chunks stream in and kept by the process
+that received them. When every chunk of a session reached the same process,
+completion needs no further pass over the bytes; otherwise the staged file (or
+the composed object) is read once to hash it. The staged file is then moved
+into content-addressed storage, or in the bucket the parts are composed into
+the blob object server-side, and identical content is deduplicated against the
+digest the server computed. A client may complete without sending any bytes
+only when it declares the hash of a blob its user already references (an
+attachment or file message of theirs); a hash alone never grants access to
+someone else's file, and whether it is stored is not revealed.
+
+Configuration (environment variables):
+    UPLOAD_CHUNK_SIZE                   Suggested chunk size in bytes (default 5 MB)
+    UPLOAD_SESSION_TTL_HOURS            Lifetime of an unfinished upload (default 24)
+    UPLOAD_CHUNK_CLAIM_TIMEOUT_SECONDS  Age after which a chunk claim is taken over (default 600)
+"""
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+from models import db, UploadSession, Task, ChatConversation, ChatMessage, GroupMessage, FileAttachment
+from storage_service import storage_service
+from upload_pipeline import upload_pipeline
+from request_cache import get_user, is_group_member
+from file_uploads import (
+    MAX_FILE_SIZE, ALLOWED_EXTENSIONS, allowed_file, check_upload_permission, build_attachment
+)
+from chat import create_conversation_attachment, create_group_attachment
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+upload_sessions_bp = Blueprint('upload_sessions', __name__)
+
+# Suggested chunk size returned to clients (must stay below MAX_CONTENT_LENGTH)
+CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+SESSION_TTL = timedelta(hours=int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)))
+# Longer than any request may run, so an older claim belongs to a PUT that died
+CHUNK_CLAIM_TIMEOUT = timedelta(seconds=int(os.environ.get('UPLOAD_CHUNK_CLAIM_TIMEOUT_SECONDS', 600)))
+STREAM_BUFFER_SIZE = 256 * 1024
+# Sessions whose running hash this process keeps
+MAX_HASH_STATES = 256
+
+TARGET_TYPES = ('task', 'conversation', 'group')
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+# ========== HELPERS ==========
+
+class ChunkTooLarge(Exception):
+    """The request body runs past the declared file size"""
+
+
+class _ChunkReader:
+    """Reads a request body up to a limit, hashing and counting the bytes as they pass"""
+
+    def __init__(self, stream, limit, hasher):
+        self.stream = stream
+        self.limit = limit
+        self.hasher = hasher
+        self.count = 0
+
+    def read(self, size=STREAM_BUFFER_SIZE):
+        if size is None or size < 0:
+            size = STREAM_BUFFER_SIZE
+        data = self.stream.read(size)
+        if self.count + len(data) > self.limit:
+            raise ChunkTooLarge()
+        self.count += len(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return data
+
+    def tell(self):
+        return self.count
+
+
+# upload_id -> (offset, sha256 of the bytes before it)
+_hash_states = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def _hasher_at(upload_id, offset):
+    """A hasher continuing at offset, or None if this process did not see every earlier chunk"""
+    if offset == 0:
+        return hashlib.sha256()
+    with _hash_lock:
+        state = _hash_states.get(upload_id)
+        if state and state[0] == offset:
+            return state[1].copy()
+    return None
+
+
+def _keep_hasher(upload_id, offset, hasher):
+    with _hash_lock:
+        if hasher is None:
+            _hash_states.pop(upload_id, None)
+            return
+        _hash_states[upload_id] = (offset, hasher)
+        _hash_states.move_to_end(upload_id)
+        while len(_hash_states) > MAX_HASH_STATES:
+            _hash_states.popitem(last=False)
+
+
+def _finished_digest(upload_id, size):
+    """The SHA-256 of the whole upload if this process hashed every chunk of it, else None"""
+    with _hash_lock:
+        state = _hash_states.get(upload_id)
+        if state and state[0] == size:
+            return state[1].hexdigest()
+    return None
+
+
+def _parts(session):
+    return json.loads(session.parts) if session.parts else []
+
+
+def _write_local(upload_id, start, reader):
+    """Write the chunk into the session's staging file at start, dropping anything after it"""
+    path = storage_service.staging_path(upload_id)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'wb') as fh:
+        fh.seek(start)
+        while True:
+            data = reader.read(STREAM_BUFFER_SIZE)
+            if not data:
+                break
+            fh.write(data)
+        fh.truncate(start + reader.count)
+
+
+def _release_claim(upload_id, claim_id):
+    UploadSession.query.filter_by(id=upload_id, status='receiving', claim_id=claim_id).update(
+        {UploadSession.status: 'open', UploadSession.claim_id: None, UploadSession.claimed_at: None},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+
+def _check_target(user, target_type, target_id, filename):
+    """Return an (error, status) tuple if user may not upload to the target, else None"""
+    if target_type == 'task':
+        task = Task.query.get(target_id)
+        if not task:
+            return 'Task not found', 404
+        permission_error = check_upload_permission(user, task)
+        if permission_error:
+            return permission_error, 403
+        if not allowed_file(filename):
+            return f'File type not allowed. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}', 400
+    elif target_type == 'conversation':
+        conversation = ChatConversation.query.get(target_id)
+        if not conversation:
+            return 'Conversation not found', 404
+        if user.id not in (conversation.user1_id, conversation.user2_id):
+            return 'Access denied', 403
+        if conversation.status != 'accepted':
+            return 'Conversation not accepted', 400
+    elif target_type == 'group':
+        if not is_group_member(target_id, user.id):
+            return 'Access denied', 403
+    else:
+        return f'target_type must be one of: {", ".join(TARGET_TYPES)}', 400
+    return None
+
+
+def _references_blob(user_id, blob):
+    """True if the user already has an attachment or file message of this blob"""
+    if FileAttachment.query.filter_by(user_id=user_id, blob_id=blob.id).first():
+        return True
+    # File messages carry the blob in their JSON content (see chat._file_payload)
+    pattern = f'%"sha256": "{blob.sha256}"%'
+    for model in (ChatMessage, GroupMessage):
+        if model.query.with_entities(model.id).filter(model.sender_id == user_id,
+                                                      model.content.like(pattern)).first():
+            return True
+    return False
+
+
+def _known_blob(user_id, sha256, size):
+    """The stored blob a client may link without sending bytes, or None"""
+    blob = storage_service.find_blob(sha256)
+    if not blob or blob.size != size or not _references_blob(user_id, blob):
+        return None
+    return blob
+
+
+def _get_session(upload_id, user_id):
+    """Load an open session owned by user_id, or return an error response tuple"""
+    session = UploadSession.query.get(upload_id)
+    if not session or session.user_id != user_id:
+        return None, (jsonify({'error': 'Upload session not found'}), 404)
+    if session.expires_at < datetime.utcnow():
+        return None, (jsonify({'error': 'Upload session expired'}), 410)
+    return session, None
+
+
+def _discard(session):
+    storage_service.delete_staged(session.id)
+    _keep_hasher(session.id, 0, None)
+    db.session.delete(session)
+
+
+def _purge_expired_sessions(limit=50):
+    """Drop a bounded batch of abandoned sessions and their staged bytes"""
+    expired = UploadSession.query.filter(UploadSession.expires_at < datetime.utcnow()).limit(limit).all()
+    for session in expired:
+        _discard(session)
+
+
+# ========== ENDPOINTS ==========
+
+@upload_sessions_bp.route('', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """
+    Start a chunked upload
+
+    JSON body:
+        target_type: 'task' | 'conversation' | 'group'
+        target_id: id of the task, conversation or group
+        filename: original file name
+        size: total size in bytes
+        content_type: optional MIME type
+        sha256: optional hex digest; if the user already has a file with that
+                content the response has blob_exists=true and no bytes need to be sent
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        user = get_user(current_user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        data = request.get_json(silent=True) or {}
+        target_type = data.get('target_type')
+        filename = secure_filename(data.get('filename') or '')
+        try:
+            target_id = int(data.get('target_id'))
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'target_id and size must be integers'}), 400
+
+        if not filename:
+            return jsonify({'error': 'No file selected'}), 400
+        if size < 0:
+            return jsonify({'error': 'size must not be negative'}), 400
+        if size > MAX_FILE_SIZE:
+            return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024 * 1024)} MB'}), 400
+        sha256 = (data.get('sha256') or '').lower() or None
+        if sha256 and not _SHA256_RE.match(sha256):
+            return jsonify({'error': 'sha256 must be a 64-character hex digest'}), 400
+
+        target_error = _check_target(user, target_type, target_id, filename)
+        if target_error:
+            return jsonify({'error': target_error[0]}), target_error[1]
+
+        _purge_expired_sessions()
+
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=current_user_id,
+            target_type=target_type,
+            target_id=target_id,
+            filename=filename,
+            content_type=data.get('content_type') or mimetypes.guess_type(filename)[0],
+            total_size=size,
+            sha256=sha256,
+            received_bytes=0,
+            status='open',
+            expires_at=datetime.utcnow() + SESSION_TTL
+        )
+        db.session.add(session)
+        db.session.commit()
+
+        result = session.to_dict()
+        result['chunk_size'] = CHUNK_SIZE
+        # Content this user already has: the client can skip straight to /complete
+        result['blob_exists'] = bool(sha256 and _known_blob(current_user_id, sha256, size))
+        return jsonify(result), 201
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating upload session: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@upload_sessions_bp.route('/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(upload_id):
+    """Report how many bytes have been received so the client can resume"""
+    try:
+        session, error = _get_session(upload_id, int(get_jwt_identity()))
+        if error:
+            return error
+        result = session.to_dict()
+        result['chunk_size'] = CHUNK_SIZE
+        return jsonify(result), 200
+    except Exception as e:
+        logger.error(f"Error fetching upload session: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@upload_sessions_bp.route('/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    """
+    Append a chunk. The body is the raw bytes (not multipart).
+    Chunks must start at received_bytes; anything else (a gap, a chunk that was
+    already accepted, or a concurrent PUT that won the race) gets 409 with the
+    offset to resume from.
+    """
+    try:
+        session, error = _get_session(upload_id, int(get_jwt_identity()))
+        if error:
+            return error
+        if session.status == 'finalizing':
+            return jsonify({'error': 'Upload is being finalized'}), 409
+
+        total_size = session.total_size
+        received = session.received_bytes
+        parts = _parts(session)
+
+        start = received
+        content_range = request.headers.get('Content-Range')
+        if content_range:
+            match = _CONTENT_RANGE_RE.match(content_range.strip())
+            if not match:
+                return jsonify({'error': 'Invalid Content-Range header'}), 400
+            start, end = int(match.group(1)), int(match.group(2))
+            if end < start or end >= total_size:
+                return jsonify({'error': 'Content-Range outside the declared file size'}), 416
+        if start != received:
+            return jsonify({'error': 'Chunk does not start at the current offset', 'received_bytes': received}), 409
+
+        if request.content_length and start + request.content_length > total_size:
+            return jsonify({'error': 'Chunk exceeds the declared file size'}), 416
+
+        # One writer per session: only the PUT that still sees received == start gets the claim
+        claim_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        claimed = UploadSession.query.filter(
+            UploadSession.id == upload_id,
+            UploadSession.received_bytes == start,
+            or_(UploadSession.status == 'open',
+                and_(UploadSession.status == 'receiving', UploadSession.claimed_at < now - CHUNK_CLAIM_TIMEOUT))
+        ).update({UploadSession.status: 'receiving', UploadSession.claim_id: claim_id,
+                  UploadSession.claimed_at: now}, synchronize_session=False)
+        # Nothing is held in the database while the chunk streams in
+        db.session.commit()
+        if claimed != 1:
+            current = db.session.get(UploadSession, upload_id)
+            return jsonify({'error': 'Chunk does not start at the current offset',
+                            'received_bytes': current.received_bytes if current else received}), 409
+
+        reader = _ChunkReader(request.stream, total_size - start, _hasher_at(upload_id, start))
+        part = None
+        try:
+            if storage_service.cloud_enabled():
+                part = storage_service.stage_part(reader, upload_id, f"{start:012d}")
+            else:
+                _write_local(upload_id, start, reader)
+        except ChunkTooLarge:
+            _release_claim(upload_id, claim_id)
+            return jsonify({'error': 'Chunk exceeds the declared file size'}), 416
+        except Exception:
+            db.session.rollback()
+            _release_claim(upload_id, claim_id)
+            raise
+        written = start + reader.count
+        if written == start:
+            if part:
+                storage_service.delete_part(part)
+            _release_claim(upload_id, claim_id)
+            return jsonify({'error': 'Empty chunk'}), 400
+
+        values = {UploadSession.received_bytes: written, UploadSession.status: 'open',
+                  UploadSession.claim_id: None, UploadSession.claimed_at: None}
+        if part:
+            values[UploadSession.parts] = json.dumps(parts + [part])
+        accepted = UploadSession.query.filter_by(id=upload_id, status='receiving', claim_id=claim_id).update(
+            values, synchronize_session=False
+        )
+        db.session.commit()
+        if accepted != 1:
+            # The claim outlived CHUNK_CLAIM_TIMEOUT and another PUT took over
+            current = db.session.get(UploadSession, upload_id)
+            return jsonify({'error': 'Chunk does not start at the current offset',
+                            'received_bytes': current.received_bytes if current else received}), 409
+        _keep_hasher(upload_id, written, reader.hasher)
+
+        return jsonify({
+            'upload_id': upload_id,
+            'received_bytes': written,
+            'size': total_size,
+            'complete': written == total_size
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error writing upload chunk: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@upload_sessions_bp.route('/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    """
+    Finish an upload and attach it to its target.
+
+    JSON body (optional):
+        sha256: expected hex digest; the upload is rejected if it does not match
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        session, error = _get_session(upload_id, current_user_id)
+        if error:
+            return error
+        user = get_user(current_user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        received = session.received_bytes
+        known_blob = None
+        if received != session.total_size:
+            # Instant re-upload of content this user already has, no bytes needed
+            if received == 0 and session.sha256:
+                known_blob = _known_blob(current_user_id, session.sha256, session.total_size)
+            if not known_blob:
+                return jsonify({'error': 'Upload is incomplete', 'received_bytes': received}), 409
+
+        # Only one request may finalize a session
+        claimed = UploadSession.query.filter_by(id=session.id, status='open').update(
+            {UploadSession.status: 'finalizing'}, synchronize_session=False
+        )
+        db.session.commit()
+        if claimed != 1:
+            return jsonify({'error': 'Upload is already being finalized'}), 409
+
+        # Permissions may have changed since the session was created
+        target_error = _check_target(user, session.target_type, session.target_id, session.filename)
+        if target_error:
+            _discard(session)
+            db.session.commit()
+            return jsonify({'error': target_error[0]}), target_error[1]
+
+        if known_blob:
+            blob = storage_service.add_blob_reference(known_blob)
+        else:
+            digest = _finished_digest(session.id, session.total_size)
+
+            parts = _parts(session)
+            if parts:
+                if digest is None:
+                    # Chunks arrived at several instances: compose once and read it back to hash
+                    staged = storage_service.compose_staged(session.id, parts)
+                    with storage_service.open_read(staged) as fh:
+                        digest, size = storage_service.hash_stream(fh)
+                    parts = [staged]
+                else:
+                    size = session.total_size
+            else:
+                staged = storage_service.staging_path(session.id)
+                if not os.path.exists(staged):
+                    open(staged, 'wb').close()  # nothing was sent (an empty file, or chunks staged elsewhere)
+                size = os.path.getsize(staged)
+                if digest is None and size == session.total_size:
+                    with open(staged, 'rb') as fh:
+                        digest, size = storage_service.hash_stream(fh)
+            if size != session.total_size:
+                # Staged bytes are missing (e.g. the local staging file is on another instance's disk)
+                _discard(session)
+                db.session.commit()
+                return jsonify({'error': 'Staged upload is incomplete; start a new upload'}), 409
+
+            expected = ((request.get_json(silent=True) or {}).get('sha256') or session.sha256 or '').lower()
+            if expected and expected != digest:
+                _discard(session)
+                db.session.commit()
+                return jsonify({'error': 'Checksum mismatch', 'sha256': digest}), 422
+            if parts:
+                blob = storage_service.store_blob_parts(parts, digest, session.total_size, session.content_type)
+            else:
+                blob = storage_service.store_blob_path(staged, digest, session.total_size, session.content_type)
+
+        original = session.filename
+        target_type, target_id = session.target_type, session.target_id
+        _discard(session)
+
+        if target_type == 'task':
+            attachment = build_attachment(target_id, current_user_id, original, blob)
+            db.session.commit()
+            upload_pipeline.process(blob)
+            logger.info(f"File uploaded: {original} by user {current_user_id} to task {target_id}")
+            response = {'message': 'File uploaded successfully', 'attachment': attachment.to_dict()}
+        elif target_type == 'conversation':
+            conversation = ChatConversation.query.get(target_id)
+            message = create_conversation_attachment(conversation, user, original, blob)
+            response = {'message': 'Attachment sent', 'chat_message': message.to_dict()}
+        else:
+            msg = create_group_attachment(target_id, user, original, blob)
+            response = {'message': 'Attachment sent', 'group_message': msg.to_dict()}
+
+        response['sha256'] = blob.sha256
+        response['deduplicated'] = known_blob is not None
+        return jsonify(response), 201
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error completing upload: {str(e)}")
+        try:
+            # Let the client retry completion
+            UploadSession.query.filter_by(id=upload_id, status='finalizing').update(
+                {UploadSession.status: 'open'}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@upload_sessions_bp.route('/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    """Abort an upload and discard the staged bytes"""
+    try:
+        session = UploadSession.query.get(upload_id)
+        if not session or session.user_id != int(get_jwt_identity()):
+            return jsonify({'error': 'Upload session not found'}), 404
+        _discard(session)
+        db.session.commit()
+        return jsonify({'message': 'Upload aborted'}), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error aborting upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
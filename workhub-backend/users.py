@@ -245,7 +245,16 @@ def delete_user(user_id: int):
         # Delete user-owned data
         TimeLog.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         Comment.query.filter_by(user_id=user_id).delete(synchronize_session=False)
-        FileAttachment.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        from file_uploads import delete_attachments
+        from models import StorageUsage
+        delete_attachments(FileAttachment.query.filter_by(user_id=user_id))
+        StorageUsage.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        # Unfinished uploads go; their staged parts are removed once the delete is committed
+        from models import UploadSession, RevokedToken
+        upload_ids = [row.id for row in UploadSession.query.with_entities(UploadSession.id).filter_by(user_id=user_id)]
+        UploadSession.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        # Revoked JTIs stay in the denylist until they expire, just without the owner
+        RevokedToken.query.filter_by(user_id=user_id).update({RevokedToken.user_id: None}, synchronize_session=False)
         NotificationPreference.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         Reminder.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         Notification.query.filter_by(user_id=user_id).delete(synchronize_session=False)
@@ -298,6 +307,9 @@ def delete_user(user_id: int):
 
         db.session.delete(user)
         db.session.commit()
+        from storage_service import storage_service
+        for upload_id in upload_ids:
+            storage_service.delete_staged(upload_id)
         return jsonify({"message": "User deleted successfully"}), 200
 
     except SQLAlchemyError as e:
@@ -31,6 +31,7 @@ export const AuthProvider = ({ children }) => {
     } catch (error) {
       console.error('Failed to load user:', error);
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
     } finally {
       setLoading(false);
     }
@@ -39,12 +40,22 @@ export const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     const response = await authAPI.login(email, password);
     localStorage.setItem('token', response.data.access_token);
+    if (response.data.refresh_token) {
+      localStorage.setItem('refresh_token', response.data.refresh_token);
+    }
     setUser(response.data.user);
     return response.data;
   };
 
   const logout = () => {
+    const accessToken = localStorage.getItem('token');
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (accessToken) {
+      // Revoke tokens server-side; local state is cleared regardless of the result
+      authAPI.logout(accessToken, refreshToken).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     setUser(null);
   };
 
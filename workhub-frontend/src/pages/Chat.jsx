@@ -387,8 +387,15 @@ const Chat = () => {
 
   const handlePreviewAttachment = async (msg, filename) => {
     try {
-      const res = await chatAPI.downloadAttachment(msg.id);
-      const blob = new Blob([res.data]);
+      const ext = (filename || '').split('.').pop().toLowerCase();
+      let res = null;
+      if (ext !== 'mp4' && ext !== 'webm' && ext !== 'ogg' && ext !== 'mov') {
+        // Server-rendered JPEG preview; videos still need the full file to play
+        res = await chatAPI.getAttachmentPreview(msg.id).catch(() => null);
+        if (res && res.status !== 200) res = null;
+      }
+      if (!res) res = await chatAPI.downloadAttachment(msg.id);
+      const blob = new Blob([res.data], { type: res.headers?.['content-type'] });
       const url = window.URL.createObjectURL(blob);
       setPreviewUrls((s) => ({ ...s, [msg.id]: url }));
     } catch (e) {
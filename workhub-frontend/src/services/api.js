@@ -29,9 +29,72 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// On 401, exchange the refresh token for a new access token once and retry.
+// Concurrent 401s share a single in-flight refresh (refresh tokens rotate on use).
+let refreshPromise = null;
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem('refresh_token');
+    const isAuthCall = original?.url?.startsWith('/auth/login') || original?.url?.startsWith('/auth/refresh');
+    if (error.response?.status !== 401 || !refreshToken || !original || original._retried || isAuthCall) {
+      return Promise.reject(error);
+    }
+    original._retried = true;
+    try {
+      if (!refreshPromise) {
+        refreshPromise = axios
+          .post(`${API_URL}/auth/refresh`, null, { headers: { Authorization: `Bearer ${refreshToken}` } })
+          .then((res) => {
+            localStorage.setItem('token', res.data.access_token);
+            localStorage.setItem('refresh_token', res.data.refresh_token);
+            return res.data.access_token;
+          })
+          .finally(() => {
+            refreshPromise = null;
+          });
+      }
+      const accessToken = await refreshPromise;
+      original.headers.Authorization = `Bearer ${accessToken}`;
+      return api(original);
+    } catch (refreshError) {
+      localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
+      return Promise.reject(error);
+    }
+  }
+);
+
+// Creates guarded by prevent_duplicate_submission on the backend. Each submission carries one
+// Idempotency-Key that its retries reuse (e.g. after a token refresh), and an identical submission
+// made while it is still in flight (a double click) shares its request instead of creating a duplicate.
+const inFlightSubmissions = new Map();
+const newIdempotencyKey = () =>
+  (typeof crypto !== 'undefined' && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+const submit = (url, data, config = {}) => {
+  const fingerprint = `${url}|${JSON.stringify(data ?? null)}`;
+  const pending = inFlightSubmissions.get(fingerprint);
+  if (pending) {
+    return pending;
+  }
+  const request = api
+    .post(url, data, { ...config, headers: { ...config.headers, 'Idempotency-Key': newIdempotencyKey() } })
+    .finally(() => {
+      inFlightSubmissions.delete(fingerprint);
+    });
+  inFlightSubmissions.set(fingerprint, request);
+  return request;
+};
+
 // Auth API
 export const authAPI = {
   login: (email, password) => api.post('/auth/login', { email, password }),
+  logout: (accessToken, refreshToken) =>
+    api.post('/auth/logout', { refresh_token: refreshToken }, { headers: { Authorization: `Bearer ${accessToken}` } }),
   register: (data) => api.post('/auth/register', data),
   signup: (data) => api.post('/auth/signup', data),
   verifyEmail: (email, code) => api.post('/auth/verify-email', { email, code }),
@@ -64,10 +127,10 @@ export const usersAPI = {
 export const tasksAPI = {
   getAll: (params) => api.get('/tasks/', { params }),
   getById: (id) => api.get(`/tasks/${id}`),
-  create: (data) => api.post('/tasks/', data),
+  create: (data) => submit('/tasks/', data),
   update: (id, data) => api.put(`/tasks/${id}`, data),
   delete: (id) => api.delete(`/tasks/${id}`),
-  addComment: (id, payload) => api.post(`/tasks/${id}/comments`, payload),
+  addComment: (id, payload) => submit(`/tasks/${id}/comments`, payload),
   updateComment: (taskId, commentId, payload) => api.put(`/tasks/${taskId}/comments/${commentId}`, payload),
   deleteComment: (taskId, commentId) => api.delete(`/tasks/${taskId}/comments/${commentId}`),
   addTimeLog: (id, data) => api.post(`/tasks/${id}/time-logs`, data),
@@ -115,16 +178,12 @@ export const chatAPI = {
   editMessage: (messageId, content) => api.put(`/chat/messages/${messageId}`, { content }),
   deleteForMe: (messageId) => api.delete(`/chat/messages/${messageId}/delete-for-me`),
   deleteForEveryone: (messageId) => api.delete(`/chat/messages/${messageId}/delete-for-everyone`),
-  uploadAttachment: (conversationId, file, config = {}) => {
-    const formData = new FormData();
-    formData.append('file', file);
-    return api.post(`/chat/conversations/${conversationId}/attachments`, formData, {
-      headers: { 'Content-Type': 'multipart/form-data' },
-      ...config,
-    });
-  },
+  uploadAttachment: (conversationId, file, config = {}) =>
+    uploadsAPI.uploadChunked('conversation', conversationId, file, config),
   downloadAttachment: (messageId) =>
     api.get(`/chat/attachments/${messageId}`, { responseType: 'blob' }),
+  getAttachmentPreview: (messageId) =>
+    api.get(`/chat/attachments/${messageId}/preview`, { responseType: 'blob' }),
   setTyping: (conversationId, typing) => api.post(`/chat/conversations/${conversationId}/typing`, { typing }),
   getTyping: (conversationId) => api.get(`/chat/conversations/${conversationId}/typing`),
   heartbeat: () => api.post('/chat/presence/heartbeat'),
@@ -155,22 +214,18 @@ export const groupsAPI = {
   listInvitations: () => api.get('/chat/groups/invitations'),
   respondInvitation: (invitationId, status, rejectionReason) =>
     api.post(`/chat/groups/invitations/${invitationId}/respond`, { status, rejection_reason: rejectionReason }),
-  uploadAttachment: (groupId, file, config = {}) => {
-    const formData = new FormData();
-    formData.append('file', file);
-    return api.post(`/chat/groups/${groupId}/attachments`, formData, {
-      headers: { 'Content-Type': 'multipart/form-data' },
-      ...config,
-    });
-  },
+  uploadAttachment: (groupId, file, config = {}) =>
+    uploadsAPI.uploadChunked('group', groupId, file, config),
   downloadAttachment: (messageId) => api.get(`/chat/groups/attachments/${messageId}`, { responseType: 'blob' }),
+  getAttachmentPreview: (messageId) =>
+    api.get(`/chat/groups/attachments/${messageId}/preview`, { responseType: 'blob' }),
 };
 
 // Projects & Sprints API
 export const projectsAPI = {
   getAll: (params) => api.get('/projects/', { params }),
   getById: (id) => api.get(`/projects/${id}`),
-  create: (data) => api.post('/projects/', data),
+  create: (data) => submit('/projects/', data),
   update: (id, data) => api.put(`/projects/${id}`, data),
   delete: (id) => api.delete(`/projects/${id}`),
   getMine: () => api.get('/projects/my'),
@@ -186,7 +241,7 @@ export const projectMembersAPI = {
 export const sprintsAPI = {
   getAll: (params) => api.get('/sprints/', { params }),
   getById: (id) => api.get(`/sprints/${id}`),
-  create: (data) => api.post('/sprints/', data),
+  create: (data) => submit('/sprints/', data),
   update: (id, data) => api.put(`/sprints/${id}`, data),
   delete: (id) => api.delete(`/sprints/${id}`),
 };
@@ -232,18 +287,80 @@ export const settingsAPI = {
   updatePersonal: (data) => api.put('/settings/personal', data),
 };
 
+// Chunked, resumable uploads (session -> PUT byte ranges -> complete)
+const UPLOAD_CHUNK_RETRIES = 3;
+
+// Hex SHA-256 of a File, or null where WebCrypto is unavailable (e.g. plain http)
+const sha256Hex = async (file) => {
+  if (typeof crypto === 'undefined' || !crypto.subtle) return null;
+  try {
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+  } catch {
+    return null;
+  }
+};
+
+export const uploadsAPI = {
+  create: (targetType, targetId, file, sha256) =>
+    api.post('/uploads', {
+      target_type: targetType,
+      target_id: targetId,
+      filename: file.name,
+      size: file.size,
+      content_type: file.type || undefined,
+      sha256: sha256 || undefined,
+    }),
+  status: (uploadId) => api.get(`/uploads/${uploadId}`),
+  putChunk: (uploadId, blob, start, total) =>
+    api.put(`/uploads/${uploadId}`, blob, {
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': `bytes ${start}-${start + blob.size - 1}/${total}`,
+      },
+    }),
+  complete: (uploadId) => api.post(`/uploads/${uploadId}/complete`, {}),
+  abort: (uploadId) => api.delete(`/uploads/${uploadId}`),
+
+  // Resolves with the same response shape as the legacy multipart endpoints
+  uploadChunked: async (targetType, targetId, file, config = {}) => {
+    const sha256 = await sha256Hex(file);
+    const { data: session } = await uploadsAPI.create(targetType, targetId, file, sha256);
+    const chunkSize = session.chunk_size || 5 * 1024 * 1024;
+    // Content already on the server: nothing to send
+    let offset = session.blob_exists ? file.size : 0;
+    let failures = 0;
+    while (offset < file.size) {
+      const end = Math.min(offset + chunkSize, file.size);
+      try {
+        const { data } = await uploadsAPI.putChunk(session.upload_id, file.slice(offset, end), offset, file.size);
+        offset = data.received_bytes;
+        failures = 0;
+      } catch (err) {
+        failures += 1;
+        if (failures > UPLOAD_CHUNK_RETRIES || (err.response && err.response.status < 500 && err.response.status !== 409)) {
+          uploadsAPI.abort(session.upload_id).catch(() => {});
+          throw err;
+        }
+        // Resume from whatever the server actually stored
+        const { data } = await uploadsAPI.status(session.upload_id);
+        offset = data.received_bytes;
+      }
+      config.onUploadProgress?.({ loaded: offset, total: file.size });
+    }
+    return uploadsAPI.complete(session.upload_id);
+  },
+};
+
 // File Uploads API
 export const filesAPI = {
-  uploadToTask: (taskId, file) => {
-    const formData = new FormData();
-    formData.append('file', file);
-    return api.post(`/files/task/${taskId}/upload`, formData, {
-      headers: { 'Content-Type': 'multipart/form-data' }
-    });
-  },
+  uploadToTask: (taskId, file, config = {}) =>
+    uploadsAPI.uploadChunked('task', taskId, file, config),
   getTaskAttachments: (taskId) => api.get(`/files/task/${taskId}/attachments`),
   downloadAttachment: (attachmentId) => 
     api.get(`/files/attachment/${attachmentId}/download`, { responseType: 'blob' }),
+  getAttachmentPreview: (attachmentId) =>
+    api.get(`/files/attachment/${attachmentId}/preview`, { responseType: 'blob' }),
   deleteAttachment: (attachmentId) => api.delete(`/files/attachment/${attachmentId}`),
   getUploadStats: () => api.get('/files/stats'),
 };